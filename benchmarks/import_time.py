@@ -0,0 +1,57 @@
+"""
+Import time of the package modules, every import in a fresh interpreter (what a CLI run or a
+spawned solver worker pays before doing any work):
+
+    python benchmarks/import_time.py --repeat 5 --output import_times.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["itinative", "itinative.__main__", "itinative.helper_functions", "itinative.day_scheduler",
+           "itinative.service"]
+HEAVY = ["pandas", "pulp", "scipy", "sklearn", "googlemaps", "geopy"]
+
+PROBE = """
+import sys, json, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(module, repeat=5):
+    """Best wall time (seconds) of importing `module` in a new interpreter, and the heavy modules it loaded"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {"module": module, "seconds": min(run["seconds"] for run in runs), "loaded": runs[0]["loaded"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module, the best is kept")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.modules:
+        result = time_import(module, args.repeat)
+        results.append(result)
+        print(f"{module:32} {result['seconds'] * 1000:8.1f} ms   loads: {', '.join(result['loaded']) or '-'}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Offline benchmarks of the planning pipeline on seeded synthetic cities (no Google API calls).
+
+Every pipeline stage (fetch, clustering, hotels, distance matrix, model build, solve) is timed and
+its peak traced memory recorded, results go to a JSON file so runs can be compared across releases:
+
+    python benchmarks/run_benchmarks.py --sizes 20 100 500 --days 3 --output benchmark_results.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import itinative  # noqa: E402
+from itinative.helper_functions import PlacesDataRetriever, latlon_to_xy  # noqa: E402
+from itinative.clustering import ENGINES, cluster_places  # noqa: E402
+from itinative.day_scheduler import bestpriceColletingRoute  # noqa: E402
+from itinative.matrix_model import MatrixModel  # noqa: E402
+from itinative.heuristics import optimality_gap  # noqa: E402
+from itinative.synthetic import SyntheticCity, StubClient, StubGeocoder  # noqa: E402
+from itinative.dependencies import require  # noqa: E402
+
+DEFAULT_SIZES = [20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+@contextmanager
+def stage(stages, name):
+    """Adds the wall time and peak traced memory of the block to stages[name] (summed over days)"""
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        peak_mb = (tracemalloc.get_traced_memory()[1] - base) / 2 ** 20
+        record = stages.setdefault(name, {"seconds": 0.0, "peak_mb": 0.0, "calls": 0})
+        record["seconds"] += seconds
+        record["peak_mb"] = max(record["peak_mb"], peak_mb)
+        record["calls"] += 1
+
+
+def compare_clustering(processor, days, engines, capacity=None, time_budget=None):
+    """Runs every engine on the same places: seconds, cluster sizes and mean distance (km) to the cluster center"""
+    table = processor.place_details
+    xy = np.column_stack(latlon_to_xy(table.lat, table.lng, processor.pin_lat, processor.pin_lng))
+    results = {}
+    for engine in engines:
+        started = time.perf_counter()
+        labels = cluster_places(xy, days, engine=engine, weights=table.prominence, capacity=capacity,
+                                time_budget=time_budget)
+        seconds = time.perf_counter() - started
+        sizes, spread = [], []
+        for cluster in range(days):
+            members = xy[labels == cluster]
+            sizes.append(len(members))
+            if len(members):
+                spread.append(np.linalg.norm(members - members.mean(axis=0), axis=1).mean())
+        results[engine] = {"seconds": seconds, "sizes": sizes, "left_out": int((labels < 0).sum()),
+                           "mean_distance_to_center_km": float(np.mean(spread))}
+    return results
+
+
+def run_instance(size, days, seed, waiting_time, max_visits, time_limit, milp_max_places, model_max_places,
+                 heuristic_budget, clustering="spectral", cluster_capacity=None, clustering_time_budget=None,
+                 compare_engines=(), warm_start_solver=None):
+    city = SyntheticCity(size, seed=seed)
+    client = StubClient(city)
+    processor = PlacesDataRetriever(None, city.name, 50000, 480, 1140, client=client,
+                                    geocoder=StubGeocoder(city))
+    processor.concurrent_requests = 16
+    processor.queries_per_second = 10 ** 6
+    processor.clustering_engine = clustering
+    processor.cluster_capacity = cluster_capacity
+    processor.clustering_time_budget = clustering_time_budget
+    stages = {}
+
+    with stage(stages, "fetch"):
+        processor.get_lat_long(city.name)
+        # Every place of the city, the Places API itself would stop at 60 per search
+        processor.data_conversion(city.nearby_pages())
+        processor.retrieve_open_close_times()
+    clustering_comparison = compare_clustering(processor, days, compare_engines, cluster_capacity,
+                                               clustering_time_budget) if compare_engines else None
+    with stage(stages, "clustering"):
+        processor.perform_location_clustering(days)
+    with stage(stages, "hotels"):
+        processor.retrieve_hotels()
+    with stage(stages, "distance_matrix"):
+        processor.retrieve_distance_matrix()
+
+    day_results = []
+    for i, cluster in enumerate(processor.cluster_order_by_avg_prominence):
+        with stage(stages, "route_setup"):
+            route = bestpriceColletingRoute(i, cluster, processor)
+            route.waiting_time = waiting_time
+            route.max_number_of_visits = max_visits
+            route.heuristic_time_budget = heuristic_budget
+        result = {"day": i + 1, "places": len(route.NODES)}
+        model = None
+        if len(route.NODES) <= model_max_places:
+            with stage(stages, "model_build"):
+                model = MatrixModel(route, route.arc_model())
+            result.update(arcs=route.arc_stats, **model.size)
+
+        route.solv = "HEURISTIC"
+        with stage(stages, "solve_heuristic"):
+            route.optimize()
+        result["heuristic_objective"] = route.objective
+
+        if model is not None and len(route.NODES) <= milp_max_places:
+            with stage(stages, "solve_milp"):
+                model.solve(time_limit=time_limit)
+            result.update(milp_status=model.status, milp_objective=model.objective, milp_seconds=model.runtime,
+                          heuristic_gap=optimality_gap(route.objective, model.objective))
+
+        if warm_start_solver is not None and len(route.NODES) <= milp_max_places:
+            # Same day solved from scratch and from a heuristic start
+            route.solv, route.timeout = warm_start_solver, time_limit
+            for warm in (False, True):
+                route.warm_start, route.path = warm, []
+                with stage(stages, "solve_warm" if warm else "solve_cold"):
+                    route.optimize()
+                result["warm" if warm else "cold"] = {
+                    "status": route.status, "objective": route.objective, "seconds": route.solve_time,
+                    "first_incumbent": route.first_incumbent, "gap": route.gap,
+                    "start_objective": route.start_objective}
+        day_results.append(result)
+
+    result = {"size": size, "days": days, "seed": seed, "api_calls": dict(client.calls),
+              "stages": stages, "days_detail": day_results}
+    if clustering_comparison is not None:
+        result["clustering_comparison"] = clustering_comparison
+    return result
+
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="places per synthetic city")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--waiting-time", type=int, default=90)
+    parser.add_argument("--max-visits", type=int, default=7)
+    parser.add_argument("--time-limit", type=float, default=10, help="MILP seconds per day")
+    parser.add_argument("--milp-max-places", type=int, default=60,
+                        help="days with more places only get the heuristic")
+    parser.add_argument("--model-max-places", type=int, default=1000,
+                        help="days with more places skip the model build (memory grows with places^2)")
+    parser.add_argument("--heuristic-budget", type=int, default=200, help="milliseconds per day")
+    parser.add_argument("--clustering", choices=ENGINES, default="spectral", help="clustering engine of the pipeline")
+    parser.add_argument("--cluster-capacity", type=int, default=None, help="places per day (balanced engine)")
+    parser.add_argument("--clustering-time-budget", type=float, default=None, help="seconds")
+    parser.add_argument("--compare-clustering", choices=ENGINES, nargs="*", default=[],
+                        help="also time these engines on the same places")
+    parser.add_argument("--compare-warm-start", metavar="SOLVER", choices=["CBC", "GUROBI", "HIGHS"], default=None,
+                        help="solve MILP days cold and warm started with this solver")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "itinative": itinative.__version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "arguments": vars(args),
+        },
+        "results": [],
+    }
+
+    # Stages load their dependencies lazily, load them up front so the stage timings measure the work
+    # (benchmarks/import_time.py measures the imports)
+    for module in ("sklearn.cluster", "scipy.optimize", "scipy.sparse", "pulp"):
+        try:
+            require(module)
+        except ModuleNotFoundError:
+            pass
+    tracemalloc.start()
+    for size in args.sizes:
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            result = run_instance(size, args.days, args.seed, args.waiting_time, args.max_visits, args.time_limit,
+                                  args.milp_max_places, args.model_max_places, args.heuristic_budget,
+                                  args.clustering, args.cluster_capacity, args.clustering_time_budget,
+                                  args.compare_clustering, args.compare_warm_start)
+        result["total_seconds"] = time.perf_counter() - started
+        report["results"].append(result)
+        print(f"{size:>6} places  " + "  ".join(f"{name} {record['seconds']:.3f}s"
+                                                 for name, record in result["stages"].items()))
+        for day in result["days_detail"]:
+            if "warm" in day:
+                cold, warm = day["cold"], day["warm"]
+                print(f"{'':>6}   day {day['day']}: first incumbent {_round(cold['first_incumbent'])} -> "
+                      f"{_round(warm['first_incumbent'])} s, gap {_round(cold['gap'])} -> {_round(warm['gap'])}")
+        for engine, record in result.get("clustering_comparison", {}).items():
+            print(f"{'':>6}   {engine:<9} {record['seconds']:.3f}s  sizes {record['sizes']}  "
+                  f"{record['mean_distance_to_center_km']:.2f} km to center")
+    tracemalloc.stop()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
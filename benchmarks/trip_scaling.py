@@ -0,0 +1,64 @@
+"""
+Wall time of multi-city trips of growing length on synthetic regions (no API calls), the number of
+cities grows with the days so the time should grow about linearly:
+
+    python benchmarks/trip_scaling.py --cities 2 4 8 16 --days-per-city 3 --solver HEURISTIC --output trips.json
+"""
+import io
+import os
+import sys
+import json
+import argparse
+from time import perf_counter
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from itinative.trip import TripPlanner  # noqa: E402
+from itinative.synthetic import SyntheticRegion, StubClient, StubGeocoder  # noqa: E402
+
+
+def time_trip(n_cities, days_per_city, places, solver, workers, seed=0):
+    names = [f"City {k}" for k in range(n_cities)]
+    region = SyntheticRegion(names, places, seed=seed)
+    trip = TripPlanner(n_cities * days_per_city, names, api_key=None)
+    trip.agent.client = StubClient(region)
+    trip.agent.geocoder = StubGeocoder(region)
+    trip.agent.solver = solver
+    trip.agent.solver_workers = workers
+    trip.agent.queries_per_second = 1000
+    started = perf_counter()
+    with redirect_stdout(io.StringIO()):
+        segments = trip.plan()
+    seconds = perf_counter() - started
+    return {"cities": n_cities, "days": trip.days, "seconds": seconds,
+            "planned_days": sum(segment.days for segment in segments),
+            "travel_days": sum(segment.travel_days for segment in segments),
+            "stops": sum(len(day) for segment in segments for day in segment.itineraries)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--days-per-city", type=int, default=3)
+    parser.add_argument("--places", type=int, default=40, help="places per city")
+    parser.add_argument("--solver", default="HEURISTIC")
+    parser.add_argument("--workers", type=int, default=1, help="solver processes shared by the cities")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    time_trip(1, 1, args.places, args.solver, 1)  # warm up, the first trip pays for the imports
+    results = []
+    for n_cities in args.cities:
+        result = time_trip(n_cities, args.days_per_city, args.places, args.solver, args.workers)
+        results.append(result)
+        print(f"{n_cities:3} cities {result['days']:4} days  {result['seconds']:8.2f}s  "
+              f"{result['seconds'] / result['days']:6.3f}s per day  travel days {result['travel_days']}  "
+              f"stops {result['stops']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"solver": args.solver, "workers": args.workers, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
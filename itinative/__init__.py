@@ -2,4 +2,13 @@ __version__ = "1.13"
 __author__ = "Parth Gera, Mohit Mahajan, Abhinav Garg"
 __doc__ = "Recommend a daily-itinerary minimizing the time spent in travel and maximizing the prominence covered"
 
-from itinative.__main__ import initialize
+
+def __getattr__(name):
+    # itinative.initialize / itinative.Agent import the planner on first use, `import itinative` stays light
+    if name in ("initialize", "Agent"):
+        from itinative import __main__
+        return getattr(__main__, name)
+    if name == "TripPlanner":
+        from itinative.trip import TripPlanner
+        return TripPlanner
+    raise AttributeError(f"module 'itinative' has no attribute {name!r}")
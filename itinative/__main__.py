@@ -1,5 +1,8 @@
+from itinative.budget import LatencyBudget
 from itinative.helper_functions import PlacesDataRetriever
-from itinative.day_scheduler import bestpriceColletingRoute
+from itinative.instrumentation import Tracer
+from itinative.day_scheduler import bestpriceColletingRoute, solve_in_order, solve_in_parallel, solve_with_budget, \
+    sweep_days
 
 
 class Agent(object):
@@ -11,8 +14,35 @@ class Agent(object):
         self.default_closing_time = 1140  # 7 PM * 60
         self.waiting_time = 90  # Minutes
         self.maxVisits_in_a_day = 7
+        self.solver = "GUROBI"  # "GUROBI", "CBC", "HIGHS" or "HEURISTIC" (no MILP solver needed)
+        self.solver_workers = 1  # processes solving days in parallel, 1 solves them one after another
+        self.solver_threads = None  # threads per solver process
+        self.warm_start = False  # start MILP solves from a heuristic route / the day's previous solution
+        self.solver_timeout = 99  # seconds per day
+        self.heuristic_time_budget = 200  # milliseconds per day, solver "HEURISTIC"
+        self.prune_arcs = True  # drop arcs that can't meet the time windows before building the MILP
+        self.k_nearest = None  # keep only the arcs to / from the k nearest places of every place
+        self.time_budget = None  # seconds for a whole generate(), the days get the best route found in time
+        self.concurrent_requests = 8  # Place Details requests in flight
+        self.queries_per_second = 10
+        self.rate_limiter = None  # itinative.throttling.TokenBucket shared with other agents (e.g. a TripPlanner)
+        self.search_mode = "pin"  # "tiled" searches a hexagonal grid over the whole coverage radius
+        self.target_candidates = None  # tiled search: stop once this many places are found
+        self.distance_mode = "haversine"  # "road" asks the Distance Matrix API for road distances
+        self.road_network = None  # "osm": itinative.road_network.RoadNetwork or path of a .osm extract
+        self.clustering_engine = "spectral"  # "spectral", "kmeans" or "balanced"
+        self.candidates_per_day = None  # "balanced" engine: places kept per day, None keeps them all
+        self.clustering_time_budget = None  # seconds
+        self.cache = None  # itinative.cache.ResponseCache to reuse API responses across runs
+        self.client = None  # googlemaps.Client (or a stand-in like itinative.synthetic.StubClient) to share
+        self.geocoder = None  # Nominatim by default
+        self.tracer = Tracer()  # timings, API calls and solver stats of the runs
         self.extract_from_file = False  # debugging tool
+        self.verbose = True  # progress messages on stdout
+        self.snapshot = None  # path of a city snapshot (PlacesDataRetriever.export_snapshot), no API calls
         self.api_key = api_key
+        self.processor = None  # kept between runs, see retrieve()
+        self._solved = {}  # route_key >> solved day route of the last run
         self.time_format = """
         Itinative accepts a time value in military format. Here are a few examples:
         
@@ -38,33 +68,155 @@ class Agent(object):
         assert new_closing_time % 100 < 60, "Invalid time value!"
         self.default_closing_time = 60 * (new_closing_time // 100) + new_closing_time % 100
 
-    def generate(self):
+    def retrieve(self, budget=None):
         # Retrieve Data >>
         # Perform Clustering on the fly
         # Generate Distance Matrix
-        processor = PlacesDataRetriever(self.api_key, self.location, self.maxCoverage,
-                                        self.default_opening_time,
-                                        self.default_closing_time, extract_from_file=self.extract_from_file)
-        processor.get_places_api_data()
-        processor.perform_location_clustering(self.days)
-        print("Looking for hotels ... ")
-        processor.retrieve_hotels()
-        processor.retrieve_distance_matrix()
+        # The processor is reused across runs, its stages only rerun when their inputs change
+        processor = self.configure(budget)
+        processor.run(self.days)
+        return processor
 
-        print("Generating itinerary ... ")
+    def configure(self, budget=None):
+        """The processor with the agent's settings, nothing retrieved yet"""
+        if self.processor is None:
+            self.processor = PlacesDataRetriever(self.api_key, self.location, self.maxCoverage,
+                                                 self.default_opening_time,
+                                                 self.default_closing_time, extract_from_file=self.extract_from_file,
+                                                 cache=self.cache, client=self.client, geocoder=self.geocoder,
+                                                 tracer=self.tracer)
+        processor = self.processor
+        processor.location = self.location
+        processor.coverage = self.maxCoverage
+        processor.default_opening_time = self.default_opening_time
+        processor.default_closing_time = self.default_closing_time
+        processor.extract_from_file = self.extract_from_file
+        processor.verbose = self.verbose
+        processor.snapshot = self.snapshot
+        processor.concurrent_requests = self.concurrent_requests
+        processor.queries_per_second = self.queries_per_second
+        processor.rate_limiter = self.rate_limiter
+        processor.search_mode = self.search_mode
+        processor.target_candidates = self.target_candidates
+        processor.distance_mode = self.distance_mode
+        processor.road_network = self.road_network
+        processor.clustering_engine = self.clustering_engine
+        processor.cluster_capacity = self.candidates_per_day
+        processor.clustering_time_budget = self.clustering_time_budget
+        processor.deadline = budget.deadline("retrieve") if budget is not None else None
+        return processor
 
+    def day_routes(self, processor):
         # First find the cluster with highest avg prominence -
+        trips = []
         for i, cluster in enumerate(processor.cluster_order_by_avg_prominence):
-            print(f"Determining best route for day {i + 1}")
             _trip = bestpriceColletingRoute(i, cluster, processor)
             _trip.waiting_time = self.waiting_time
             _trip.max_number_of_visits = self.maxVisits_in_a_day
-            _trip.solve()
+            _trip.solv = self.solver
+            _trip.threads = self.solver_threads
+            _trip.warm_start = self.warm_start
+            _trip.timeout = self.solver_timeout
+            _trip.heuristic_time_budget = self.heuristic_time_budget
+            _trip.prune_arcs = self.prune_arcs
+            _trip.k_nearest = self.k_nearest
+            trips.append(_trip)
+        return trips
+
+    def route_key(self, processor, trip):
+        # Everything a day's solution depends on, the pipeline versions cover places, clusters, hotel and distances
+        return (processor.pipeline.version("opening_hours"), processor.pipeline.version("distance_matrix"),
+                trip.day, trip.cluster_id, trip.settings(), self.time_budget)
+
+    def iter_days(self):
+        """Yields the DayItinerary of every day, in day order, as soon as it is solved"""
+        budget = LatencyBudget(self.time_budget) if self.time_budget is not None else None
+        processor = self.retrieve(budget)
+
+        processor.say("Generating itinerary ... ")
+        trips = self.day_routes(processor)
+        keys = [self.route_key(processor, _trip) for _trip in trips]
+        # Days whose inputs didn't change since the last run keep their solution, the others start from it
+        previous = {_trip.day: _trip.solution_ids() for _trip in self._solved.values()}
+        self._solved = {key: self._solved[key] for key in keys if key in self._solved}
+        pending = [_trip for _trip, key in zip(trips, keys) if key not in self._solved]
+        for _trip in pending:
+            _trip.initial_route = previous.get(_trip.day)
+
+        if budget is not None:
+            # Solver time of every day in proportion to its model, what a day doesn't use goes to the next
+            solved = solve_with_budget(pending, budget, self.solver_workers)
+        elif self.solver_workers > 1 and pending:
+            # Days are independent, solve them side by side and hand them out in day order
+            solved = solve_in_parallel(pending, self.solver_workers)
+        else:
+            solved = solve_in_order(pending)
+
+        for i, key in enumerate(keys):
+            processor.say(f"Determining best route for day {i + 1}")
+            if key not in self._solved:
+                _trip = next(solved)
+                self.tracer.trace_route(_trip)
+                self._solved[key] = _trip
+            yield self._solved[key].itinerary()
+        if budget is not None:
+            self.tracer.event("latency_budget", seconds=budget.seconds, elapsed=budget.elapsed(),
+                              solved=len(pending))
+
+    def sweep(self, scenarios):
+        """
+        Plans the trip once per scenario, e.g. relaxed and packed variants of the same city. A scenario is a
+        dict with any of waiting_time, max_visits, opening_time and closing_time (military, see time_format),
+        the agent's settings fill in the rest. The data is retrieved once and, with solver "HIGHS", every
+        day's model is built once for all the scenarios. Returns a list of DayItinerary per scenario.
+        """
+        processor = self.retrieve()
+        trips = self.day_routes(processor)
+        opening, closing = processor.raw_hours()
+        parameters = [[] for _ in trips]
+        for scenario in scenarios:
+            unknown = set(scenario) - {"waiting_time", "max_visits", "opening_time", "closing_time"}
+            assert not unknown, f"Unknown scenario parameters {sorted(unknown)}"
+            opening_time = military_minutes(scenario.get("opening_time"), self.default_opening_time)
+            closing_time = military_minutes(scenario.get("closing_time"), self.default_closing_time)
+            assert opening_time < closing_time, "Closing time must be after opening time"
+            hours = processor.resolve_hours(opening, closing, opening_time, closing_time)
+            for _trip, day in zip(trips, parameters):
+                opening_times, closing_times = _trip.windows(*hours)
+                day.append({"waiting_time": scenario.get("waiting_time", self.waiting_time),
+                            "max_number_of_visits": scenario.get("max_visits", self.maxVisits_in_a_day),
+                            "opening_times": opening_times, "closing_times": closing_times})
+
+        processor.say(f"Generating {len(scenarios)} itineraries ... ")
+        solved = sweep_days(trips, parameters, self.solver_workers)
+        itineraries = []
+        for k in range(len(scenarios)):
+            for day in solved:
+                self.tracer.trace_route(day[k])
+            itineraries.append([day[k].itinerary() for day in solved])
+        return itineraries
+
+    def generate(self):
+        itineraries = []
+        for day in self.iter_days():
+            day.report()
+            itineraries.append(day)
+        return itineraries
 
     def __repr__(self):
         return f"Itinerary planner for {self.days} in {self.location}"
 
 
+def military_minutes(military_time, default=None):
+    # 930 >> 570, None >> default (minutes)
+    if military_time is None:
+        return default
+    assert isinstance(military_time, int), "Provide a time value in military format, check agent.time_format"
+    assert 2359 >= military_time >= 0, "Time value in invalid domain (0, 2359)"
+    assert military_time % 100 < 60, "Invalid time value!"
+    return 60 * (military_time // 100) + military_time % 100
+
+
 def initialize(api_key="<Need an API key>"):
     assert isinstance(api_key, str), "API key must be a string type. Refer to documentation to obtain your API key"
     assert api_key != "<Need an API key>", "Obtain a Google API key, Refer to documentation"
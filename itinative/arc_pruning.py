@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class PrunedArcs(object):
+    """
+    Arcs of a day route that can appear in a feasible solution, with the visit time windows tightened
+    by propagating them along those arcs and a big-M per arc for constraint (5).
+
+    Node 0 is the hotel in the morning, 1..n are the places, n + 1 is the hotel in the evening.
+    An arc (i, j) is dropped when even leaving i as early as possible misses the window of j:
+    earliest[i] + waiting_time + distances[i][j] > latest[j]. With k_nearest, places also only keep
+    arcs to their k nearest successors and from their k nearest predecessors (hotel arcs are always
+    kept), which trades a little optimality for a model that grows with n * k instead of n^2.
+    With prune=False all the arcs of the full model are kept with the original big-M.
+    """
+
+    def __init__(self, distances, opening_times, closing_times, waiting_time, k_nearest=None, max_passes=10,
+                 prune=True):
+        self.n = len(distances) - 2
+        o, d = 0, self.n + 1
+        size = self.n + 2
+        dist = np.asarray(distances, dtype=np.float64)
+        w = waiting_time
+
+        # Same arcs as the full model: from [o] + NODES to NODES + [d]
+        allowed = ~np.eye(size, dtype=bool)
+        allowed[:, o] = False
+        allowed[d, :] = False
+        total = int(allowed.sum())
+
+        if prune and k_nearest is not None and self.n > k_nearest:
+            ranked = np.where(allowed, dist, np.inf)
+            ranked[o, :] = np.inf  # hotel arcs are kept anyway
+            ranked[:, d] = np.inf
+            succ = np.zeros_like(allowed)
+            nearest = np.argsort(ranked, axis=1, kind="stable")[:, :k_nearest]
+            np.put_along_axis(succ, nearest, True, axis=1)
+            pred = np.zeros_like(allowed)
+            nearest = np.argsort(ranked, axis=0, kind="stable")[:k_nearest, :]
+            np.put_along_axis(pred, nearest, True, axis=0)
+            keep = succ | pred
+            keep[o, :] = True
+            keep[:, d] = True
+            allowed &= keep
+        self.dominated = total - int(allowed.sum())
+
+        # Visit time windows: T[i] in [earliest, latest] >
+        opening = np.array([opening_times[i] for i in range(size)], dtype=np.float64)
+        closing = np.array([closing_times[i] for i in range(size)], dtype=np.float64)
+        earliest = opening.copy()
+        latest = closing - w
+
+        for _ in range(max_passes if prune else 0):
+            allowed &= earliest[:, None] + w + dist <= latest[None, :]
+            # Arrival no earlier than the earliest departure of any predecessor
+            arrival = np.where(allowed, earliest[:, None] + w + dist, np.inf).min(axis=0)
+            new_earliest = np.maximum(opening, arrival)
+            new_earliest[o] = earliest[o]
+            # Departure no later than what still makes it to the latest successor
+            departure = np.where(allowed, latest[None, :] - w - dist, -np.inf).max(axis=1)
+            new_latest = np.minimum(closing - w, departure)
+            new_latest[d] = latest[d]
+            new_earliest = np.maximum(earliest, new_earliest)
+            new_latest = np.minimum(latest, new_latest)
+            if np.array_equal(new_earliest, earliest) and np.array_equal(new_latest, latest):
+                break
+            earliest, latest = new_earliest, new_latest
+
+        # Places that can't be reached in time are never visited
+        self.unreachable = [i for i in range(1, self.n + 1) if prune and earliest[i] > latest[i]]
+        for i in self.unreachable:
+            allowed[i, :] = False
+            allowed[:, i] = False
+            earliest[i], latest[i] = opening[i], closing[i] - w
+
+        self.infeasible = total - self.dominated - int(allowed.sum())
+        self.earliest = {i: float(earliest[i]) for i in range(size)}
+        self.latest = {i: float(latest[i]) for i in range(size)}
+
+        rows, cols = np.nonzero(allowed)
+        big_m = np.maximum(latest[rows] + w + dist[rows, cols] - earliest[cols], 0)
+        self.arcs = list(zip(rows.tolist(), cols.tolist()))
+        self.big_m = dict(zip(self.arcs, big_m.tolist()))
+        self.successors = {i: [] for i in range(size)}
+        self.predecessors = {i: [] for i in range(size)}
+        for i, j in self.arcs:
+            self.successors[i].append(j)
+            self.predecessors[j].append(i)
+
+        full_m = np.maximum(closing[rows] + dist[rows, cols] - opening[cols], 0)
+        self.big_m_reduction = float((full_m - big_m).sum())
+        self.total = total
+
+    @property
+    def stats(self):
+        removed = self.total - len(self.arcs)
+        return {
+            "arcs": self.total,
+            "arcs_kept": len(self.arcs),
+            "infeasible_arcs": self.infeasible,
+            "dominated_arcs": self.dominated,
+            "unreachable_places": len(self.unreachable),
+            "variables_removed": removed,  # one x per arc
+            "constraints_removed": 2 * removed,  # big-M row and x >= 0 row per arc
+            "big_m_reduction": self.big_m_reduction,
+        }
+
+    def __repr__(self):
+        return f"{len(self.arcs)} of {self.total} arcs"
@@ -0,0 +1,66 @@
+from time import time, perf_counter
+
+# stage >> share of the budget, in pipeline order, what's left after the last stage is slack for the output
+STAGES = (("retrieve", 0.35), ("solve", 0.6))
+
+
+class LatencyBudget(object):
+    """
+    End to end time budget (seconds) of a plan, split into stage deadlines: retrieval (places, hours,
+    clusters, hotel, distances) should be done by `retrieve`, every solve by `solve`. A stage that finishes
+    early leaves its time to the next ones, one that overruns eats into them.
+
+    Solver time is handed out per day in proportion to the size of its model, out of what's left of the
+    solve stage when the day starts (solver_time), see day_scheduler.solve_with_budget.
+    """
+
+    def __init__(self, seconds, stages=STAGES, min_solver_time=0.5):
+        self.seconds = seconds
+        self.stages = stages
+        self.min_solver_time = min_solver_time  # below this a day gets the heuristic instead of a MILP
+        self.started = perf_counter()
+
+    def deadline(self, stage=None):
+        """perf_counter() time by which `stage` (the whole plan when None) should be done"""
+        if stage is None:
+            return self.started + self.seconds
+        share = 0
+        for name, fraction in self.stages:
+            share += fraction
+            if name == stage:
+                return self.started + self.seconds * share
+        raise ValueError(f"Unknown stage {stage}, choose one of {[name for name, _ in self.stages]}")
+
+    def remaining(self, stage=None):
+        return max(0.0, self.deadline(stage) - perf_counter())
+
+    def elapsed(self):
+        return perf_counter() - self.started
+
+    def solver_time(self, weight, pending_weight, workers=1, committed=0.0):
+        """
+        Seconds for a day of model size `weight` when `pending_weight` (that day included) is still to be
+        solved on `workers` processes, `committed` seconds being held by the days already running
+        """
+        remaining = self.remaining("solve")
+        if pending_weight <= 0:
+            return remaining
+        capacity = max(0.0, workers * remaining - committed)
+        return min(remaining, capacity * weight / pending_weight)
+
+    def assign(self, route, seconds, starts_in=0.0):
+        """
+        Gives a day route `seconds` in all, starting `starts_in` seconds from now: a MILP started from a
+        heuristic incumbent (returned with the solver's gap when the time runs out), or only the heuristic
+        when that's too short for a MILP. The route gets the absolute deadline, see route.deadline.
+        """
+        route.deadline = time() + starts_in + seconds
+        if route.solv != "HEURISTIC" and seconds >= self.min_solver_time:
+            route.warm_start = True
+        else:
+            route.solv = "HEURISTIC"
+            route.heuristic_time_budget = max(1, min(route.heuristic_time_budget, int(seconds * 1000)))
+        return seconds
+
+    def __repr__(self):
+        return f"LatencyBudget({self.elapsed():.2f}s of {self.seconds}s)"
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import defaultdict, OrderedDict
+
+DAY = 24 * 60 * 60
+
+# Seconds a response stays fresh, per endpoint
+DEFAULT_TTLS = {
+    "geocode": 90 * DAY,  # cities don't move
+    "places_nearby": 7 * DAY,
+    "place": 7 * DAY,  # operating hours
+    "distance_matrix": 30 * DAY,
+    "distance_pair": 30 * DAY,  # one origin >> destination cell of a distance matrix
+}
+
+
+def normalize(value, precision=6):
+    # Coordinates are rounded so that the same pin always maps to the same key
+    if isinstance(value, float):
+        return round(value, precision)
+    if isinstance(value, (list, tuple)):
+        return [normalize(v, precision) for v in value]
+    if isinstance(value, dict):
+        return {str(k): normalize(v, precision) for k, v in value.items() if v is not None}
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def make_key(params):
+    return json.dumps(normalize(params), sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ResponseCache(object):
+    """
+    Size bounded, least recently used cache of API responses persisted in SQLite. Entries are keyed
+    by endpoint and normalized request parameters and expire after the endpoint's TTL.
+    """
+
+    def __init__(self, path=None, max_entries=50000, ttls=None):
+        self.path = path or os.path.join(os.path.expanduser("~"), ".itinative", "cache.sqlite")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.max_entries = max_entries
+        self.low_water = 0.9  # eviction trims the cache to this share of max_entries, so it runs once in a while
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                endpoint TEXT NOT NULL,
+                                key TEXT NOT NULL,
+                                value TEXT NOT NULL,
+                                created_at REAL NOT NULL,
+                                accessed_at REAL NOT NULL,
+                                PRIMARY KEY (endpoint, key))""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS lru ON responses (accessed_at)")
+        self._db.commit()
+        # Upper bound of the rows (a replaced row counts twice), only counted for real when it overflows
+        self._size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, endpoint, params):
+        key = make_key(params)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM responses WHERE endpoint = ? AND key = ?",
+                                   (endpoint, key)).fetchone()
+            if row is None or now - row[1] > self.ttls.get(endpoint, DAY):
+                self.misses[endpoint] += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE endpoint = ? AND key = ?",
+                             (now, endpoint, key))
+            self._db.commit()
+            self.hits[endpoint] += 1
+        return json.loads(row[0])
+
+    def put(self, endpoint, params, value):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (endpoint, make_key(params), json.dumps(value), now, now))
+            self._size += 1
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Least recently used rows beyond low_water * max_entries, called with the lock held
+        if self._size <= self.max_entries:
+            return
+        self._size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = self._size - int(self.max_entries * self.low_water)
+        if self._size > self.max_entries and overflow > 0:
+            self._db.execute("DELETE FROM responses WHERE rowid IN "
+                             "(SELECT rowid FROM responses ORDER BY accessed_at LIMIT ?)", (overflow,))
+            self._size -= overflow
+
+    def get_many(self, endpoint, params_list):
+        """Values for a batch of requests (None when missing or expired), in one transaction"""
+        now = time.time()
+        values = []
+        with self._lock:
+            for params in params_list:
+                key = make_key(params)
+                row = self._db.execute("SELECT value, created_at FROM responses WHERE endpoint = ? AND key = ?",
+                                       (endpoint, key)).fetchone()
+                if row is None or now - row[1] > self.ttls.get(endpoint, DAY):
+                    self.misses[endpoint] += 1
+                    values.append(None)
+                    continue
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE endpoint = ? AND key = ?",
+                                 (now, endpoint, key))
+                self.hits[endpoint] += 1
+                values.append(json.loads(row[0]))
+            self._db.commit()
+        return values
+
+    def put_many(self, endpoint, items):
+        """Caches (params, value) pairs in one transaction"""
+        now = time.time()
+        with self._lock:
+            rows = [(endpoint, make_key(params), json.dumps(value), now, now) for params, value in items]
+            self._db.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", rows)
+            self._size += len(rows)
+            self._evict()
+            self._db.commit()
+
+    def fetch(self, endpoint, params, request):
+        """Cached value for the request or the response of request() (which then gets cached)"""
+        value = self.get(endpoint, params)
+        if value is None:
+            value = request()
+            self.put(endpoint, params, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._size = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self):
+        endpoints = sorted(set(self.hits) | set(self.misses))
+        report = {e: {"hits": self.hits[e], "misses": self.misses[e]} for e in endpoints}
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        report["total"] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+        return report
+
+    def __repr__(self):
+        return f"ResponseCache({self.path}, {len(self)} entries)"
+
+
+class CachedClient(object):
+    """
+    Drop-in for googlemaps.Client that answers the endpoints used by itinative from the cache.
+
+    Search pages are cached by the search (location, radius, type ...) and the page index: Google's
+    next_page_token expires within minutes, so cached pages keep none and the client hands out its own
+    tokens, backed by Google's while they are fresh. Google only accepts its token page_token_delay
+    seconds after handing it out, the client waits for that itself: callers can ask for cached pages
+    back to back.
+    """
+
+    def __init__(self, client, cache, page_token_delay=2, max_tokens=10000):
+        self.client = client
+        self.cache = cache
+        self.page_token_delay = page_token_delay  # seconds before Google accepts a next_page_token
+        self.max_tokens = max_tokens
+        self._tokens = OrderedDict()  # our token >> (search, page index, Google's token or None, issued)
+        self._lock = threading.Lock()
+
+    def _next_page(self, search, page, response):
+        # The response with our token for the following page, Google's token is only kept in memory
+        response = dict(response)
+        google_token = response.pop("next_page_token", None)
+        if response.pop("more_pages", google_token is not None):
+            token = f"itinative:{make_key(search)}:{page + 1}"
+            with self._lock:
+                self._tokens[token] = (search, page + 1, google_token, time.perf_counter())
+                while len(self._tokens) > self.max_tokens:
+                    self._tokens.popitem(last=False)
+            response["next_page_token"] = token
+        return response
+
+    def _search_page(self, search, page):
+        # A page whose token is gone (earlier pages came from the cache): walk the search from its first page
+        response = self.client.places_nearby(**search)
+        for _ in range(page):
+            time.sleep(self.page_token_delay)
+            response = self.client.places_nearby(**dict(search, page_token=response["next_page_token"]))
+        return response
+
+    def places_nearby(self, page_token=None, **params):
+        search, page, google_token, issued = params, 0, None, None
+        if page_token is not None:
+            with self._lock:
+                known = self._tokens.get(page_token)
+            if known is None:  # not one of ours, nothing to key the page on
+                return self.client.places_nearby(page_token=page_token, **params)
+            search, page, google_token, issued = known
+
+        fresh = []  # the live response, its Google token is good for the next page
+
+        def request():
+            if page == 0:
+                response = self.client.places_nearby(**search)
+            elif google_token is not None:
+                time.sleep(max(0.0, issued + self.page_token_delay - time.perf_counter()))
+                response = self.client.places_nearby(**dict(search, page_token=google_token))
+            else:
+                response = self._search_page(search, page)
+            cached = {k: v for k, v in response.items() if k != "next_page_token"}
+            cached["more_pages"] = "next_page_token" in response
+            fresh.append(response)
+            return cached
+
+        response = self.cache.fetch("places_nearby", dict(search, page=page), request)
+        return self._next_page(search, page, fresh[0] if fresh else response)
+
+    def place(self, place_id, **params):
+        return self.cache.fetch("place", dict(params, place_id=place_id),
+                                lambda: self.client.place(place_id=place_id, **params))
+
+    def distance_matrix(self, origins, destinations, **params):
+        return self.cache.fetch("distance_matrix", dict(params, origins=origins, destinations=destinations),
+                                lambda: self.client.distance_matrix(origins, destinations, **params))
+
+    def __getattr__(self, item):
+        return getattr(self.client, item)
+
+
+class _Location(object):
+    def __init__(self, latitude, longitude, address=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.address = address
+
+
+class CachedGeocoder(object):
+    """Drop-in for a geopy geocoder, only the coordinates of the result are cached"""
+
+    def __init__(self, geocoder, cache):
+        self.geocoder = geocoder
+        self.cache = cache
+
+    def geocode(self, query):
+        def request():
+            location = self.geocoder.geocode(query)
+            return [location.latitude, location.longitude, location.address]
+
+        return _Location(*self.cache.fetch("geocode", {"query": query.lower()}, request))
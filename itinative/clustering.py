@@ -0,0 +1,148 @@
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from itinative.dependencies import require
+
+ENGINES = ("spectral", "kmeans", "balanced")
+
+
+def lloyd_kmeans(xy, days, weights=None, random_state=0, deadline=None, max_iter=100, n_init=3):
+    """
+    Weighted k-means in NumPy (k-means++ seeding, then Lloyd iterations of O(n * days) each), no
+    scikit-learn needed. The best of n_init seedings, stopped at `deadline` (perf_counter()) after any
+    iteration: what every engine falls back to under a time budget. Returns (labels, centers).
+    """
+    rng = np.random.default_rng(random_state)
+    xy = np.asarray(xy, dtype=np.float64)
+    weights = np.ones(len(xy)) if weights is None else np.asarray(weights, dtype=np.float64) + 1e-9
+    best = None
+    for _ in range(n_init):
+        labels, centers = _lloyd(xy, days, weights, rng, deadline, max_iter)
+        inertia = (weights * ((xy - centers[labels]) ** 2).sum(axis=1)).sum()
+        if best is None or inertia < best[0]:
+            best = (inertia, labels, centers)
+        if deadline is not None and perf_counter() > deadline:
+            break
+    return best[1], best[2]
+
+
+def _lloyd(xy, days, weights, rng, deadline, max_iter):
+    n = len(xy)
+    centers = np.empty((days, xy.shape[1]))
+    centers[0] = xy[rng.choice(n, p=weights / weights.sum())]
+    closest = ((xy - centers[0]) ** 2).sum(axis=1)
+    for k in range(1, days):
+        chance = weights * closest
+        centers[k] = xy[rng.choice(n, p=chance / chance.sum())] if chance.sum() > 0 else xy[rng.integers(n)]
+        closest = np.minimum(closest, ((xy - centers[k]) ** 2).sum(axis=1))
+
+    labels = None
+    for _ in range(max_iter):
+        new_labels = ((xy[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        # A day left without places takes the place farthest from its center
+        for k in np.setdiff1d(np.arange(days), new_labels):
+            farthest = ((xy - centers[new_labels]) ** 2).sum(axis=1).argmax()
+            new_labels[farthest] = k
+            centers[k] = xy[farthest]
+        settled = labels is not None and np.array_equal(new_labels, labels)
+        labels = new_labels
+        if settled or (deadline is not None and perf_counter() > deadline):
+            break
+        total = np.bincount(labels, weights=weights, minlength=days)
+        for axis in range(xy.shape[1]):
+            centers[:, axis] = np.bincount(labels, weights=weights * xy[:, axis], minlength=days) / total
+    return labels, centers
+
+
+def spectral_seconds(n):
+    # Rough run time of SpectralClustering on n places (dense affinity), plus its import the first time
+    return 1.5e-7 * n ** 2 + 0.05 + (0 if "sklearn.cluster" in sys.modules else 2.0)
+
+
+def spectral_clustering(xy, days, random_state=0, time_budget=None, weights=None, **kwargs):
+    """
+    Spectral clustering on a dense affinity matrix, at least quadratic in the number of places and
+    can't be interrupted: when it isn't expected to fit the time budget, k-means under the budget instead
+    """
+    if time_budget is not None and spectral_seconds(len(xy)) > time_budget:
+        return lloyd_kmeans(xy, days, weights, random_state, deadline=perf_counter() + time_budget)[0]
+    cluster = require("sklearn.cluster", "clustering")
+    sc = cluster.SpectralClustering(n_clusters=days, random_state=random_state)
+    sc.fit(xy)
+    return sc.labels_
+
+
+def kmeans_clustering(xy, days, weights=None, random_state=0, time_budget=None, **kwargs):
+    """
+    Mini-batch k-means, linear in the number of places. Under a time budget, NumPy k-means that stops
+    iterating when the budget runs out (scikit-learn can't be stopped part way)
+    """
+    if time_budget is not None:
+        return lloyd_kmeans(xy, days, weights, random_state, deadline=perf_counter() + time_budget)[0]
+    cluster = require("sklearn.cluster", "clustering")
+    km = cluster.MiniBatchKMeans(n_clusters=days, random_state=random_state, batch_size=1024, n_init=3,
+                                 max_iter=100)
+    km.fit(xy, sample_weight=weights)
+    return km.labels_
+
+
+def balanced_clustering(xy, days, weights=None, capacity=None, random_state=0, time_budget=None, max_iter=50,
+                        **kwargs):
+    """
+    Capacity constrained assignment: places are assigned by prominence (weights), most prominent first,
+    to the nearest day center that still has room for `capacity` candidates, then the centers move to the
+    weighted mean of their places, until the assignment settles or the time budget (seconds) runs out.
+    Under a budget the seeding k-means is the NumPy one, stopped at half of it.
+
+    With capacity=None every day gets ~n/days places. With a capacity below that, the least prominent
+    places that don't fit are left out of the plan (label -1), so no day's route gets huge.
+    """
+    deadline = perf_counter() + time_budget if time_budget is not None else None
+    n = len(xy)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    capacity = int(np.ceil(n / days)) if capacity is None else int(capacity)
+
+    # Seed the centers with (prominence weighted) k-means
+    if deadline is not None:
+        centers = lloyd_kmeans(xy, days, weights, random_state, deadline=perf_counter() + time_budget / 2)[1]
+    else:
+        cluster = require("sklearn.cluster", "clustering")
+        centers = cluster.MiniBatchKMeans(n_clusters=days, random_state=random_state, n_init=3,
+                                          max_iter=20).fit(xy, sample_weight=weights + 1e-9).cluster_centers_
+    order = np.argsort(-weights, kind="stable")
+    labels = np.full(n, -1, dtype=np.int64)
+    for _ in range(max_iter):
+        distances = ((xy[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        preference = np.argsort(distances, axis=1, kind="stable")
+        room = np.full(days, capacity)
+        new_labels = np.full(n, -1, dtype=np.int64)
+        for row in order:
+            if not room.any():
+                break
+            for cluster in preference[row]:
+                if room[cluster]:
+                    new_labels[row] = cluster
+                    room[cluster] -= 1
+                    break
+        settled = np.array_equal(new_labels, labels)
+        labels = new_labels
+        if settled or (deadline is not None and perf_counter() > deadline):
+            break
+        for cluster in range(days):
+            members = labels == cluster
+            if members.any():
+                centers[cluster] = np.average(xy[members], axis=0, weights=weights[members] + 1e-9)
+    return labels
+
+
+def cluster_places(xy, days, engine="spectral", **kwargs):
+    """Day labels (0..days-1, -1 when a place is left out) of the places at xy (km around the pin)"""
+    if engine == "spectral":
+        return spectral_clustering(xy, days, **kwargs)
+    elif engine == "kmeans":
+        return kmeans_clustering(xy, days, **kwargs)
+    elif engine == "balanced":
+        return balanced_clustering(xy, days, **kwargs)
+    raise ValueError(f"Unknown clustering engine {engine}, choose one of {ENGINES}")
@@ -1,90 +1,274 @@
-import datetime
+import os
+import re
+import copy
+import tempfile
+from time import time, perf_counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-try:
-    import pandas as pd
-    from pulp import *
-except ModuleNotFoundError:
-    print("Missing dependencies!")
-    pass
+from itinative.arc_pruning import PrunedArcs
+from itinative.dependencies import require
+from itinative.heuristics import OrienteeringHeuristic, optimality_gap
+from itinative.itinerary import Stop, DayItinerary
+from itinative.matrix_model import MatrixModel
+
+import numpy as np
 
 
 class bestpriceColletingRoute(object):
     def __init__(self, day, cluster_id, processor):
         self.day = day
+        self.cluster_id = cluster_id
 
         self.waiting_time = None
         self.solv = "GUROBI"
         self.timeout = 99
+        # time() by which optimize() (start, build, solve) should be done, set by a LatencyBudget. Wall clock:
+        # it is compared in the worker process, time spent waiting for a worker counts against it
+        self.deadline = None
+        self.threads = None  # solver threads, None lets the solver decide
+        self.heuristic_time_budget = 200  # milliseconds, solv = "HEURISTIC"
+        self.prune_arcs = True  # drop arcs that can't meet the time windows, tighten big-M
+        self.k_nearest = None  # keep only arcs to/from the k nearest places
+        self.arc_stats = None
         self.max_number_of_visits = 7
         self.msg = 0
+        self.warm_start = False  # start the MILP from a heuristic route / the previous solution
+        self.warm_start_budget = 50  # milliseconds of heuristic search for the start
+        self.initial_route = None  # place ids of an earlier solution of this day, reused as the start
+
+        # Solution >>
+        self.status = None
+        self.objective = None
+        self.solve_time = None
+        self.gap = None  # relative MIP gap reported by the solver
+        self.bound = None  # best prize the solver could still prove possible, None when unknown
+        self.model_size = None  # variables / constraints of the MILP
+        self.timings = {}  # seconds per stage (warm_start, model_build, solve, heuristic)
+        self.first_incumbent = None  # seconds until the first feasible solution, None when unknown
+        self.start_objective = None  # prize of the warm start
+        self.path = []
+        self.visit_times = {}
 
-        self.route_visits = [processor.hotel] + [self.prize for self.prize in processor.place_details
-                                                 if self.prize.cluster_id == cluster_id] + [processor.hotel]
+        table = processor.place_details
+        members = table.cluster_rows(cluster_id)
+        self.members = members  # rows of the places in processor.place_details
+        self.route_visits = [processor.hotel] + [table[row] for row in members] + [processor.hotel]
         # Elegant stuff >>
         self.NODES = [i + 1 for i, loc in enumerate(self.route_visits[1:-1])]
-        self.opening_times = {i: loc.opening_time for i, loc in enumerate(self.route_visits)}
-        self.closing_times = {i: loc.closing_time for i, loc in enumerate(self.route_visits)}
-        self.prize = {i: loc.prominence for i, loc in enumerate(self.route_visits)}
-        self.distances = []
-        for loc_i in self.route_visits:
-            _dist_row = []
-            for loc_j in self.route_visits:
-                _dist_row.append(processor.distance_matrix[(loc_i.place_id, loc_j.place_id)] / 1000 * 0.8)
-            self.distances.append(_dist_row)
+        hotel = processor.hotel
+        self.opening_times, self.closing_times = self.windows(table.opening_time, table.closing_time)
+        self.prize = dict(enumerate([hotel.prominence] + table.prominence[members].tolist() + [hotel.prominence]))
+        # Sub matrix of the cluster (hotel first and last) in minutes
+        rows = np.concatenate([[processor.hotel_row], members, [processor.hotel_row]])
+        self.distances = processor.distance_matrix[np.ix_(rows, rows)].astype(np.float64)
+        self.distances *= processor.minutes_per_unit
+
+    def windows(self, opening, closing):
+        """opening_times / closing_times of the nodes from the hours of all the places (place_details order)"""
+        hotel = self.route_visits[0]
+        return (dict(enumerate([hotel.opening_time] + opening[self.members].tolist() + [hotel.opening_time])),
+                dict(enumerate([hotel.closing_time] + closing[self.members].tolist() + [hotel.closing_time])))
+
+    def get_solver(self, warm_start=False, log_path=None):
+        pulp = require("pulp", "solver")
+        if self.solv == "GUROBI":
+            if self.threads is None:
+                return pulp.GUROBI(TimeLimit=self.solver_timeout(), msg=self.msg, warmStart=warm_start,
+                                   LogFile=log_path or "")
+            return pulp.GUROBI(TimeLimit=self.solver_timeout(), msg=self.msg, Threads=self.threads,
+                               warmStart=warm_start, LogFile=log_path or "")
+        elif self.solv == "CBC":
+            return pulp.PULP_CBC_CMD(timeLimit=self.solver_timeout(), msg=self.msg, threads=self.threads,
+                                     warmStart=warm_start, logPath=log_path)
+        else:
+            print(self.solv + " solver doesn't exists")
+            quit()
+
+    def solver_timeout(self):
+        """Solver time limit: timeout, or what's left until the deadline after the warm start and the model build"""
+        if self.deadline is None:
+            return self.timeout
+        return max(0.1, min(self.timeout, self.deadline - time()))
+
+    def settings(self):
+        """Solve settings of the route, with its data everything the solution depends on"""
+        return (self.waiting_time, self.max_number_of_visits, self.solv, self.threads, self.timeout,
+                self.heuristic_time_budget, self.prune_arcs, self.k_nearest, self.warm_start, self.warm_start_budget)
+
+    def model_weight(self):
+        # Arcs (x variables) of the full model, the solver time of a day is handed out in proportion to it
+        n = len(self.NODES)
+        return (n + 1) ** 2 - n
 
     def solve(self):
+        self.optimize()
+        self.report()
+
+    def arc_model(self):
+        """Arcs of the model with their big-M, successors / predecessors and visit time windows"""
+        pruned = PrunedArcs(self.distances, self.opening_times, self.closing_times, self.waiting_time,
+                            k_nearest=self.k_nearest, prune=self.prune_arcs)
+        self.arc_stats = pruned.stats
+        return pruned
 
+    def incumbent(self):
+        """
+        Warm start: (route, visit times, prize) of a short heuristic search starting from the previous
+        solution (initial_route, or the last path of this route) when there is one, None if nothing fits
+        """
+        started = perf_counter()
+        if self.initial_route is not None:
+            nodes = {place.place_id: i for i, place in enumerate(self.route_visits[1:-1], start=1)}
+            previous = [nodes[place_id] for place_id in self.initial_route if place_id in nodes]
+        else:
+            previous = self.path[1:-1] or None
+        heuristic = OrienteeringHeuristic(self.prize, self.distances, self.opening_times, self.closing_times,
+                                          self.waiting_time, self.max_number_of_visits,
+                                          time_budget=self.warm_start_budget)
+        route = heuristic.solve(initial_route=previous)
+        times = heuristic.schedule(route)
+        self.timings["warm_start"] = perf_counter() - started
+        if not route or times is None:
+            return None
+        self.start_objective = heuristic.collected(route)
+        return route, times, self.start_objective
+
+    def solution_ids(self):
+        """Place ids of the solution in visiting order, see initial_route"""
+        return [self.route_visits[p].place_id for p in self.path[1:-1]]
+
+    def optimize(self, model=None):
+        """`model`: MatrixModel built by a sweep (HIGHS), re-targeted to this route instead of built again"""
+        self.timings = {}
+        self.first_incumbent = None
+        self.start_objective = None
+        self.bound = None
+        started = perf_counter()
+        if self.solv == "HEURISTIC":
+            self.optimize_heuristic()
+        elif self.solv == "HIGHS":
+            self.optimize_matrix(model)
+        else:
+            self.optimize_pulp()
+        self.solve_time = perf_counter() - started
+
+    def scenario(self, parameters):
+        """Unsolved copy of the route with other parameters (waiting_time, max_number_of_visits, windows, ...)"""
+        route = copy.copy(self)
+        for name, value in parameters.items():
+            setattr(route, name, value)
+        route.status = route.objective = route.solve_time = route.gap = None
+        route.path, route.visit_times, route.timings = [], {}, {}
+        return route
+
+    def sweep(self, scenarios):
+        """
+        Solves the day once per scenario (dict of route attributes, see scenario()), a solved route per
+        scenario. With HIGHS the model is built once, over the arcs of the loosest scenario (shortest
+        waiting time, widest windows), every solve only rewrites its bounds, right hand sides and big-M.
+        """
+        routes = [self.scenario(parameters) for parameters in scenarios]
+        if self.solv != "HIGHS" or not routes:
+            for route in routes:
+                route.optimize()
+            return routes
+        started = perf_counter()
+        loosest = self.scenario({
+            "waiting_time": min(route.waiting_time for route in routes),
+            "opening_times": {i: min(route.opening_times[i] for route in routes) for i in self.opening_times},
+            "closing_times": {i: max(route.closing_times[i] for route in routes) for i in self.closing_times},
+        })
+        arc_model = loosest.arc_model()
+        model = MatrixModel(loosest, arc_model)
+        build = perf_counter() - started
+        for route in routes:
+            route.arc_stats = arc_model.stats
+            route.optimize(model)
+            route.timings["shared_model_build"] = build
+        return routes
+
+    def optimize_pulp(self):
+        pulp = require("pulp", "solver")
+        start = self.incumbent() if self.warm_start else None
+        started = perf_counter()
         # Origin
         o = 0
         # Arrive
         d = len(self.NODES) + 1
 
-        prob = LpProblem("PCTSPTW", LpMaximize)  # Maximize problem
-        y = LpVariable.dicts("y", self.NODES, 0, 1, LpBinary)  # y as decision variable for PoI
-        T = LpVariable.dicts("T", ([o] + self.NODES + [d]), None, None, LpContinuous)
+        model = self.arc_model()
+        arcs, big_m = model.arcs, model.big_m
+        successors, predecessors = model.successors, model.predecessors
+
+        prob = pulp.LpProblem("PCTSPTW", pulp.LpMaximize)  # Maximize problem
+        y = pulp.LpVariable.dicts("y", self.NODES, 0, 1, pulp.LpBinary)  # y as decision variable for PoI
+        T = pulp.LpVariable.dicts("T", ([o] + self.NODES + [d]), None, None, pulp.LpContinuous)
         # T as visit time at specific node
-        x = LpVariable.dicts("x", [(i, j)
-                                   for i in ([o] + self.NODES)
-                                   for j in (self.NODES + [d])
-                                   if i != j], 0, 1, LpBinary)  # x as decision variable for an arc between two nodes
+        x = pulp.LpVariable.dicts("x", arcs, 0, 1, pulp.LpBinary)  # x as decision variable for an arc between two nodes
 
-        prob += lpSum(self.prize[i] * y[i] for i in self.NODES)  # Objective function
+        prob += pulp.lpSum(self.prize[i] * y[i] for i in self.NODES)  # Objective function
 
         # Constraint (1)
         for i in self.NODES:
-            prob += lpSum(x[(i, j)] for j in ([d] + self.NODES) if i != j) == y[i]
+            prob += pulp.lpSum(x[(i, j)] for j in successors[i]) == y[i]
 
         # Constraint (2)
         for j in self.NODES:
-            prob += lpSum(x[(i, j)] for i in ([o] + self.NODES) if i != j) == y[j]
+            prob += pulp.lpSum(x[(i, j)] for i in predecessors[j]) == y[j]
 
         # Constraint (3)
-        prob += lpSum(x[(o, j)] for j in self.NODES) == 1
+        prob += pulp.lpSum(x[(o, j)] for j in successors[o] if j != d) == 1
 
         # Constraint (4)
-        prob += lpSum(x[(i, d)] for i in self.NODES) == 1
+        prob += pulp.lpSum(x[(i, d)] for i in predecessors[d] if i != o) == 1
 
         # Constraint (5)
-        for i in ([o] + self.NODES):
-            for j in ([d] + self.NODES):
-                if (i != j):
-                    prob += (T[i] + self.waiting_time + self.distances[i][j] - T[j]) <= max(
-                        self.closing_times[i] + self.distances[i][j] - self.opening_times[j], 0) * (1 - x[(i, j)])
-                    prob += x[(i, j)] >= 0
+        for (i, j) in arcs:
+            prob += (T[i] + self.waiting_time + self.distances[i][j] - T[j]) <= big_m[(i, j)] * (1 - x[(i, j)])
+            prob += x[(i, j)] >= 0
 
         # Constraint (6)
         for i in ([o] + self.NODES + [d]):
-            prob += T[i] >= self.opening_times[i]
-            prob += T[i] + self.waiting_time <= self.closing_times[i]
+            prob += T[i] >= model.earliest[i]
+            prob += T[i] + self.waiting_time <= model.latest[i] + self.waiting_time
 
         # Constraint (7)
-        prob += lpSum(y[i] for i in self.NODES) <= self.max_number_of_visits
+        prob += pulp.lpSum(y[i] for i in self.NODES) <= self.max_number_of_visits
+
+        # Warm start >> initial values of the heuristic route, when all its arcs made it into the model
+        warm = start is not None and set(zip([o] + start[0], start[0] + [d])) <= set(arcs)
+        if warm:
+            route, times = start[0], start[1]
+            chosen = set(zip([o] + route, route + [d]))
+            visit = dict(zip([o] + route + [d], times))
+            for i in self.NODES:
+                y[i].setInitialValue(1 if i in visit else 0)
+            for arc in arcs:
+                x[arc].setInitialValue(1 if arc in chosen else 0)
+            for i in T:
+                T[i].setInitialValue(min(max(visit.get(i, model.earliest[i]), model.earliest[i]), model.latest[i]))
+
+        self.model_size = {"variables": prob.numVariables(), "constraints": prob.numConstraints()}
+        self.timings["model_build"] = perf_counter() - started
 
+        log_file, log_path = tempfile.mkstemp(suffix=".log")
+        os.close(log_file)
+        started = perf_counter()
+        prob.solve(self.get_solver(warm_start=warm, log_path=log_path))
+        self.timings["solve"] = perf_counter() - started
+        first_incumbent, gap, bound = parse_solver_log(log_path, self.solv)
+        os.remove(log_path)
+        self.status = pulp.LpStatus[prob.status]
+        if prob.sol_status == pulp.LpSolutionIntegerFeasible:
+            self.status = "Not Solved"  # stopped on the time limit with a feasible solution, as HiGHS reports it
+        self.gap = gap
+        self.bound = bound
         if self.solv == "GUROBI":
-            prob.solve(GUROBI(TimeLimit=self.timeout, msg=self.msg))
-        else:
-            print(self.solv + " solver doesn't exists")
-            quit()
+            self.gap = getattr(prob.solverModel, "MIPGap", None)
+            self.bound = getattr(prob.solverModel, "ObjBound", bound)
+        self.objective = pulp.value(prob.objective) or 0
+        if first_incumbent is not None:
+            self.first_incumbent = self.timings.get("warm_start", 0) + self.timings["model_build"] + first_incumbent
 
         # prob.writeLP("/tmp/prob/"+ inst + ".lp")
 
@@ -95,70 +279,240 @@ class bestpriceColletingRoute(object):
             # Print PoI visited
             print("PoI visited")
             for i in self.NODES:
-                if (value(y[i]) >= 1):
+                if (pulp.value(y[i]) >= 1):
                     print("y_" + str(i), "=", 1)
             print("--------")
 
+        self.set_solution([arc for arc in arcs if (pulp.value(x[arc]) or 0) > 0.5],
+                          {i: pulp.value(T[i]) for i in T})
+        self.keep_incumbent(start)
+
+    def optimize_matrix(self, model=None):
+        start = self.incumbent() if self.warm_start else None
+        started = perf_counter()
+        if model is None:
+            model = MatrixModel(self, self.arc_model())
+        else:
+            model.update(self)
+        self.model_size = model.size
+        self.timings["model_build"] = perf_counter() - started
+        model.solve(time_limit=self.solver_timeout(), threads=self.threads, msg=self.msg,
+                    objective_floor=start[2] if start is not None else None)
+        self.timings["solve"] = model.runtime
+        self.gap = model.gap
+        self.bound = model.bound
+        self.status = model.status
+        self.objective = model.objective
+        self.set_solution(model.used_arcs(), model.visit_times())
+        self.keep_incumbent(start)
+
+    def keep_incumbent(self, start):
+        """
+        The warm start stands when the solver ran out of time without anything better, the route is then
+        the heuristic's (status "Heuristic"). first_incumbent stays what the solver reported.
+        """
+        if start is None:
+            return
+        if not self.path[1:-1] or self.objective < start[2] - 1e-6:
+            route, times, prize = start
+            self.path = [0] + route + [0]
+            self.visit_times = dict(zip(route, times[1:]))
+            self.objective = prize
+            self.status = "Heuristic"
+            # Gap of the start to what the solver could still prove possible
+            self.gap = optimality_gap(prize, self.bound) if self.bound is not None else None
+
+    def set_solution(self, used_arcs, visit_times):
+        o, d = 0, len(self.NODES) + 1
         edges = []
         # # Printing archs used
-        for i in [o] + self.NODES:
-            for j in [d] + self.NODES:
-                if (i != j):
-                    if (value(x[(i, j)]) >= 1):
-                        if j != d:
-                            if self.msg == 1:
-                                print("x(" + str(i) + "_" + str(j) + ") =", 1)
-                            edges.append((i, j))
-                        else:
-                            if self.msg == 1:
-                                print("x(" + str(i) + "_" + str(o) + ") =", 1)
-                            edges.append((i, o))
+        for (i, j) in used_arcs:
+            if j != d:
+                if self.msg == 1:
+                    print("x(" + str(i) + "_" + str(j) + ") =", 1)
+                edges.append((i, j))
+            else:
+                if self.msg == 1:
+                    print("x(" + str(i) + "_" + str(o) + ") =", 1)
+                edges.append((i, o))
         if self.msg:
             print("--------")
 
-        # # Printing path
-        path = []
-        node = 0
-        for i in range(0, len(edges)):
-            for j in edges:
-                if node == j[0]:
-                    path.append(node)
-                    node = j[1]
-                    edges.remove(j)
+        # Path >> follow the successor of every node from the hotel
+        successor = np.full(len(self.NODES) + 1, -1, dtype=np.int64)
+        for (i, j) in edges:
+            successor[i] = j
+        path = [o]
+        node = successor[o]
+        while node > 0 and len(path) <= len(self.NODES):
+            path.append(int(node))
+            node = successor[node]
         path.append(0)
+        self.path = path
+        self.visit_times = {p: visit_times[p] for p in path[1:-1]}
 
-        itinerary_records = [{
-            "Point of Interest": "Start at the hotel",
-            "Arrive at": "Have Breakfast",
-            "Depart at": "-"
-            # datetime.time(hour=round((value(T[path[0]]) + self.waiting_time) / 60),
-            #                        minute=round((value(T[path[0]]) + self.waiting_time) % 60)).strftime("%H:%M")
-        }]
-
-        for p in path[1:-1]:
-            itinerary_records.append({"Point of Interest": self.route_visits[p].name,
-                                      "Arrive at": datetime.time(hour=round(value(T[p]) // 60),
-                                                                 minute=min(round(value(T[p]) % 60), 59)).strftime(
-                                          "%H:%M"),
-                                      "Depart at": datetime.time(
-                                          hour=round((value(T[p]) + self.waiting_time) // 60),
-                                          minute=min(round((value(T[p]) + self.waiting_time) % 60), 59)).strftime(
-                                          "%H:%M")
-                                      })
-        itinerary_records.append({
-            "Point of Interest": "Arrive at the hotel",
-            "Arrive at": "-",
-            # datetime.time(hour=round(value(T[path[-1]]) / 60),
-            #                        minute=round(value(T[path[-1]]) % 60)).strftime("%H:%M"),
-            "Depart at": "Take Rest!"
-        })
+    def optimize_heuristic(self):
+        started = perf_counter()
+        time_budget = self.heuristic_time_budget
+        if self.deadline is not None:
+            time_budget = max(1, min(time_budget, int((self.deadline - time()) * 1000)))
+        heuristic = OrienteeringHeuristic(self.prize, self.distances, self.opening_times, self.closing_times,
+                                          self.waiting_time, self.max_number_of_visits, time_budget=time_budget)
+        route = heuristic.solve()
+        times = heuristic.schedule(route)
+        self.status = "Heuristic" if times is not None else "Infeasible"
+        self.objective = heuristic.collected(route)
+        self.path = [0] + route + [0]
+        self.visit_times = {p: t for p, t in zip(route, (times or [])[1:])}
+        self.timings["heuristic"] = perf_counter() - started
 
+    def itinerary(self):
+        """Solution as a DayItinerary"""
+        stops = []
+        for p in self.path[1:-1]:
+            place = self.route_visits[p]
+            stops.append(Stop(place.place_id, place.name, place.lat, place.lng, self.prize[p],
+                              self.visit_times[p], self.visit_times[p] + self.waiting_time))
+        return DayItinerary(self.day + 1, self.cluster_id, stops, self.objective, self.status, self.solve_time,
+                            self.solv, gap=self.gap)
+
+    def report(self):
         if self.msg:
             print("--------")
             print("\nPath:")
-            print(*path, sep="->")
+            print(*self.path, sep="->")
+
+        self.itinerary().report()
+
+
+def parse_solver_log(path, solver):
+    """
+    (seconds to the first incumbent, final relative gap, best possible prize) from a CBC or Gurobi log,
+    None when not there
+    """
+    try:
+        with open(path) as f:
+            log = f.read()
+    except OSError:
+        return None, None, None
+    first_incumbent, gap, bound = None, None, None
+    if solver == "CBC":
+        found = re.search(r"Integer solution of \S+ found .*?\(([\d.]+) seconds\)", log)
+        if re.search(r"MIPStart provided solution", log, re.IGNORECASE):
+            first_incumbent = 0.0
+        elif found:
+            first_incumbent = float(found.group(1))
+        reported = re.search(r"^Gap:\s+(\S+)", log, re.MULTILINE)
+        if reported:
+            try:
+                gap = abs(float(reported.group(1)))  # CBC minimizes -prize, the sign is of no use
+            except ValueError:
+                pass
+        reported = re.search(r"^(?:Lower|Upper) bound:\s+(\S+)", log, re.MULTILINE)
+        if reported:
+            try:
+                bound = abs(float(reported.group(1)))
+            except ValueError:
+                pass
+    elif solver == "GUROBI":
+        node = re.search(r"^\s*[H*]\s*\d+.*?(\d+)s\s*$", log, re.MULTILINE)
+        if re.search(r"Loaded user MIP start|Found heuristic solution", log):
+            first_incumbent = 0.0
+        elif node:
+            first_incumbent = float(node.group(1))
+        reported = re.search(r"best bound ([-+\d.e]+)", log)
+        if reported:
+            bound = float(reported.group(1))
+    return first_incumbent, gap, bound
+
+
+def _optimize(route):
+    # Runs in a worker process, the solved route is pickled back
+    route.optimize()
+    return route
+
+
+def _sweep(route, scenarios):
+    # Runs in a worker process, the solved scenarios of the day are pickled back
+    return route.sweep(scenarios)
+
+
+def sweep_days(routes, scenarios, workers=1):
+    """
+    routes[k].sweep(scenarios[k]) for every day, the days side by side in a process pool with workers > 1,
+    returns the solved routes of every day (one per scenario)
+    """
+    if workers > 1 and len(routes) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(routes))) as pool:
+            return list(pool.map(_sweep, routes, scenarios))
+    return [route.sweep(day_scenarios) for route, day_scenarios in zip(routes, scenarios)]
+
+
+def solve_with_budget(routes, budget, workers=1):
+    """
+    Optimize the day routes within the solve stage of a LatencyBudget, yields them back in day order.
+    A day gets solver time in proportion to its model size out of what's left when it starts, so the
+    time a day doesn't use (proven optimal early) goes to the days after it.
+    """
+    weights = [route.model_weight() for route in routes]
+    pending = sum(weights)
+    if workers <= 1:
+        for route, weight in zip(routes, weights):
+            budget.assign(route, budget.solver_time(weight, pending))
+            pending -= weight
+            route.optimize()
+            yield route
+        return
+
+    solved, running = {}, {}  # day >> route, future >> (day, perf_counter() its time is up)
+    next_start, next_yield = 0, 0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(routes)))) as pool:
+        while next_yield < len(routes):
+            while next_start < len(routes) and len(running) < workers:
+                now = perf_counter()
+                committed = sum(max(0.0, until - now) for _, until in running.values())
+                seconds = budget.assign(routes[next_start], budget.solver_time(weights[next_start], pending,
+                                                                               workers, committed))
+                pending -= weights[next_start]
+                running[pool.submit(_optimize, routes[next_start])] = (next_start, now + seconds)
+                next_start += 1
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                solved[running.pop(future)[0]] = future.result()
+            while next_yield in solved:
+                yield solved.pop(next_yield)
+                next_yield += 1
+
+
+def assign_budget(routes, budget, workers=1):
+    """
+    Splits the solve stage of a LatencyBudget across day routes submitted all at once to `workers`
+    processes (no reassignment). Days take time in proportion to their model size and each gets the
+    deadline it has in that schedule (a day starts when a worker frees up), the schedule being scaled
+    to end with the stage: queued days don't run past it and waiting for a worker counts against them.
+    """
+    weights = [route.model_weight() for route in routes]
+    free = [0.0] * max(1, min(workers, len(routes)))  # weight done by each worker
+    starts = []
+    for weight in weights:
+        worker = free.index(min(free))
+        starts.append(free[worker])
+        free[worker] += weight
+    scale = budget.remaining("solve") / max(free) if routes and max(free) > 0 else 0.0
+    for route, weight, start in zip(routes, weights, starts):
+        budget.assign(route, weight * scale, starts_in=start * scale)
+    return routes
+
+
+def solve_in_order(routes):
+    """Optimize the day routes one after another, yields each as soon as it is solved"""
+    for route in routes:
+        route.optimize()
+        yield route
+
 
-        print(f"\n###################### DAY {self.day + 1} ######################")
-        itinerary_df = pd.DataFrame(itinerary_records)
-        print(itinerary_df.to_string(index=False))
-        print("###############################################################\n")
+def solve_in_parallel(routes, workers):
+    """Optimize independent day routes in a process pool, yields them back in day order"""
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(routes)))) as pool:
+        for route in pool.map(_optimize, routes):
+            yield route
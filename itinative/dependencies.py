@@ -0,0 +1,22 @@
+import importlib
+
+# extra >> packages it installs (setup.py extras_require)
+EXTRAS = {
+    "clustering": ["scikit-learn"],
+    "solver": ["pulp", "scipy"],
+    "google": ["googlemaps", "geopy"],
+    "osm": ["scipy"],
+}
+
+
+def require(module, extra=None):
+    """
+    Imports `module` when a stage first needs it, so `import itinative` and short lived workers
+    don't pay for pandas, PuLP, scikit-learn or googlemaps they never use. A missing optional
+    dependency raises right away with the extra that installs it.
+    """
+    try:
+        return importlib.import_module(module)
+    except ModuleNotFoundError as error:
+        hint = f", install it with: pip install itinative[{extra}]" if extra else ""
+        raise ModuleNotFoundError(f"{module} is required for this stage{hint}", name=error.name) from error
@@ -1,17 +1,22 @@
+import os
 import time
+import threading
 from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from math import radians, cos, sin, asin, sqrt
 
-try:
-    import pandas as pd
-    import numpy as np
-    import googlemaps
-    from geopy.geocoders import Nominatim
-    from sklearn.cluster import SpectralClustering
-except ModuleNotFoundError:
-    print("Missing dependencies!")
-    pass
+from itinative.cache import CachedClient, CachedGeocoder
+from itinative.clustering import cluster_places
+from itinative.dependencies import require
+from itinative.instrumentation import Tracer, InstrumentedClient, InstrumentedGeocoder, traced
+from itinative.pipeline import Pipeline
+from itinative.place_table import PlaceTable
+from itinative.road_network import RoadNetwork, PROFILES
+from itinative.snapshot import CitySnapshot, PLACE_COLUMNS, as_strings
+from itinative.throttling import TokenBucket, call_with_backoff
+
+import numpy as np
 
 
 def haversine(lon1, lat1, lon2, lat2):
@@ -31,6 +36,21 @@ def haversine(lon1, lat1, lon2, lat2):
     return c * r
 
 
+def haversine_matrix(lng, lat, earthradius=6371):
+    """
+    Pairwise great circle distance in kilometers between all the points given as
+    arrays of longitudes and latitudes (decimal degrees), broadcasted in one go
+    """
+    lng = np.radians(np.asarray(lng, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+
+    dlon = lng[np.newaxis, :] - lng[:, np.newaxis]
+    dlat = lat[np.newaxis, :] - lat[:, np.newaxis]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, np.newaxis] * np.cos(lat)[np.newaxis, :] * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    return c * earthradius
+
+
 def latlon_to_xy(input_lat, input_lon, centerlat, centerlon, earthradius=6371):
     # earthradius and units default to km
     output_lat = input_lat * np.pi / 180
@@ -42,7 +62,58 @@ def latlon_to_xy(input_lat, input_lon, centerlat, centerlon, earthradius=6371):
     return dx, dy
 
 
+def xy_to_latlon(dx, dy, centerlat, centerlon, earthradius=6371):
+    # Inverse of latlon_to_xy
+    lat = centerlat + dy / earthradius * 180 / np.pi
+    lon = centerlon + dx / (earthradius * np.cos(centerlat * np.pi / 180)) * 180 / np.pi
+    return lat, lon
+
+
+def hex_tiles(centerlat, centerlon, coverage, tile_radius):
+    """
+    Centers (lat, lng) of search circles of radius tile_radius (meters) on a hexagonal grid covering the
+    circle of radius coverage around the pin, nearest to the pin first
+    """
+    r = tile_radius / 1000
+    rings = int(np.ceil(coverage / 1000 / (1.5 * r))) + 1
+    q, s = np.meshgrid(np.arange(-rings, rings + 1), np.arange(-rings, rings + 1))
+    x = np.sqrt(3) * r * (q.ravel() + s.ravel() / 2)
+    y = 1.5 * r * s.ravel()
+    d = np.hypot(x, y)
+    keep = d < coverage / 1000 + r
+    order = np.argsort(d[keep], kind="stable")
+    lat, lon = xy_to_latlon(x[keep][order], y[keep][order], centerlat, centerlon)
+    return list(zip(lat.tolist(), lon.tolist()))
+
+
+def military_to_minutes(military_time):
+    # "0930" >> 570
+    datetime_object = datetime.strptime(military_time[0:2] + ':' + military_time[2:4], '%H:%M')
+    return datetime_object.hour * 60 + datetime_object.minute
+
+
+def parse_opening_hours(place_result, default_open, default_close):
+    """
+    Opening and closing time (minutes from midnight) of a place from the `result` of a Place Details
+    response, falls back to the defaults when Google doesn't know the operating hours
+    """
+    opening_hours = place_result.get('opening_hours')
+    if opening_hours is None or opening_hours.get('periods') is None:
+        return default_open, default_close
+    period = opening_hours['periods'][0]
+    if period.get('open') is None or period.get('close') is None:
+        return default_open, default_close
+
+    int_open_time = military_to_minutes(period['open']['time'])
+    int_close_time = military_to_minutes(period['close']['time'])
+    # sometime places close at crazy times
+    return int_open_time, max(int_close_time, default_close, int_open_time)
+
+
 class placeDetails(object):
+    __slots__ = ("place_id", "name", "rating", "user_ratings_total", "lat", "lng", "opening_time", "closing_time",
+                 "cluster_id", "dx", "dy")
+
     def __init__(self):
         self.place_id = None
         self.name = None
@@ -57,6 +128,13 @@ class placeDetails(object):
         self.dx = None
         self.dy = None
 
+    @classmethod
+    def from_fields(cls, fields):
+        place = cls()
+        for key, value in fields.items():
+            setattr(place, key, value)
+        return place
+
     @property
     def prominence(self):
         return self.rating * self.user_ratings_total
@@ -67,7 +145,8 @@ class placeDetails(object):
 
 class PlacesDataRetriever(object):
 
-    def __init__(self, api_key, location, coverage, default_open, default_close, extract_from_file=False):
+    def __init__(self, api_key, location, coverage, default_open, default_close, extract_from_file=False,
+                 cache=None, client=None, geocoder=None, tracer=None):
         self.location = location
         self.coverage = coverage  # in Meters
         self.pin_lat = 41.8781
@@ -75,10 +154,47 @@ class PlacesDataRetriever(object):
         self.default_opening_time = default_open
         self.default_closing_time = default_close
         self.extract_from_file = extract_from_file
-        self.client = googlemaps.Client(key=api_key)
-        self.place_details = []
-        self.places_index_for_id = {}
-        self.distance_matrix = {}
+        self.file_directory = "test"  # extract_from_file: places.csv, hotel_data.csv and distances.csv
+        self.snapshot = None  # path of a city snapshot (export_snapshot), planned from it without API calls
+        self.api_key = api_key
+        self.cache = cache  # itinative.cache.ResponseCache, shared by the API calls
+        self.tracer = tracer if tracer is not None else Tracer()
+        # client / geocoder stand in for googlemaps.Client / Nominatim (e.g. itinative.synthetic)
+        self._client = None
+        self.page_token_delay = 2  # seconds before a next_page_token is accepted
+        if client is not None:
+            self.client = client
+        self.geocoder = geocoder
+        self.concurrent_requests = 8  # Place Details requests in flight
+        self.queries_per_second = 10
+        self.max_retries = 3
+        self.verbose = True  # progress messages on stdout
+        self.rate_limiter = None  # TokenBucket shared with other retrievers (one QPS for a whole trip)
+        self._limiter = None
+        self.search_mode = "pin"  # "pin": one search around the pin, "tiled": hexagonal grid over the coverage
+        self.tile_radius = None  # meters, None: coverage / 3
+        self.target_candidates = None  # tiled search stops once it has this many places
+        self.target_prominence = None  # ... or once their summed prominence gets there
+        self.distance_mode = "haversine"  # "road": Distance Matrix API driving times of the pairs the days need
+        # "osm": travel times on road_network, a RoadNetwork or the path of a .osm extract / .npz snapshot
+        self.road_network = None
+        self.distance_block = (10, 10)  # origins x destinations per request, the API allows 100 elements
+        self.symmetric_distances = True  # road mode: reuse a -> b for b -> a
+        self.travel_mode = "driving"  # "osm": "driving" or "walking" times, see road_network.PROFILES
+        self.clustering_engine = "spectral"  # "spectral", "kmeans" or "balanced", see itinative.clustering
+        self.cluster_capacity = None  # "balanced": candidate places per day, None splits them evenly
+        self.clustering_time_budget = None  # seconds, bounds the iterative engines
+        self.random_state = 0
+        # perf_counter() time retrieval should be done by (LatencyBudget): the search, Place Details, the
+        # clustering and the road distances stop at it (geocoding and the one hotel search don't). Not a memo
+        # key, but a stage that left data out at the deadline runs again on the next run, see skip()
+        self.deadline = None
+        self.truncated = {"places": 0, "distance_matrix": 0}  # stage >> runs cut short by the deadline
+        self._truncation_lock = threading.Lock()
+        self.place_details = PlaceTable()  # candidate places, columnar
+        self.places_index_for_id = {}  # place_id -> row of the distance matrix
+        self.distance_matrix = None  # dense float32 array, place_details rows + [hotel]
+        self.minutes_per_unit = 0.8 / 1000  # distance_matrix unit >> travel minutes, meters unless "road" or "osm"
         self.hotel = None
 
         # Clustering Metadata
@@ -88,170 +204,321 @@ class PlacesDataRetriever(object):
         self.hotel_lng = None
         self.cluster_order_by_avg_prominence = []
 
+        # Memoized stages, run(days) only reruns the ones whose inputs changed >
+        self.days = None
+        self.opening_hours_results = None  # Place Details results, parsed again when the defaults change
+        self.file_hours = None  # extract_from_file / snapshot: (opening, closing) as read, NaN when unknown
+        self.closing_floor = True  # hours from Google: places close no earlier than the default closing time
+        self.hotel_recommendations = None  # DataFrame of the lodging candidates around the hotel
+        self._network = None  # ((path, travel_mode), RoadNetwork) loaded for distance_mode "osm"
+        self._snapshot = None  # CitySnapshot opened from self.snapshot
+        self.pipeline = Pipeline(self.tracer)
+        self.pipeline.add("places", self.get_places_api_data,
+                          key=lambda: (self.location, self.coverage, self.extract_from_file, self.snapshot,
+                                       self.search_mode, self.tile_radius, self.target_candidates,
+                                       self.target_prominence, self.truncated["places"]))
+        self.pipeline.add("opening_hours", self.apply_opening_hours,
+                          key=lambda: (self.default_opening_time, self.default_closing_time), upstream=["places"])
+        self.pipeline.add("clustering", lambda: self.perform_location_clustering(self.days),
+                          key=self.clustering_key, upstream=["places"])
+        self.pipeline.add("hotels", self.retrieve_hotels, upstream=["clustering"])
+        self.pipeline.add("distance_matrix", self.retrieve_distance_matrix,
+                          key=lambda: (self.distance_mode, self.symmetric_distances, self.travel_mode,
+                                       self.road_network if isinstance(self.road_network, str)
+                                       else id(self.road_network), self.truncated["distance_matrix"]),
+                          upstream=["places", "hotels"])
+
+    def run(self, days):
+        """
+        Places, operating hours, clusters, hotel and distance matrix for a `days` long trip, only the
+        stages downstream of a changed parameter run again (e.g. new days: clustering, hotels, distances)
+        """
+        self.days = days
+        self.pipeline.run("opening_hours")
+        self.pipeline.run("distance_matrix")
+        return self
+
+    @property
+    def client(self):
+        # Built on first use, runs from a snapshot or from files never need a Google client
+        if self._client is None:
+            self.client = require("googlemaps", "google").Client(key=self.api_key)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        client = InstrumentedClient(client, self.tracer)
+        self._client = CachedClient(client, self.cache, self.page_token_delay) if self.cache is not None else client
+
+    @property
+    def page_token_delay(self):
+        return self._page_token_delay
+
+    @page_token_delay.setter
+    def page_token_delay(self, seconds):
+        self._page_token_delay = seconds
+        if isinstance(self._client, CachedClient):
+            self._client.page_token_delay = seconds
+
+    def page_delay(self):
+        # Seconds to wait before asking for the next page, a CachedClient waits for Google's tokens itself
+        return 0 if isinstance(self._client, CachedClient) else self.page_token_delay
+
+    def out_of_time(self, margin=0.0):
+        # Retrieval past its deadline (or `margin` seconds short of it), the stages keep what they have
+        return self.deadline is not None and time.perf_counter() + margin > self.deadline
+
+    def skip(self, stage):
+        # Data of a memoized stage left out at the deadline: its key changes, the next run fetches it again
+        with self._truncation_lock:
+            self.truncated[stage] += 1
+        self.tracer.count("skipped_after_deadline")
+
+    def say(self, *lines):
+        if self.verbose:
+            print(*lines, sep="\n")
+
+    def limiter(self):
+        # A bucket per stage at queries_per_second, unless the rate is shared with other retrievers
+        return self.rate_limiter if self.rate_limiter is not None else TokenBucket(self.queries_per_second)
+
+    @traced("geocode")
     def get_lat_long(self, location):
-        geolocator = Nominatim(user_agent="Your_Name")
+        geolocator = self.geocoder
+        if geolocator is None:
+            geolocator = require("geopy.geocoders", "google").Nominatim(user_agent="Your_Name")
+        geolocator = InstrumentedGeocoder(geolocator, self.tracer)
+        if self.cache is not None:
+            geolocator = CachedGeocoder(geolocator, self.cache)
         _location = geolocator.geocode(location)
         self.pin_lat = _location.latitude
         self.pin_lng = _location.longitude
         return
 
+    @traced("places_search")
     def data_fetch_placesAPI(self):
         token = None  # page token for going to next page of search
         desirable_places_dict = {}
+        self._limiter = self.limiter()
         # One request returns 20 records
         for i in range(2):
-            desirable_places = self.client.places_nearby(type='tourist_attraction',
-                                                         location=(self.pin_lat, self.pin_lng),
-                                                         radius=self.coverage,
-                                                         rank_by='prominence',
-                                                         page_token=token)  # type = 'tourist_attraction'
-            time.sleep(2)
-            # token for searching next page; to be used in a loop
-            token = desirable_places['next_page_token']
+            desirable_places = call_with_backoff(self.client.places_nearby, type='tourist_attraction',
+                                                 location=(self.pin_lat, self.pin_lng),
+                                                 radius=self.coverage,
+                                                 rank_by='prominence',
+                                                 page_token=token,  # type = 'tourist_attraction'
+                                                 limiter=self._limiter, max_retries=self.max_retries)
             desirable_places_dict[i] = desirable_places
+            # token for searching next page; to be used in a loop
+            token = desirable_places.get('next_page_token')
+            if token is None or i == 1:  # no wait after the last page
+                break
+            if self.out_of_time(self.page_delay()):
+                self.skip("places")
+                break
+            time.sleep(self.page_delay())
         return desirable_places_dict
 
-    def data_conversion(self, desirable_places_dict):
+    def fetch_tile(self, location, radius, found, stop):
+        """All the pages of one tile's search, merged into found (place_id >> result) as they arrive"""
+        token = None
+        while not stop.is_set():
+            page = call_with_backoff(self.client.places_nearby, type='tourist_attraction', location=location,
+                                     radius=radius, rank_by='prominence', page_token=token,
+                                     limiter=self._limiter, max_retries=self.max_retries)
+            found(page.get("results", []))
+            token = page.get('next_page_token')
+            if token is None:
+                break
+            # Google only accepts the token after a short while, other tiles keep the pipe busy meanwhile
+            stop.wait(self.page_delay())
+
+    @traced("places_search")
+    def data_fetch_tiled(self):
+        """
+        Places API answers at most 60 places per search, so the coverage circle is split in a hexagonal
+        grid of smaller searches fetched concurrently. Results are deduplicated by place_id, the search
+        stops early at target_candidates places or target_prominence summed prominence.
+        """
+        tile_radius = self.tile_radius or self.coverage / 3
+        tiles = hex_tiles(self.pin_lat, self.pin_lng, self.coverage, tile_radius)
+        # Under a deadline the search gets half of the time left, Place Details the other half
+        search_deadline = None if self.deadline is None else \
+            time.perf_counter() + max(0.0, self.deadline - time.perf_counter()) / 2
+        self._limiter = self.limiter()
+        merged = {}
+        totals = {"prominence": 0.0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def found(results):
+            with lock:
+                for result in results:
+                    if result.get('place_id') not in merged:
+                        merged[result.get('place_id')] = result
+                        totals["prominence"] += result.get('rating', 3) * result.get('user_ratings_total', 100)
+                done = (self.target_candidates is not None and len(merged) >= self.target_candidates) or \
+                    (self.target_prominence is not None and totals["prominence"] >= self.target_prominence)
+                late = not done and search_deadline is not None and time.perf_counter() > search_deadline
+                if late and not stop.is_set():
+                    self.skip("places")
+                if done or late:
+                    stop.set()
+
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrent_requests)) as pool:
+            futures = [pool.submit(self.fetch_tile, tile, int(tile_radius), found, stop) for tile in tiles]
+            for future in futures:
+                future.result()
+        self.tracer.event("tiled_search", tiles=len(tiles), tile_radius=tile_radius, places=len(merged),
+                          stopped_early=stop.is_set())
+        return {0: {"results": list(merged.values())}}
 
+    def data_conversion(self, desirable_places_dict):
+        records = []
         for k, val in desirable_places_dict.items():
             for i, result in enumerate(val["results"]):
-                thisLocation = placeDetails()
-                thisLocation.place_id = result.get('place_id')
-                thisLocation.name = result.get('name', "Name not Available!")
-                thisLocation.rating = result.get('rating', 3)
-                thisLocation.user_ratings_total = result.get('user_ratings_total', 100)
-                thisLocation.lat = result['geometry']['location'].get('lat')
-                thisLocation.lng = result['geometry']['location'].get('lng')
-                self.place_details.append(thisLocation)
-
+                records.append({
+                    "place_id": result.get('place_id'),
+                    "name": result.get('name', "Name not Available!"),
+                    "rating": result.get('rating', 3),
+                    "user_ratings_total": result.get('user_ratings_total', 100),
+                    "lat": result['geometry']['location'].get('lat'),
+                    "lng": result['geometry']['location'].get('lng'),
+                })
+        self.place_details.extend(records)
         return
 
+    def fetch_opening_hours(self, place_id):
+        if self.out_of_time():
+            self.skip("places")
+            return {"result": {}}  # the place gets the default hours
+        return call_with_backoff(self.client.place, place_id=place_id, fields=['opening_hours'],
+                                 limiter=self._limiter, max_retries=self.max_retries)
+
+    @traced("opening_hours")
     def retrieve_open_close_times(self):
-        print("Looking up operating hours ...")
-
-        for i, place in enumerate(self.place_details):
-            place_details = self.client.place(place_id=place.place_id)
-            if (place_details['result'].get('opening_hours') == None):
-                int_open_time = self.default_opening_time
-                int_close_time = self.default_closing_time
-            elif (place_details['result']['opening_hours'].get('periods') == None):
-                int_open_time = self.default_opening_time
-                int_close_time = self.default_closing_time
-            elif ((place_details['result']['opening_hours']['periods'][0].get('open') == None) | (
-                    place_details['result']['opening_hours']['periods'][0].get('close') == None)):
-                int_open_time = self.default_opening_time
-                int_close_time = self.default_closing_time
-            else:
-                # Time conversion
-                open_time = place_details['result']['opening_hours']['periods'][0]['open']['time']
-                datetime_str = open_time[0:2] + ':' + open_time[2:4]
-                datetime_object = datetime.strptime(datetime_str, '%H:%M')
-                int_open_time = datetime_object.hour * 60 + datetime_object.minute
-
-                # Time conversion
-                close_time = place_details['result']['opening_hours']['periods'][0]['close']['time']
-                datetime_str = close_time[0:2] + ':' + close_time[2:4]
-                datetime_object = datetime.strptime(datetime_str, '%H:%M')
-                # close_times[i] = datetime_object
-                int_close_time = datetime_object.hour * 60 + datetime_object.minute
-            place.opening_time = int_open_time
-            place.closing_time = max(int_close_time, self.default_closing_time, int_open_time)
-            # sometime places close at crazy times
-            time.sleep(2)
+        self.say("Looking up operating hours ...")
+        self._limiter = self.limiter()
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrent_requests)) as pool:
+            responses = pool.map(self.fetch_opening_hours, self.place_details.place_id)
+            self.opening_hours_results = [place_details['result'] for place_details in responses]
+        self.apply_opening_hours()
+        return
+
+    def apply_opening_hours(self):
+        """Opening / closing times of the places from what Google (or the file) knows and the defaults"""
+        table = self.place_details
+        table.opening_time[:], table.closing_time[:] = self.resolve_hours(*self.raw_hours(),
+                                                                          self.default_opening_time,
+                                                                          self.default_closing_time)
         return
 
+    def raw_hours(self):
+        """(opening, closing) minutes of the places as Google / the file knows them, NaN when unknown"""
+        if self.file_hours is not None:
+            return self.file_hours
+        hours = [parse_opening_hours(result, np.nan, np.nan) for result in self.opening_hours_results or []]
+        if not hours:
+            return np.full(len(self.place_details), np.nan), np.full(len(self.place_details), np.nan)
+        opening, closing = zip(*hours)
+        return np.array(opening, dtype=np.float64), np.array(closing, dtype=np.float64)
+
+    def resolve_hours(self, opening, closing, default_open, default_close):
+        """Raw hours with the defaults filled in, see parse_opening_hours"""
+        opening = np.where(np.isnan(opening), default_open, opening)
+        closing = np.where(np.isnan(closing), default_close, closing)
+        if self.closing_floor:
+            closing = np.maximum(closing, default_close)
+        return opening, closing
+
     def MakeDataset(self):
-        records = []
-        for item in self.place_details:
-            records.append({
-                "place_id": item.place_id,
-                "name": item.name,
-                "rating": item.rating,
-                "user_ratings_total": item.user_ratings_total,
-                "lat": item.lat,
-                "lng": item.lng,
-                "opening_time": item.opening_time,
-                "closing_time": item.closing_time,
-                "cluster_id": item.cluster_id
-            })
-        return pd.DataFrame(records)
+        return self.place_details.to_frame()
 
     def distance_calculation(self, origin, destination):
         # Requires cities name
         my_dist = self.client.distance_matrix(origin, destination)
         return my_dist['rows'][0]['elements'][0]['distance']['value']
 
+    @traced("fetch")
     def get_places_api_data(self):
-        print("Looking for places ...")
+        self.say("Looking for places ...")
+        if self.snapshot is not None:
+            self.load_snapshot()
+            return
+        self._snapshot = None
         if self.extract_from_file:
-            places_df = pd.read_csv("test/places.csv")
-            places_df["opening_time"].fillna(self.default_opening_time, inplace=True)
-            places_df["closing_time"].fillna(self.default_closing_time, inplace=True)
-
-            for i, row in places_df.iterrows():
-                _place = placeDetails()
-                _place.place_id = row["place_id"]
-                _place.name = row["name"]
-                _place.rating = row["rating"]
-                _place.user_ratings_total = row["user_ratings_total"]
-                _place.lat = row["lat"]
-                _place.lng = row["lng"]
-                _place.opening_time = row["opening_time"]
-                _place.closing_time = row["closing_time"]
-                _place.cluster_id = row["cluster_id"]
-                self.place_details.append(_place)
-                self.places_index_for_id[_place.place_id] = i
+            places_df = require("pandas").read_csv(os.path.join(self.file_directory, "places.csv"))
+            self.file_hours = (places_df["opening_time"].values.astype(np.float64),
+                               places_df["closing_time"].values.astype(np.float64))
+            self.closing_floor = False
+
+            self.place_details = PlaceTable.from_frame(places_df)
+            self.places_index_for_id = self.place_details.index_for_id()
+            self.apply_opening_hours()
 
         else:
+            self.place_details = PlaceTable()
+            self.file_hours = None
+            self.closing_floor = True
             self.get_lat_long(self.location)
-            desirable_places_dict = self.data_fetch_placesAPI()
+            if self.search_mode == "tiled":
+                desirable_places_dict = self.data_fetch_tiled()
+            else:
+                desirable_places_dict = self.data_fetch_placesAPI()
             self.data_conversion(desirable_places_dict)
             self.retrieve_open_close_times()
 
     def set_cluster_metadata(self):
-        df = self.MakeDataset()
-        df["prominence"] = df["rating"] * df["user_ratings_total"]
-        grouped_df = df.groupby("cluster_id").agg({"lat": "mean", "lng": "mean", "name": "count", "prominence": "sum"})
-        grouped_df["avg_prominence"] = grouped_df["prominence"] / grouped_df["name"]
-        grouped_df.reset_index(inplace=True, drop=False)
-        grouped_df.sort_values(by=["avg_prominence"], ascending=False, inplace=True)
-        self.number_of_clusters = grouped_df.shape[0]
-        self.cluster_order_by_avg_prominence = grouped_df["cluster_id"].to_list()
-        grouped_df.sort_values(by=["name"], ascending=False, inplace=True)
-        self.largest_cluster = grouped_df.loc[0, "cluster_id"]
-        self.hotel_lat = grouped_df.loc[0, "lat"]
-        self.hotel_lng = grouped_df.loc[0, "lng"]
+        table = self.place_details
+        planned = table.cluster_id >= 0  # -1: left out by a capacity limited clustering
+        cluster_ids, rows, counts = np.unique(table.cluster_id[planned], return_inverse=True, return_counts=True)
+        lat = np.bincount(rows, weights=table.lat[planned]) / counts
+        lng = np.bincount(rows, weights=table.lng[planned]) / counts
+        avg_prominence = np.bincount(rows, weights=table.prominence[planned]) / counts
+
+        self.number_of_clusters = len(cluster_ids)
+        self.cluster_order_by_avg_prominence = cluster_ids[np.argsort(-avg_prominence, kind="stable")].tolist()
+        largest = np.argmax(counts)
+        self.largest_cluster = cluster_ids[largest]
+        self.hotel_lat = lat[largest]
+        self.hotel_lng = lng[largest]
         return
 
+    def clustering_key(self):
+        return (self.days, self.clustering_engine, self.cluster_capacity, self.clustering_time_budget,
+                self.random_state)
+
+    @traced("clustering")
     def perform_location_clustering(self, days):
-        print("Thinking about your itinerary ...")
-        if self.extract_from_file:
-            # Add clustering code  - update place_details.cluster_id >>
-            clustering_data = []
-            for place in self.place_details:
-                _x, _y = latlon_to_xy(place.lat, place.lng, self.pin_lat, self.pin_lng)
-                clustering_data.append([_x, _y])
-            sc = SpectralClustering(n_clusters=days)
-            sc.fit(clustering_data)
-            for i, place in enumerate(self.place_details):
-                place.cluster_id = sc.labels_[i]
-        else:
-            # Add clustering code  - update place_details.cluster_id >>
-            clustering_data = []
-            for place in self.place_details:
-                _x, _y = latlon_to_xy(place.lat, place.lng, self.pin_lat, self.pin_lng)
-                clustering_data.append([_x, _y])
-            sc = SpectralClustering(n_clusters=days)
-            sc.fit(clustering_data)
-            for i, place in enumerate(self.place_details):
-                place.cluster_id = sc.labels_[i]
+        self.say("Thinking about your itinerary ...")
+        # Add clustering code  - update place_details.cluster_id >>
+        table = self.place_details
+        if self._snapshot is not None and self._snapshot.clustering_matches(self.clustering_key()):
+            table.set_clusters(self._snapshot.cluster_id)
+            self.set_cluster_metadata()
+            return
+        _x, _y = latlon_to_xy(table.lat, table.lng, self.pin_lat, self.pin_lng)
+        time_budget = self.clustering_time_budget
+        if self.deadline is not None:
+            left = max(0.0, self.deadline - time.perf_counter())
+            time_budget = left if time_budget is None else min(time_budget, left)
+        labels = cluster_places(np.column_stack([_x, _y]), days, engine=self.clustering_engine,
+                                weights=table.prominence, capacity=self.cluster_capacity,
+                                time_budget=time_budget, random_state=self.random_state)
+        table.set_clusters(labels)
         self.set_cluster_metadata()
         return
 
+    @traced("hotels")
     def retrieve_hotels(self):
-        print("Searching for top hotels ...")
-        if self.extract_from_file:
-            hotel_recommendations = pd.read_csv("test/hotel_data.csv")[
+        self.say("Searching for top hotels ...")
+        pd = require("pandas")
+        if self._snapshot is not None:
+            # The hotel sits at the center of the largest cluster, the candidates are only a recommendation
+            hotel_recommendations = pd.DataFrame(self._snapshot.meta["hotel_recommendations"],
+                                                 columns=["name", "rating", "user_ratings_total", "address"])
+        elif self.extract_from_file:
+            hotel_recommendations = pd.read_csv(os.path.join(self.file_directory, "hotel_data.csv"))[
                 ["place_id", "name", "rating", "user_ratings_total", "address"]]
             hotel_recommendations["prominence_score"] = hotel_recommendations["rating"] * hotel_recommendations[
                 "user_ratings_total"]
@@ -260,11 +527,13 @@ class PlacesDataRetriever(object):
 
         else:
             desirable_hotels_dict = {}
-            desirable_hotels = self.client.places_nearby(type='lodging', location=(self.hotel_lat, self.hotel_lng),
-                                                         radius=5000,
-                                                         rank_by='prominence')
+            desirable_hotels = call_with_backoff(self.client.places_nearby, type='lodging',
+                                                 location=(self.hotel_lat, self.hotel_lng),
+                                                 radius=5000,
+                                                 rank_by='prominence',
+                                                 limiter=self.limiter(), max_retries=self.max_retries)
             desirable_hotels_dict[1] = desirable_hotels
-            token = desirable_hotels['next_page_token']
+            token = desirable_hotels.get('next_page_token')
             hotel_records = []
 
             for i, result in enumerate(desirable_hotels_dict[1]['results']):
@@ -276,15 +545,17 @@ class PlacesDataRetriever(object):
                 record["address"] = result.get("vicinity")
                 hotel_records.append(record)
 
-            hotel_recommendations = pd.DataFrame(hotel_records)
+            hotel_recommendations = pd.DataFrame(hotel_records, columns=["place_id", "name", "rating",
+                                                                          "user_ratings_total", "address"])
             hotel_recommendations["prominence_score"] = hotel_recommendations["rating"] * hotel_recommendations[
                 "user_ratings_total"]
             hotel_recommendations.sort_values(by=["prominence_score"], ascending=False, inplace=True)
             hotel_recommendations.drop(columns=["place_id", "prominence_score"], inplace=True)
 
-        print("******************************** RECOMMENDED LODGING ******************")
-        print(hotel_recommendations.to_string(index=False))
-        print("***********************************************************************")
+        self.hotel_recommendations = hotel_recommendations
+        self.say("******************************** RECOMMENDED LODGING ******************",
+                 hotel_recommendations.to_string(index=False),
+                 "***********************************************************************")
         hotel = placeDetails()
         hotel.place_id = "hotel"
         hotel.name = "hotel"
@@ -297,19 +568,243 @@ class PlacesDataRetriever(object):
         self.hotel = hotel
         return
 
+    @traced("distance_matrix")
     def retrieve_distance_matrix(self):
-        print("Computing distances and transit times ...")
+        self.say("Computing distances and transit times ...")
+        # Rows / columns follow place_details with the hotel as the last row
+        self.places_index_for_id = self.place_details.index_for_id()
+        self.places_index_for_id[self.hotel.place_id] = len(self.place_details)
+        self.minutes_per_unit = 0.8 / 1000
+        if self._snapshot is not None:
+            self.snapshot_distances()
+            return
+
+        # Haversine distances in one broadcasted pass >
+        dist = haversine_matrix(np.append(self.place_details.lng, self.hotel.lng),
+                                np.append(self.place_details.lat, self.hotel.lat))
+        # distance in meters, route builder converts it to minutes
+        # km - miles - (avg speed 30 miles/hr - 0.5 miles/min)
+        self.distance_matrix = (np.round(dist, 2) * 1000).astype(np.float32)
+
         if self.extract_from_file:
-            distances_df = pd.read_csv("test/distances.csv")
-            self.distance_matrix = distances_df.set_index(["place_id_x", "place_id_y"])["road_distance"].to_dict()
-        else:
-            # Haversine distances and conversion to minutes >
-            for i in self.place_details + [self.hotel]:
-                for j in self.place_details + [self.hotel]:
-                    dist = haversine(i.lng, i.lat, j.lng, j.lat)
-                    transit_time = round(dist, 2) * 1000  # distance in meters
-                    # In minutes >> km - miles - (avg speed 30 miles/hr - 0.5 miles/min)
-                    self.distance_matrix[(i.place_id, j.place_id)] = transit_time
+            distances_df = require("pandas").read_csv(os.path.join(self.file_directory, "distances.csv"))
+            rows = distances_df["place_id_x"].map(self.places_index_for_id)
+            cols = distances_df["place_id_y"].map(self.places_index_for_id)
+            known = rows.notna() & cols.notna()
+            self.distance_matrix[rows[known].astype(int).values, cols[known].astype(int).values] = \
+                distances_df.loc[known, "road_distance"].values
+        elif self.distance_mode == "road":
+            self.retrieve_road_distances()
+        elif self.distance_mode == "osm":
+            self.retrieve_network_times()
         return
 
-        # Add Maps API Code
+    @traced("road_network")
+    def retrieve_network_times(self):
+        """Travel minutes on the local road network, straight line estimate where the roads don't connect"""
+        if self.travel_mode not in PROFILES:
+            raise ValueError(f"No {self.travel_mode} times on a road network, choose a travel_mode in {PROFILES}")
+        network = self.road_network
+        if isinstance(network, str):
+            if self._network is None or self._network[0] != (network, self.travel_mode):
+                self._network = ((network, self.travel_mode), RoadNetwork.open(network, profile=self.travel_mode))
+            network = self._network[1]
+        if network.profile != self.travel_mode:
+            raise ValueError(f"The road network has {network.profile} times, travel_mode is {self.travel_mode}")
+        times = network.travel_times(np.append(self.place_details.lat, self.hotel.lat),
+                                               np.append(self.place_details.lng, self.hotel.lng))
+        estimate = self.distance_matrix * self.minutes_per_unit
+        self.distance_matrix = np.where(np.isfinite(times), times, estimate).astype(np.float32)
+        self.minutes_per_unit = 1.0
+        self.tracer.event("road_network", nodes=len(network),
+                          unconnected=int((~np.isfinite(times)).sum()))
+        return
+
+    def route_groups(self):
+        """Rows each day route reads distances between: the cluster's places and the hotel"""
+        return [np.append(self.place_details.cluster_rows(cluster), self.hotel_row).tolist()
+                for cluster in self.cluster_order_by_avg_prominence]
+
+    def distance_blocks(self, groups, missing):
+        """
+        Origins x destinations blocks of at most distance_block covering the missing (origin, destination)
+        cells, chunk by chunk within each group. Symmetric: only i < j is needed, pairs of chunks are
+        requested once and a chunk with itself is split into off diagonal rectangles (its upper triangle)
+        so that no pair is paid for in both directions.
+        """
+        missing = set(missing)
+        n_origins, n_destinations = self.distance_block
+        blocks = []
+
+        def add(rows, columns):
+            cells = [(i, j) for i in rows for j in columns
+                     if ((min(i, j), max(i, j)) if self.symmetric_distances else (i, j)) in missing]
+            if not cells:
+                return
+            missing.difference_update(cells)
+            if self.symmetric_distances:
+                missing.difference_update((j, i) for i, j in cells)
+            blocks.append((sorted({i for i, _ in cells}), sorted({j for _, j in cells})))
+
+        def triangle(nodes):
+            # Upper triangle of nodes x nodes: first half x second half, then each half with itself
+            if len(nodes) < 2:
+                return
+            half = (len(nodes) + 1) // 2
+            add(nodes[:half], nodes[half:])
+            triangle(nodes[:half])
+            triangle(nodes[half:])
+
+        for nodes in groups:
+            if self.symmetric_distances:
+                size = min(n_origins, n_destinations)
+                chunks = [nodes[k:k + size] for k in range(0, len(nodes), size)]
+                for a, rows in enumerate(chunks):
+                    triangle(rows)
+                    for columns in chunks[a + 1:]:
+                        add(rows, columns)
+                continue
+            for rows in [nodes[k:k + n_origins] for k in range(0, len(nodes), n_origins)]:
+                for columns in [nodes[k:k + n_destinations] for k in range(0, len(nodes), n_destinations)]:
+                    add(rows, columns)
+        return blocks
+
+    def fetch_distance_block(self, block):
+        rows, columns = block
+        if self.out_of_time():
+            self.skip("distance_matrix")
+            return []  # the cells keep the haversine estimate
+        coordinates = [(self._lat[k], self._lng[k]) for k in rows], [(self._lat[k], self._lng[k]) for k in columns]
+        response = call_with_backoff(self.client.distance_matrix, *coordinates, mode=self.travel_mode,
+                                     limiter=self._limiter, max_retries=self.max_retries)
+        cells = []
+        for i, row in zip(rows, response.get("rows", [])):
+            for j, element in zip(columns, row.get("elements", [])):
+                if element.get("status") == "OK":
+                    cells.append((i, j, element["duration"]["value"] / 60))
+        return cells
+
+    @traced("road_distances")
+    def retrieve_road_distances(self):
+        """
+        Driving minutes from the Distance Matrix API for the cells the day routes read. Cached pairs
+        aren't requested again, the rest go out in blocks of up to 100 elements, concurrently under the
+        QPS limit. Cells the API can't answer keep the haversine estimate.
+        """
+        self.distance_matrix = (self.distance_matrix * self.minutes_per_unit).astype(np.float32)
+        self.minutes_per_unit = 1.0
+        ids = np.append(self.place_details.place_id, self.hotel.place_id)
+        self._lat = np.append(self.place_details.lat, self.hotel.lat).tolist()
+        self._lng = np.append(self.place_details.lng, self.hotel.lng).tolist()
+        groups = self.route_groups()
+        needed = set()
+        for nodes in groups:
+            needed.update((i, j) for i in nodes for j in nodes
+                          if i != j and (i < j or not self.symmetric_distances))
+        needed = sorted(needed)
+
+        def pair(i, j):
+            return {"origin": ids[i], "destination": ids[j], "mode": self.travel_mode, "unit": "minutes"}
+
+        if self.cache is not None and needed:
+            cached = self.cache.get_many("distance_pair", [pair(i, j) for i, j in needed])
+            hits = [(cell, value) for cell, value in zip(needed, cached) if value is not None]
+            if hits:
+                (rows, columns), values = zip(*[cell for cell, _ in hits]), [value for _, value in hits]
+                self.set_distances(np.array(rows), np.array(columns), np.array(values, dtype=np.float32))
+            needed = [cell for cell, value in zip(needed, cached) if value is None]
+
+        self._limiter = self.limiter()
+        blocks = self.distance_blocks(groups, needed)
+        cells = []
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrent_requests)) as pool:
+            for block_cells in pool.map(self.fetch_distance_block, blocks):
+                cells.extend(block_cells)
+        if cells:
+            rows, columns, values = (np.array(column) for column in zip(*cells))
+            self.set_distances(rows, columns, values.astype(np.float32))
+            if self.cache is not None:
+                self.cache.put_many("distance_pair", [(pair(i, j), float(v)) for i, j, v in cells
+                                                      if i < j or not self.symmetric_distances])
+        self.tracer.event("road_distances", requested=len(needed), blocks=len(blocks), answered=len(cells))
+        return
+
+    def set_distances(self, rows, columns, values):
+        self.distance_matrix[rows, columns] = values
+        if self.symmetric_distances:
+            self.distance_matrix[columns, rows] = values
+
+    @property
+    def hotel_row(self):
+        return len(self.place_details)
+
+    def distance_rows(self, places):
+        """Rows of the distance matrix for a list of places (or place ids)"""
+        return np.array([self.places_index_for_id[getattr(place, "place_id", place)] for place in places],
+                        dtype=np.intp)
+
+    # Snapshots >>
+    def export_snapshot(self, path):
+        """
+        Writes what run() computed (places, raw operating hours, clusters, hotel candidates, distance
+        matrix) as a CitySnapshot directory at `path`, later runs with snapshot=path plan from it
+        """
+        assert self.distance_matrix is not None, "Nothing to export, run(days) first"
+        table = self.place_details
+        # Unknown hours stay NaN so the defaults of the planning run apply
+        opening, closing = self.raw_hours()
+        arrays = {column: as_strings(getattr(table, column)) if getattr(table, column).dtype.kind in "OU"
+                  else getattr(table, column) for column in PLACE_COLUMNS}
+        arrays.update(opening_time=np.asarray(opening, dtype=np.float64),
+                      closing_time=np.asarray(closing, dtype=np.float64),
+                      cluster_id=table.cluster_id, distance_matrix=self.distance_matrix.astype(np.float32))
+        recommendations = self.hotel_recommendations
+        meta = {
+            "location": self.location,
+            "coverage": self.coverage,
+            "pin": [self.pin_lat, self.pin_lng],
+            "clustering": list(self.clustering_key()),
+            "hotel": [self.hotel.lat, self.hotel.lng],
+            "distance_mode": self.distance_mode,
+            "minutes_per_unit": self.minutes_per_unit,
+            "closing_floor": self.closing_floor,
+            "hotel_recommendations": [] if recommendations is None else
+            recommendations.astype(object).where(recommendations.notna(), None).to_dict("records"),
+        }
+        self.say(f"Exporting {len(table)} places to {path} ...")
+        return CitySnapshot.write(path, arrays, meta)
+
+    @traced("snapshot")
+    def load_snapshot(self):
+        """Places stage of a snapshot run: the place table columns stay memory mapped"""
+        if self._snapshot is None or self._snapshot.path != self.snapshot:
+            self._snapshot = CitySnapshot.open(self.snapshot)
+        snapshot = self._snapshot
+        self.pin_lat, self.pin_lng = snapshot.meta["pin"]
+        self.place_details = snapshot.places()
+        self.file_hours = snapshot.hours
+        self.closing_floor = snapshot.meta["closing_floor"]
+        self.places_index_for_id = self.place_details.index_for_id()
+        self.apply_opening_hours()
+
+    def snapshot_distances(self):
+        """Distance matrix stage of a snapshot run, the mapped matrix is used as is while the hotel is the same"""
+        snapshot = self._snapshot
+        # The distances come with the snapshot, a run can't fetch them another way
+        exported = snapshot.meta.get("distance_mode", "haversine")
+        if self.distance_mode not in ("haversine", exported):
+            raise ValueError(f"{snapshot.path} holds {exported} distances, distance_mode {self.distance_mode} "
+                             f"needs a snapshot exported with it")
+        self.minutes_per_unit = snapshot.meta["minutes_per_unit"]
+        if [self.hotel.lat, self.hotel.lng] == snapshot.meta["hotel"]:
+            self.distance_matrix = snapshot.distance_matrix
+            return
+        # Clustered differently, another hotel: private copy with straight line estimates for its row / column
+        self.distance_matrix = np.array(snapshot.distance_matrix)
+        dist = haversine_matrix(np.append(self.hotel.lng, self.place_details.lng),
+                                np.append(self.hotel.lat, self.place_details.lat))[0]
+        estimate = (np.round(dist, 2) * 1000 * 0.8 / 1000 / self.minutes_per_unit).astype(np.float32)
+        self.distance_matrix[self.hotel_row, :-1] = estimate[1:]
+        self.distance_matrix[:-1, self.hotel_row] = estimate[1:]
+        self.distance_matrix[self.hotel_row, self.hotel_row] = 0
+        self.tracer.event("snapshot_hotel_moved", estimated=len(self.place_details))
@@ -0,0 +1,196 @@
+import time
+import copy
+import random
+
+
+class OrienteeringHeuristic(object):
+    """
+    Prize collecting TSP with time windows without a MILP solver: greedy insertion by prize / detour
+    ratio, 2-opt and or-opt moves to shorten the route (making room for more places) and iterated
+    local search (ruin a few visits, recreate, improve) until the time budget runs out.
+
+    Nodes follow bestpriceColletingRoute: 0 is the hotel in the morning, 1..n are the places and
+    n + 1 is the hotel in the evening. Every node (hotel included) takes `waiting_time` minutes.
+    """
+
+    def __init__(self, prize, distances, opening_times, closing_times, waiting_time, max_number_of_visits,
+                 time_budget=200, seed=0):
+        self.n = len(opening_times) - 2
+        self.o = 0
+        self.d = self.n + 1
+        self.prize = [prize.get(i, 0) for i in range(self.n + 2)]
+        self.distances = [list(map(float, row)) for row in distances]
+        self.opening_times = [opening_times[i] for i in range(self.n + 2)]
+        self.closing_times = [closing_times[i] for i in range(self.n + 2)]
+        self.waiting_time = waiting_time
+        self.max_number_of_visits = max_number_of_visits
+        self.time_budget = time_budget  # milliseconds
+        self.random = random.Random(seed)
+        self.iterations = 0
+        self.deadline = None  # perf_counter() time solve() stops at, every move checks it
+
+    def expired(self):
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    # Route evaluation >>
+    def schedule(self, route):
+        """Earliest visit times along o -> route -> d, None if a time window is violated"""
+        w, dist = self.waiting_time, self.distances
+        t = self.opening_times[self.o]
+        if t + w > self.closing_times[self.o]:
+            return None
+        times = [t]
+        prev = self.o
+        for node in route + [self.d]:
+            t = max(self.opening_times[node], t + w + dist[prev][node])
+            if t + w > self.closing_times[node]:
+                return None
+            times.append(t)
+            prev = node
+        return times
+
+    def is_feasible(self, route):
+        return self.schedule(route) is not None
+
+    def collected(self, route):
+        return sum(self.prize[i] for i in route)
+
+    def travel(self, route):
+        nodes = [self.o] + route + [self.d]
+        return sum(self.distances[a][b] for a, b in zip(nodes, nodes[1:]))
+
+    def better(self, route, other):
+        # More prize first, less travel as the tie breaker
+        a, b = self.collected(route), self.collected(other)
+        return a > b or (a == b and self.travel(route) < self.travel(other) - 1e-9)
+
+    # Construction >>
+    def insert(self, route):
+        """Greedy insertion of unvisited places by prize / detour ratio while the route stays feasible"""
+        route = list(route)
+        dist = self.distances
+        while len(route) < self.max_number_of_visits:
+            nodes = [self.o] + route + [self.d]
+            visited = set(route)
+            best = None
+            for j in range(1, self.n + 1):
+                if j in visited:
+                    continue
+                for pos in range(len(nodes) - 1):
+                    a, b = nodes[pos], nodes[pos + 1]
+                    detour = dist[a][j] + dist[j][b] - dist[a][b] + self.waiting_time
+                    ratio = self.prize[j] / max(detour, 1e-6)
+                    if best is not None and ratio <= best[0]:
+                        continue
+                    candidate = route[:pos] + [j] + route[pos:]
+                    if self.is_feasible(candidate):
+                        best = (ratio, candidate)
+            if best is None:
+                break
+            route = best[1]
+            if self.expired():
+                break
+        return route
+
+    # Improvement >>
+    def two_opt(self, route):
+        improved = True
+        while improved and not self.expired():
+            improved = False
+            for i in range(len(route) - 1):
+                for k in range(i + 1, len(route)):
+                    candidate = route[:i] + route[i:k + 1][::-1] + route[k + 1:]
+                    if self.travel(candidate) < self.travel(route) - 1e-9 and self.is_feasible(candidate):
+                        route = candidate
+                        improved = True
+        return route
+
+    def or_opt(self, route):
+        improved = True
+        while improved and not self.expired():
+            improved = False
+            for length in (1, 2, 3):
+                for i in range(len(route) - length + 1):
+                    segment = route[i:i + length]
+                    rest = route[:i] + route[i + length:]
+                    for pos in range(len(rest) + 1):
+                        if pos == i:
+                            continue
+                        candidate = rest[:pos] + segment + rest[pos:]
+                        if self.travel(candidate) < self.travel(route) - 1e-9 and self.is_feasible(candidate):
+                            route = candidate
+                            improved = True
+                            break
+                    if improved:
+                        break
+                if improved:
+                    break
+        return route
+
+    def local_search(self, route):
+        while True:
+            shorter = self.or_opt(self.two_opt(route))
+            extended = self.insert(shorter)
+            if not self.better(extended, route):
+                return route
+            route = extended
+            if self.expired():
+                return route
+
+    def perturb(self, route):
+        if not route:
+            return route
+        route = list(route)
+        for _ in range(self.random.randint(1, max(1, len(route) // 3))):
+            route.pop(self.random.randrange(len(route)))
+        return route
+
+    def repair(self, route):
+        """Drops the least valuable visits until the route meets the time windows and the visit cap"""
+        route = [node for node in route if 1 <= node <= self.n][:self.max_number_of_visits]
+        while route and not self.is_feasible(route):
+            route.remove(min(route, key=lambda node: self.prize[node]))
+        return route
+
+    def solve(self, initial_route=None):
+        """
+        Best route found within the time budget (list of place nodes, hotel excluded), the first greedy
+        insertion and local search included: past the deadline they stop with the feasible route they have
+        """
+        self.deadline = time.perf_counter() + self.time_budget / 1000
+        route = self.repair(initial_route) if initial_route is not None else []
+        best = current = self.local_search(self.insert(route))
+        self.iterations = 0
+        while not self.expired() and best:
+            self.iterations += 1
+            candidate = self.local_search(self.insert(self.perturb(current)))
+            if self.better(candidate, best):
+                best = candidate
+            # Accept sideways moves so the search keeps walking
+            if not self.better(current, candidate):
+                current = candidate
+        return best
+
+
+def optimality_gap(objective, bound):
+    """Relative gap between a solution objective and the best known (or proven) objective"""
+    if not bound:
+        return 0.0
+    return max(0.0, (bound - objective) / abs(bound))
+
+
+def compare_with_milp(route, solver="CBC"):
+    """
+    Solve the same day with the heuristic and with the MILP, returns objectives, runtimes and
+    the optimality gap of the heuristic (route is left untouched)
+    """
+    results = {}
+    for engine in ("HEURISTIC", solver):
+        _route = copy.copy(route)
+        _route.solv = engine
+        started = time.perf_counter()
+        _route.optimize()
+        results[engine] = {"objective": _route.objective, "status": _route.status,
+                           "runtime": time.perf_counter() - started}
+    results["gap"] = optimality_gap(results["HEURISTIC"]["objective"], results[solver]["objective"])
+    return results
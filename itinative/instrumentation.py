@@ -0,0 +1,165 @@
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import functools
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Tracer(object):
+    """
+    Collects what the planning pipeline spends its time on: timing spans per stage (and per day),
+    counters (API calls, bytes) and events (MILP size, solver status, runtime and gap).
+
+    - tracer.subscribe(callback): callback(event) for every span / event as it happens
+    - tracer.profile("clustering"): run cProfile around that stage, see tracer.profile_report(stage)
+    - tracer.to_json(path): dump the trace
+    """
+
+    def __init__(self):
+        self.events = []
+        self.counters = defaultdict(float)
+        self.callbacks = []
+        self.profiled_stages = set()
+        self.profiles = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        self.callbacks.append(callback)
+        return callback
+
+    def profile(self, stage):
+        self.profiled_stages.add(stage)
+
+    def emit(self, event):
+        with self._lock:
+            self.events.append(event)
+        for callback in self.callbacks:
+            callback(event)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def event(self, name, **attributes):
+        self.emit({"type": "event", "name": name, "time": time.time() - self.started, "attributes": attributes})
+
+    def record_span(self, name, duration, start=None, **attributes):
+        start = start if start is not None else time.time() - self.started - duration
+        self.emit({"type": "span", "name": name, "start": start, "duration": duration, "attributes": attributes})
+
+    @contextmanager
+    def span(self, name, **attributes):
+        profiler = cProfile.Profile() if name in self.profiled_stages else None
+        start = time.time() - self.started
+        started = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield attributes
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                with self._lock:
+                    if name in self.profiles:
+                        self.profiles[name].add(profiler)
+                    else:
+                        self.profiles[name] = pstats.Stats(profiler)
+            self.record_span(name, time.perf_counter() - started, start=start, **attributes)
+
+    def profile_report(self, stage, sort="cumulative", limit=25):
+        stream = io.StringIO()
+        self.profiles[stage].stream = stream
+        self.profiles[stage].sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def trace_route(self, route):
+        """Spans and solver event of a solved day route (solved here or in a worker process)"""
+        day = route.day + 1
+        for stage, duration in route.timings.items():
+            self.record_span(stage, duration, day=day)
+        self.event("solver", day=day, solver=route.solv, status=route.status, objective=route.objective,
+                   runtime=route.solve_time, gap=route.gap, warm_start=route.warm_start,
+                   start_objective=route.start_objective, first_incumbent=route.first_incumbent,
+                   **(route.model_size or {}))
+
+    def summary(self):
+        """Total seconds and count per span name"""
+        totals = {}
+        for event in self.events:
+            if event["type"] == "span":
+                total = totals.setdefault(event["name"], {"seconds": 0.0, "count": 0})
+                total["seconds"] += event["duration"]
+                total["count"] += 1
+        return totals
+
+    def to_dict(self):
+        return {"events": list(self.events), "counters": dict(self.counters), "summary": self.summary()}
+
+    def to_json(self, path=None):
+        trace = json.dumps(self.to_dict(), indent=2, default=str)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(trace)
+        return trace
+
+    def __getstate__(self):
+        # Routes travel to worker processes, the trace stays behind
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+
+def traced(stage):
+    """Method decorator, runs the method inside a `stage` span of self.tracer"""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(stage):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class InstrumentedClient(object):
+    """Counts calls and response bytes (size of the JSON payload) per endpoint of a googlemaps.Client-like object"""
+
+    def __init__(self, client, tracer):
+        self.client = client
+        self.tracer = tracer
+
+    def _call(self, endpoint, *args, **kwargs):
+        response = getattr(self.client, endpoint)(*args, **kwargs)
+        self.tracer.count(f"api.{endpoint}.calls")
+        self.tracer.count(f"api.{endpoint}.bytes", len(json.dumps(response, default=str)))
+        return response
+
+    def places_nearby(self, *args, **kwargs):
+        return self._call("places_nearby", *args, **kwargs)
+
+    def place(self, *args, **kwargs):
+        return self._call("place", *args, **kwargs)
+
+    def distance_matrix(self, *args, **kwargs):
+        return self._call("distance_matrix", *args, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self.client, item)
+
+
+class InstrumentedGeocoder(object):
+    def __init__(self, geocoder, tracer):
+        self.geocoder = geocoder
+        self.tracer = tracer
+
+    def geocode(self, query):
+        self.tracer.count("api.geocode.calls")
+        return self.geocoder.geocode(query)
@@ -0,0 +1,79 @@
+import datetime
+
+from itinative.dependencies import require
+
+
+def minutes_to_clock(minutes):
+    # 570.4 >> "09:30"
+    return datetime.time(hour=round(minutes // 60), minute=min(round(minutes % 60), 59)).strftime("%H:%M")
+
+
+class Stop(object):
+    __slots__ = ("place_id", "name", "lat", "lng", "prominence", "arrival", "departure")
+
+    def __init__(self, place_id, name, lat, lng, prominence, arrival, departure):
+        self.place_id = place_id
+        self.name = name
+        self.lat = lat
+        self.lng = lng
+        self.prominence = prominence
+        self.arrival = arrival  # minutes from midnight
+        self.departure = departure
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"{self.name} ({minutes_to_clock(self.arrival)} - {minutes_to_clock(self.departure)})"
+
+
+class DayItinerary(object):
+    """Planned route of one day: the stops in visiting order and how the solver got there"""
+
+    def __init__(self, day, cluster_id, stops, objective, status, solve_time, solver, gap=None):
+        self.day = day  # 1 for the first day of the trip
+        self.cluster_id = cluster_id
+        self.stops = stops
+        self.objective = objective  # prominence collected
+        self.status = status
+        self.solve_time = solve_time  # seconds
+        self.solver = solver
+        self.gap = gap  # relative gap to the best prize the solver could prove, None when unknown
+
+    def records(self):
+        records = [{"Point of Interest": "Start at the hotel", "Arrive at": "Have Breakfast", "Depart at": "-"}]
+        for stop in self.stops:
+            records.append({"Point of Interest": stop.name,
+                            "Arrive at": minutes_to_clock(stop.arrival),
+                            "Depart at": minutes_to_clock(stop.departure)})
+        records.append({"Point of Interest": "Arrive at the hotel", "Arrive at": "-", "Depart at": "Take Rest!"})
+        return records
+
+    def to_frame(self):
+        return require("pandas").DataFrame(self.records())
+
+    def to_dict(self):
+        return {
+            "day": self.day,
+            "cluster_id": self.cluster_id,
+            "stops": [stop.to_dict() for stop in self.stops],
+            "objective": self.objective,
+            "status": self.status,
+            "solve_time": self.solve_time,
+            "solver": self.solver,
+            "gap": self.gap,
+        }
+
+    def report(self):
+        print(f"\n###################### DAY {self.day} ######################")
+        print(self.to_frame().to_string(index=False))
+        print("###############################################################\n")
+
+    def __iter__(self):
+        return iter(self.stops)
+
+    def __len__(self):
+        return len(self.stops)
+
+    def __repr__(self):
+        return f"Day {self.day}: " + " -> ".join(stop.name for stop in self.stops)
@@ -0,0 +1,185 @@
+import time
+
+import numpy as np
+
+from itinative.dependencies import require
+
+# scipy.optimize.milp status >> PuLP status names
+MILP_STATUS = {0: "Optimal", 1: "Not Solved", 2: "Infeasible", 3: "Unbounded", 4: "Undefined"}
+
+
+class MatrixModel(object):
+    """
+    Constraints (1) to (7) of the day route MILP assembled straight into a sparse CSR matrix with
+    NumPy, solved by scipy.optimize.milp (HiGHS). The time windows of constraint (6) become bounds of
+    T and the x >= 0 rows are bounds of x.
+
+    Columns: x for every arc, then y for every place, then T for every node (hotels included).
+
+    update(route) re-targets a built model to another waiting time, visit cap or set of time windows
+    (a scenario of a sweep) by rewriting bounds, right hand sides and big-M coefficients in place,
+    the arcs are those of the model it was built for, which must be the loosest scenario.
+    """
+
+    def __init__(self, route, arc_model):
+        n = len(route.NODES)
+        o, d = 0, n + 1
+        w = route.waiting_time
+        self.n = n
+        self.arcs = arc_model.arcs
+        n_arcs = len(self.arcs)
+        self.x_start, self.y_start, self.T_start = 0, n_arcs, n_arcs + n
+        self.n_columns = n_arcs + n + n + 2
+
+        arcs = np.array(self.arcs, dtype=np.int64).reshape(-1, 2)
+        ai, aj = arcs[:, 0], arcs[:, 1]
+        arc_idx = np.arange(n_arcs)
+        places = np.arange(1, n + 1)
+        y_col = self.y_start + places - 1
+        dist = np.asarray(route.distances, dtype=np.float64)
+        big_m = np.array([arc_model.big_m[arc] for arc in self.arcs], dtype=np.float64)
+        self.arc_from, self.arc_to, self.arc_distance = ai, aj, dist[ai, aj]
+
+        rows, cols, vals, lb, ub = [], [], [], [], []
+
+        def add(r, c, v):
+            rows.append(np.asarray(r, dtype=np.int64))
+            cols.append(np.asarray(c, dtype=np.int64))
+            vals.append(np.broadcast_to(np.asarray(v, dtype=np.float64), np.shape(r)))
+
+        # Constraint (1): sum_j x[i, j] - y[i] == 0
+        out = (ai >= 1) & (ai <= n)
+        add(ai[out] - 1, arc_idx[out], 1.0)
+        add(places - 1, y_col, -1.0)
+        # Constraint (2): sum_i x[i, j] - y[j] == 0
+        inn = (aj >= 1) & (aj <= n)
+        add(n + aj[inn] - 1, arc_idx[inn], 1.0)
+        add(n + places - 1, y_col, -1.0)
+        lb.append(np.zeros(2 * n))
+        ub.append(np.zeros(2 * n))
+        # Constraint (3): leave the hotel once
+        start = (ai == o) & (aj != d)
+        add(np.full(start.sum(), 2 * n), arc_idx[start], 1.0)
+        # Constraint (4): come back once
+        end = (aj == d) & (ai != o)
+        add(np.full(end.sum(), 2 * n + 1), arc_idx[end], 1.0)
+        lb.append(np.ones(2))
+        ub.append(np.ones(2))
+        # Constraint (5): T[i] - T[j] + M x[i, j] <= M - w - d[i][j]
+        self.row_5 = 2 * n + 2
+        r5 = self.row_5 + arc_idx
+        add(r5, self.T_start + ai, 1.0)
+        add(r5, self.T_start + aj, -1.0)
+        add(r5, arc_idx, big_m)
+        lb.append(np.full(n_arcs, -np.inf))
+        ub.append(big_m - w - dist[ai, aj])
+        # Constraint (7): visit at most max_number_of_visits places
+        self.row_7 = self.row_5 + n_arcs
+        add(np.full(n, self.row_7), y_col, 1.0)
+        lb.append(np.array([-np.inf]))
+        ub.append(np.array([route.max_number_of_visits], dtype=np.float64))
+
+        self.n_rows = self.row_7 + 1
+        sparse = require("scipy.sparse", "solver")
+        self.A = sparse.coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                                   shape=(self.n_rows, self.n_columns)).tocsr()
+        self.A.sort_indices()
+        # x[k] is the first column of its (5) row, its big-M sits at the start of the row in A.data
+        self.big_m_entries = self.A.indptr[r5]
+        self.lb = np.concatenate(lb)
+        self.ub = np.concatenate(ub)
+
+        # Objective, milp minimizes >
+        self.c = np.zeros(self.n_columns)
+        self.c[y_col] = -np.array([route.prize[i] for i in places], dtype=np.float64)
+
+        # Constraint (6) and binaries >
+        self.lower = np.zeros(self.n_columns)
+        self.upper = np.ones(self.n_columns)
+        nodes = range(n + 2)
+        self.lower[self.T_start:] = [arc_model.earliest[i] for i in nodes]
+        self.upper[self.T_start:] = [arc_model.latest[i] for i in nodes]
+        self.earliest, self.latest = self.lower[self.T_start:].copy(), self.upper[self.T_start:].copy()
+        self.integrality = np.ones(self.n_columns)
+        self.integrality[self.T_start:] = 0
+
+        self.status = None
+        self.objective = None
+        self.runtime = None
+        self.gap = None
+        self.bound = None  # best prize HiGHS could still prove possible
+        self.solution = None
+
+    def update(self, route):
+        """
+        Waiting time, visit cap and time windows of `route` (same places, tighter than or equal to those
+        the model was built for). The windows propagated at build time stay valid bounds, intersected
+        with the route's own; arcs and places the route can't use get an upper bound of 0.
+        """
+        n, w = self.n, route.waiting_time
+        nodes = range(n + 2)
+        opening = np.array([route.opening_times[i] for i in nodes], dtype=np.float64)
+        closing = np.array([route.closing_times[i] for i in nodes], dtype=np.float64)
+        earliest = np.maximum(self.earliest, opening)
+        latest = np.minimum(self.latest, closing - w)
+        unreachable = np.zeros(n + 2, dtype=bool)
+        unreachable[1:-1] = earliest[1:-1] > latest[1:-1]
+        latest[unreachable] = earliest[unreachable]
+        ai, aj, dist = self.arc_from, self.arc_to, self.arc_distance
+
+        # Constraint (5): big-M coefficients and right hand sides
+        big_m = np.maximum(latest[ai] + w + dist - earliest[aj], 0)
+        self.A.data[self.big_m_entries] = big_m
+        self.ub[self.row_5:self.row_5 + len(ai)] = big_m - w - dist
+        # Constraint (6): bounds of T
+        self.lower[self.T_start:] = earliest
+        self.upper[self.T_start:] = latest
+        # Arcs that miss the windows, places that can't be visited
+        usable = (earliest[ai] + w + dist <= latest[aj]) & ~unreachable[ai] & ~unreachable[aj]
+        self.upper[self.x_start:self.y_start] = usable
+        self.upper[self.y_start:self.T_start] = ~unreachable[1:-1]
+        # Constraint (7)
+        self.ub[self.row_7] = route.max_number_of_visits
+        return self
+
+    @property
+    def size(self):
+        return {"variables": self.n_columns, "constraints": self.n_rows, "nonzeros": int(self.A.nnz)}
+
+    def solve(self, time_limit=None, threads=None, msg=0, objective_floor=None):
+        """
+        HiGHS through scipy runs single threaded, `threads` is accepted for a uniform solver interface.
+        scipy can't pass HiGHS a starting solution, a known incumbent's objective can be given as
+        objective_floor instead (prize collected >= floor), which prunes the search the same way.
+        """
+        options = {"disp": bool(msg)}
+        if time_limit is not None:
+            options["time_limit"] = time_limit
+        A, lb, ub = self.A, self.lb, self.ub
+        if objective_floor is not None:
+            A = require("scipy.sparse", "solver").vstack([A, self.c.reshape(1, -1)], format="csr")
+            lb = np.append(lb, -np.inf)
+            ub = np.append(ub, -objective_floor + 1e-6 * max(1.0, abs(objective_floor)))
+        optimize = require("scipy.optimize", "solver")
+        started = time.perf_counter()
+        result = optimize.milp(self.c, constraints=optimize.LinearConstraint(A, lb, ub), integrality=self.integrality,
+                               bounds=optimize.Bounds(self.lower, self.upper), options=options)
+        self.runtime = time.perf_counter() - started
+        self.status = MILP_STATUS.get(result.status, "Undefined")
+        self.solution = result.x
+        self.objective = -result.fun if result.x is not None else 0
+        self.gap = getattr(result, "mip_gap", None)
+        dual_bound = getattr(result, "mip_dual_bound", None)
+        self.bound = -dual_bound if dual_bound is not None else None
+        return self
+
+    def used_arcs(self):
+        if self.solution is None:
+            return []
+        chosen = np.nonzero(self.solution[self.x_start:self.y_start] > 0.5)[0]
+        return [self.arcs[k] for k in chosen]
+
+    def visit_times(self):
+        if self.solution is None:
+            return {}
+        return {i: float(t) for i, t in enumerate(self.solution[self.T_start:])}
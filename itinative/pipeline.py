@@ -0,0 +1,42 @@
+class Pipeline(object):
+    """
+    Memoized dependency graph of planning stages. A stage is a function (usually updating some
+    object in place) with a key function over the parameters it reads and a list of upstream stages.
+    run(stage) reruns a stage only when its key changed or an upstream stage ran again since, so a
+    parameter change only reruns what's downstream of it.
+    """
+
+    def __init__(self, tracer=None):
+        self.stages = {}  # name >> (func, key, upstream)
+        self.keys = {}  # name >> key of the last run
+        self.versions = {}  # name >> number of runs
+        self.tracer = tracer
+
+    def add(self, name, func, key=lambda: (), upstream=()):
+        self.stages[name] = (func, key, tuple(upstream))
+        return self
+
+    def run(self, name):
+        """Brings the stage (and its upstream stages) up to date, True if it had to run"""
+        func, key, upstream = self.stages[name]
+        for stage in upstream:
+            self.run(stage)
+        current = (key(), tuple(self.versions.get(stage, 0) for stage in upstream))
+        if name in self.keys and self.keys[name] == current:
+            if self.tracer is not None:
+                self.tracer.count(f"pipeline.{name}.reused")
+            return False
+        func()
+        self.keys[name] = current
+        self.versions[name] = self.versions.get(name, 0) + 1
+        return True
+
+    def version(self, name):
+        return self.versions.get(name, 0)
+
+    def invalidate(self, name=None):
+        """Forget the last run of one stage (or all of them), it runs again on the next run()"""
+        if name is None:
+            self.keys.clear()
+        else:
+            self.keys.pop(name, None)
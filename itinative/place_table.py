@@ -0,0 +1,184 @@
+import numpy as np
+
+from itinative.dependencies import require
+
+# column >> dtype
+COLUMNS = {
+    "place_id": object,
+    "name": object,
+    "rating": "float64",
+    "user_ratings_total": "float64",
+    "lat": "float64",
+    "lng": "float64",
+    "opening_time": "float64",
+    "closing_time": "float64",
+    "cluster_id": "int64",
+}
+
+
+class PlaceTable(object):
+    """
+    Columnar store of the candidate places: one NumPy array per attribute, prominence kept up to date
+    with rating and user_ratings_total, and an index from cluster id to rows.
+
+    Iterating (or indexing with an int) gives PlaceRow views, so `place.name`, `place.cluster_id = 2`
+    keep working and write straight into the arrays.
+    """
+
+    def __init__(self, size=0):
+        for column, dtype in COLUMNS.items():
+            setattr(self, column, np.empty(size, dtype=dtype))
+        self.cluster_id[:] = 0
+        self.opening_time[:] = np.nan
+        self.closing_time[:] = np.nan
+        self.prominence = np.zeros(size)
+        self._cluster_index = None
+        self._storage = {}  # column >> array with room to grow, the column is a view on its first rows
+
+    @classmethod
+    def from_records(cls, records):
+        """Table from an iterable of dicts (or objects) with the column names as keys (attributes)"""
+        table = cls()
+        table.extend(records)
+        return table
+
+    @classmethod
+    def from_frame(cls, df):
+        table = cls(len(df))
+        for column in COLUMNS:
+            if column in df:
+                getattr(table, column)[:] = df[column].values
+        table.update_prominence()
+        return table
+
+    @classmethod
+    def from_arrays(cls, columns):
+        """Table over existing arrays (e.g. memory mapped), used as they are, missing columns are allocated"""
+        size = len(next(iter(columns.values())))
+        table = cls(size)
+        for column, values in columns.items():
+            setattr(table, column, values)
+        table.update_prominence()
+        return table
+
+    def reserve(self, size):
+        """Room for `size` rows in every column, grown geometrically so appending row by row stays linear"""
+        n = len(self)
+        for column in list(COLUMNS) + ["prominence"]:
+            values = getattr(self, column)
+            storage = self._storage.get(column)
+            if storage is None or values.base is not storage or len(storage) < size:
+                # First growth, or the column was replaced (e.g. from_arrays): copy it into new storage
+                storage = np.empty(max(size, 2 * n), dtype=COLUMNS.get(column, "float64"))
+                storage[:n] = values
+                self._storage[column] = storage
+
+    def extend(self, records):
+        records = [r if isinstance(r, dict) else {c: getattr(r, c, None) for c in COLUMNS} for r in records]
+        if not records:
+            return
+        n, size = len(self), len(self) + len(records)
+        self.reserve(size)
+        for column, dtype in COLUMNS.items():
+            values = [record.get(column) for record in records]
+            if dtype is not object:
+                default = 0 if column == "cluster_id" else np.nan
+                values = [default if v is None else v for v in values]
+            storage = self._storage[column]
+            storage[n:size] = values
+            setattr(self, column, storage[:size])
+        self.prominence = self._storage["prominence"][:size]
+        self.update_prominence(slice(n, size))
+        self._cluster_index = None
+
+    def append(self, record):
+        self.extend([record])
+
+    def update_prominence(self, rows=slice(None)):
+        self.prominence[rows] = self.rating[rows] * self.user_ratings_total[rows]
+
+    # Clusters >>
+    def set_clusters(self, labels):
+        self.cluster_id[:] = labels
+        self._cluster_index = None
+
+    @property
+    def cluster_index(self):
+        """cluster id >> rows of that cluster (ascending)"""
+        if self._cluster_index is None:
+            order = np.argsort(self.cluster_id, kind="stable")
+            ids, starts = np.unique(self.cluster_id[order], return_index=True)
+            self._cluster_index = dict(zip(ids.tolist(), np.split(order, starts[1:])))
+        return self._cluster_index
+
+    def cluster_rows(self, cluster_id):
+        return self.cluster_index.get(cluster_id, np.empty(0, dtype=np.int64))
+
+    def index_for_id(self):
+        return {place_id: i for i, place_id in enumerate(self.place_id)}
+
+    def to_frame(self):
+        return require("pandas").DataFrame({column: getattr(self, column) for column in COLUMNS})
+
+    # Sequence of rows >>
+    def __len__(self):
+        return len(self.place_id)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [PlaceRow(self, i) for i in range(len(self))[row]]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("place row out of range")
+        return PlaceRow(self, row)
+
+    def __iter__(self):
+        return (PlaceRow(self, i) for i in range(len(self)))
+
+    def __add__(self, other):
+        # place_details + [hotel]
+        return list(self) + list(other)
+
+    def __repr__(self):
+        return f"PlaceTable({len(self)} places)"
+
+
+def _column(name):
+    def getter(view):
+        value = getattr(view.table, name)[view.row]
+        return value.item() if hasattr(value, "item") else value
+
+    def setter(view, value):
+        getattr(view.table, name)[view.row] = value
+        if name in ("rating", "user_ratings_total"):
+            view.table.update_prominence(view.row)
+        elif name == "cluster_id":
+            view.table._cluster_index = None
+
+    return property(getter, setter)
+
+
+class PlaceRow(object):
+    """View on one row of a PlaceTable, reads and writes go to the table's arrays"""
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def prominence(self):
+        return self.table.prominence[self.row].item()
+
+    def __reduce__(self):
+        # A view pickles (e.g. to a worker process) as a standalone copy of the row
+        from itinative.helper_functions import placeDetails
+        return placeDetails.from_fields, ({column: getattr(self, column) for column in COLUMNS},)
+
+    def __repr__(self):
+        return self.name
+
+
+for _name in COLUMNS:
+    setattr(PlaceRow, _name, _column(_name))
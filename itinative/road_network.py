@@ -0,0 +1,191 @@
+import os
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+
+from itinative.dependencies import require
+
+EARTH_RADIUS_KM = 6371
+
+# km/h per highway type when the way has no (usable) maxspeed
+SPEEDS = {
+    "motorway": 100, "motorway_link": 60, "trunk": 80, "trunk_link": 50, "primary": 60, "primary_link": 40,
+    "secondary": 50, "secondary_link": 35, "tertiary": 40, "tertiary_link": 30, "unclassified": 30,
+    "residential": 25, "living_street": 10, "service": 15, "road": 30,
+}
+WALKABLE = set(SPEEDS) - {"motorway", "motorway_link", "trunk", "trunk_link"} | {
+    "footway", "pedestrian", "path", "steps", "track", "cycleway"}
+WALKING_SPEED = 5  # km/h
+PROFILES = ("driving", "walking")
+
+
+def unit_vectors(lat, lng):
+    # Points on the unit sphere, chord lengths between them are monotonic in great circle distance
+    lat, lng = np.radians(lat), np.radians(lng)
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def parse_speed(maxspeed):
+    # "50", "30 mph", "RU:urban" >> km/h or None
+    value = maxspeed.split()[0] if maxspeed else ""
+    if not value.replace(".", "", 1).isdigit():
+        return None
+    return float(value) * (1.609 if "mph" in maxspeed else 1)
+
+
+class RoadNetwork(object):
+    """
+    Road graph of a local OpenStreetMap extract as a CSR matrix of travel times (minutes) between
+    the junction nodes, for offline many-to-many travel time matrices:
+
+    - RoadNetwork.from_osm("city.osm") parses the extract (profile "driving" or "walking")
+    - network.save("city.npz") / RoadNetwork.load("city.npz") persist the preprocessed graph
+    - network.travel_times(lat, lng) snaps the points to the nearest nodes (KD-tree) and runs
+      multi-source Dijkstra from them
+    """
+
+    def __init__(self, lat, lng, indptr, indices, minutes, profile="driving"):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.profile = profile
+        n = len(self.lat)
+        sparse = require("scipy.sparse", "osm")
+        self.graph = sparse.csr_matrix((np.asarray(minutes, dtype=np.float64), indices, indptr), shape=(n, n))
+        self._tree = None
+
+    @classmethod
+    def from_osm(cls, path, profile="driving"):
+        """Parse the nodes and highway ways of a .osm XML extract"""
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile}, choose one of {PROFILES}")
+        node_ids, node_lat, node_lng = [], [], []
+        ways = []  # (node refs, km/h, oneway)
+        for _, element in ElementTree.iterparse(path, events=("end",)):
+            if element.tag == "node":
+                node_ids.append(int(element.get("id")))
+                node_lat.append(float(element.get("lat")))
+                node_lng.append(float(element.get("lon")))
+                element.clear()
+            elif element.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                highway = tags.get("highway")
+                if profile == "walking":
+                    if highway in WALKABLE:
+                        ways.append(([int(nd.get("ref")) for nd in element.iter("nd")], WALKING_SPEED, 0))
+                elif highway in SPEEDS:
+                    speed = parse_speed(tags.get("maxspeed")) or SPEEDS[highway]
+                    oneway = {"yes": 1, "1": 1, "true": 1, "-1": -1}.get(tags.get("oneway"), 0)
+                    if highway == "motorway" or tags.get("junction") == "roundabout":
+                        oneway = oneway or 1
+                    ways.append(([int(nd.get("ref")) for nd in element.iter("nd")], speed, oneway))
+                element.clear()
+            elif element.tag == "relation":
+                element.clear()
+
+        node_ids = np.array(node_ids, dtype=np.int64)
+        order = np.argsort(node_ids)
+        node_ids, node_lat, node_lng = node_ids[order], np.array(node_lat)[order], np.array(node_lng)[order]
+
+        # Segments of every way >
+        sources, targets, speeds, directions = [], [], [], []
+        for refs, speed, oneway in ways:
+            if len(refs) < 2:
+                continue
+            sources.extend(refs[:-1])
+            targets.extend(refs[1:])
+            speeds.extend([speed] * (len(refs) - 1))
+            directions.extend([oneway] * (len(refs) - 1))
+        sources, targets = np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+        speeds, directions = np.array(speeds, dtype=np.float64), np.array(directions, dtype=np.int8)
+
+        # Drop segments to nodes outside the extract, keep only nodes on a road, renumber them 0..n-1
+        position = np.searchsorted(node_ids, sources).clip(0, len(node_ids) - 1)
+        position_to = np.searchsorted(node_ids, targets).clip(0, len(node_ids) - 1)
+        known = (node_ids[position] == sources) & (node_ids[position_to] == targets)
+        position, position_to = position[known], position_to[known]
+        speeds, directions = speeds[known], directions[known]
+        used, renumbered = np.unique(np.concatenate([position, position_to]), return_inverse=True)
+        u, v = renumbered[:len(position)], renumbered[len(position):]
+        lat, lng = node_lat[used], node_lng[used]
+
+        points = unit_vectors(lat, lng)
+        km = chord_to_km(np.linalg.norm(points[u] - points[v], axis=1))
+        minutes = km / speeds * 60
+        forward, backward = directions >= 0, directions <= 0
+        u, v, minutes = (np.concatenate([u[forward], v[backward]]), np.concatenate([v[forward], u[backward]]),
+                         np.concatenate([minutes[forward], minutes[backward]]))
+        return cls.from_edges(lat, lng, u, v, minutes, profile=profile)
+
+    @classmethod
+    def from_edges(cls, lat, lng, u, v, minutes, profile="driving"):
+        """Graph from directed edges u >> v, the fastest of parallel edges is kept"""
+        n = len(lat)
+        order = np.lexsort((minutes, v, u))
+        u, v, minutes = u[order], v[order], minutes[order]
+        first = np.ones(len(u), dtype=bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        u, v, minutes = u[first], v[first], minutes[first]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u, minlength=n), out=indptr[1:])
+        return cls(lat, lng, indptr, v, minutes, profile=profile)
+
+    def save(self, path):
+        np.savez(path, lat=self.lat, lng=self.lng, indptr=self.graph.indptr, indices=self.graph.indices,
+                 minutes=self.graph.data, profile=np.array(self.profile))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["lat"], data["lng"], data["indptr"], data["indices"], data["minutes"],
+                   profile=str(data["profile"]))
+
+    @classmethod
+    def open(cls, path, profile="driving"):
+        """Network of a .npz snapshot or of a .osm extract, preprocessed once into <extract>.<profile>.npz"""
+        if path.endswith(".npz"):
+            return cls.load(path)
+        snapshot = f"{path}.{profile}.npz"
+        if os.path.exists(snapshot) and os.path.getmtime(snapshot) >= os.path.getmtime(path):
+            return cls.load(snapshot)
+        network = cls.from_osm(path, profile=profile)
+        network.save(snapshot)
+        return network
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = require("scipy.spatial", "osm").cKDTree(unit_vectors(self.lat, self.lng))
+        return self._tree
+
+    def snap(self, lat, lng):
+        """Nearest node of every point and the distance (km) to it"""
+        chord, nodes = self.tree.query(unit_vectors(np.atleast_1d(lat), np.atleast_1d(lng)))
+        return nodes, chord_to_km(chord)
+
+    def travel_times(self, lat, lng, access_minutes_per_km=0.8, batch=64):
+        """
+        Minutes between every pair of points: to the nearest node, along the roads, from the nearest
+        node. Pairs without a road connection get inf.
+        """
+        nodes, snap_km = self.snap(lat, lng)
+        access = snap_km * access_minutes_per_km
+        dijkstra = require("scipy.sparse.csgraph", "osm").dijkstra
+        sources, inverse = np.unique(nodes, return_inverse=True)
+        times = np.empty((len(sources), len(sources)))
+        # A few sources at a time, every Dijkstra row spans the whole graph
+        for start in range(0, len(sources), batch):
+            rows = dijkstra(self.graph, directed=True, indices=sources[start:start + batch])
+            times[start:start + batch] = rows[:, sources]
+        matrix = times[np.ix_(inverse, inverse)] + access[:, None] + access[None, :]
+        np.fill_diagonal(matrix, 0)
+        return matrix
+
+    def __len__(self):
+        return self.graph.shape[0]
+
+    def __repr__(self):
+        return f"RoadNetwork({len(self)} nodes, {self.graph.nnz} edges, {self.profile})"
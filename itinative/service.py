@@ -0,0 +1,285 @@
+"""
+Planning service: a long running asyncio HTTP/JSON server answering trip requests
+
+    python -m itinative.service --api-key <key> --port 8080 --cache ~/.itinative/cache.sqlite
+
+    POST /plan     {"location": "Chicago", "days": 3, "opening_time": 800, "closing_time": 1900,
+                    "waiting_time": 90, "max_visits": 7, "time_budget": 20}  >>  {"days": [DayItinerary.to_dict(), ...]}
+    GET  /metrics  requests, queue depths and latency percentiles
+    GET  /health
+"""
+import json
+import time
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from itinative.__main__ import Agent
+from itinative.budget import LatencyBudget
+from itinative.cache import ResponseCache
+from itinative.day_scheduler import _optimize, assign_budget
+from itinative.dependencies import require
+from itinative.throttling import TokenBucket
+
+logger = logging.getLogger("itinative.service")
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               500: "Internal Server Error"}
+
+
+def parse_request(body):
+    """Validated trip request (dict) from the JSON body, ValueError when it isn't one"""
+    try:
+        request = json.loads(body or b"{}")
+    except json.JSONDecodeError as error:
+        raise ValueError(f"Invalid JSON: {error}")
+    if not isinstance(request, dict):
+        raise ValueError("Expected a JSON object")
+    if not isinstance(request.get("location"), str) or not request["location"].strip():
+        raise ValueError("location is required")
+    if isinstance(request.get("days"), bool) or not isinstance(request.get("days"), int) or request["days"] < 1:
+        raise ValueError("days must be a positive integer")
+    trip = {"location": request["location"].strip(), "days": request["days"]}
+    for field in ("opening_time", "closing_time", "waiting_time", "max_visits"):
+        if request.get(field) is not None:
+            if isinstance(request[field], bool) or not isinstance(request[field], int) or request[field] < 0:
+                raise ValueError(f"{field} must be a non negative integer")
+            trip[field] = request[field]
+    if request.get("time_budget") is not None:
+        if isinstance(request["time_budget"], bool) or not isinstance(request["time_budget"], (int, float)) \
+                or request["time_budget"] <= 0:
+            raise ValueError("time_budget must be a positive number of seconds")
+        trip["time_budget"] = request["time_budget"]
+    return trip
+
+
+class LatencyWindow(object):
+    """Latencies (seconds) of the last `size` calls"""
+
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": self.count}
+
+        def percentile(q):
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+        return {"count": self.count, "p50": percentile(0.5), "p95": percentile(0.95), "max": ordered[-1]}
+
+
+class PlanningService(object):
+    """
+    Plans trips for concurrent requests in one process: data retrieval runs on a thread pool, day
+    routes are solved on a process pool, the API client, the response cache and the queries per second
+    limit are shared by all the requests and identical requests in flight are answered by the same run.
+
+    `agent_options` are Agent attributes applied to every request, e.g. solver="HEURISTIC".
+    `client` / `geocoder` stand in for the Google client and Nominatim (itinative.synthetic), with an
+    api_key and no client one googlemaps.Client is built for the service.
+    """
+
+    def __init__(self, api_key=None, cache=None, client=None, geocoder=None, io_workers=8, solve_workers=2,
+                 queries_per_second=10, **agent_options):
+        self.api_key = api_key
+        self.cache = cache
+        if client is None and api_key is not None:
+            client = require("googlemaps", "google").Client(key=api_key)
+        self.client = client
+        self.geocoder = geocoder
+        self.rate_limiter = TokenBucket(queries_per_second)  # Google API calls of all the requests together
+        self.agent_options = agent_options
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers)
+        # Forking next to busy retrieval threads can copy their held locks, start workers from a clean process
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.solve_workers = solve_workers
+        self.solve_pool = ProcessPoolExecutor(max_workers=solve_workers,
+                                              mp_context=multiprocessing.get_context(start_method))
+        self.in_flight = {}  # request key >> task
+        self.counters = {"requests": 0, "deduplicated": 0, "errors": 0}
+        self.queues = {"retrieve": 0, "solve": 0}  # waiting or running
+        self.latency = {"request": LatencyWindow(), "retrieve": LatencyWindow(), "solve": LatencyWindow()}
+        self.started = time.time()
+        self.server = None
+
+    def agent(self, trip):
+        agent = Agent(trip["days"], trip["location"], self.api_key)
+        for option, value in self.agent_options.items():
+            setattr(agent, option, value)
+        agent.cache = self.cache
+        agent.client = self.client
+        agent.geocoder = self.geocoder
+        agent.rate_limiter = self.rate_limiter
+        agent.verbose = False
+        if "opening_time" in trip:
+            agent.configure_opening_time(trip["opening_time"])
+        if "closing_time" in trip:
+            agent.configure_closing_time(trip["closing_time"])
+        agent.waiting_time = trip.get("waiting_time", agent.waiting_time)
+        agent.maxVisits_in_a_day = trip.get("max_visits", agent.maxVisits_in_a_day)
+        agent.time_budget = trip.get("time_budget", agent.time_budget)
+        return agent
+
+    async def plan(self, trip):
+        """Itinerary (list of DayItinerary dicts) of a trip request, shared with identical requests in flight"""
+        self.counters["requests"] += 1
+        key = json.dumps(trip, sort_keys=True)
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.counters["deduplicated"] += 1
+        else:
+            task = asyncio.ensure_future(self._plan(trip))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _run(self, queue, pool, func, *args):
+        loop = asyncio.get_running_loop()
+        self.queues[queue] += 1
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        finally:
+            self.queues[queue] -= 1
+            self.latency[queue].add(time.perf_counter() - started)
+
+    async def _plan(self, trip):
+        started = time.perf_counter()
+        try:
+            agent = self.agent(trip)
+            budget = LatencyBudget(agent.time_budget) if agent.time_budget is not None else None
+            processor = await self._run("retrieve", self.io_pool, agent.retrieve, budget)
+            routes = agent.day_routes(processor)
+            if budget is not None:
+                # The days are solved all at once, their shares of the solve stage are set up front
+                assign_budget(routes, budget, self.solve_workers)
+            solved = await asyncio.gather(*(self._run("solve", self.solve_pool, _optimize, route)
+                                            for route in routes))
+            days = []
+            for route in solved:
+                agent.tracer.trace_route(route)
+                days.append(route.itinerary().to_dict())
+            return days
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            self.latency["request"].add(time.perf_counter() - started)
+
+    def metrics(self):
+        metrics = {
+            "uptime": time.time() - self.started,
+            "in_flight": len(self.in_flight),
+            "queue_depth": dict(self.queues),
+            "latency": {name: window.summary() for name, window in self.latency.items()},
+        }
+        metrics.update(self.counters)
+        if self.cache is not None:
+            metrics["cache"] = self.cache.stats()
+        return metrics
+
+    # HTTP >>
+    async def route(self, method, path, body):
+        if path == "/plan":
+            if method != "POST":
+                return 405, {"error": "POST a trip request"}
+            try:
+                trip = parse_request(body)
+            except (ValueError, AssertionError) as error:
+                return 400, {"error": str(error)}
+            try:
+                return 200, {"days": await self.plan(trip)}
+            except AssertionError as error:  # Agent.configure_* validation
+                return 400, {"error": str(error)}
+            except Exception as error:
+                return 500, {"error": f"{type(error).__name__}: {error}"}
+        if path == "/metrics":
+            return 200, self.metrics()
+        if path == "/health":
+            return 200, {"status": "ok"}
+        return 404, {"error": f"No route {path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line in ("\r\n", "\n", ""):
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                length = -1
+            if len(request_line) < 2 or length < 0:
+                status, payload = 400, {"error": "Malformed request"}
+            else:
+                body = await reader.readexactly(length)
+                status, payload = await self.route(request_line[0].upper(), request_line[1].split("?")[0], body)
+            data = json.dumps(payload, default=str).encode()
+            writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        await self.start(host, port)
+        logger.info("Planning service listening on http://%s:%s", host, port)
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.io_pool.shutdown(wait=False)
+        self.solve_pool.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-key", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cache", default=None, help="path of the shared SQLite response cache")
+    parser.add_argument("--io-workers", type=int, default=8, help="threads retrieving data")
+    parser.add_argument("--solve-workers", type=int, default=2, help="processes solving day routes")
+    parser.add_argument("--qps", type=float, default=10, help="Google API queries per second, all requests together")
+    parser.add_argument("--solver", default="GUROBI", choices=["GUROBI", "CBC", "HIGHS", "HEURISTIC"])
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="seconds per request unless the request sets time_budget")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    cache = ResponseCache(args.cache) if args.cache else ResponseCache()
+    service = PlanningService(args.api_key, cache=cache, io_workers=args.io_workers,
+                              solve_workers=args.solve_workers, queries_per_second=args.qps, solver=args.solver,
+                              time_budget=args.time_budget)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
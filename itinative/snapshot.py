@@ -0,0 +1,84 @@
+import os
+import json
+
+import numpy as np
+
+from itinative.place_table import PlaceTable
+
+FORMAT_VERSION = 1
+# Place table columns stored in a snapshot, hours and clusters are kept apart (they're recomputed per run)
+PLACE_COLUMNS = ("place_id", "name", "rating", "user_ratings_total", "lat", "lng")
+
+
+def as_strings(values):
+    # Object columns >> fixed width unicode, which (unlike object arrays) can be memory mapped
+    values = ["" if value is None else str(value) for value in values]
+    return np.array(values, dtype=f"U{max([len(value) for value in values] + [1])}")
+
+
+class CitySnapshot(object):
+    """
+    Precomputed city on disk: a directory of .npy arrays (place table columns, raw operating hours,
+    cluster labels, float32 distance matrix with the hotel as its last row) and a meta.json with
+    what they were computed with (pin, clustering parameters, hotel, distance units, hotel candidates).
+
+    CitySnapshot.open() memory maps the arrays read only, the pages are shared by every process
+    planning the same city and nothing is read or copied until a stage touches it.
+
+        processor.run(days)
+        processor.export_snapshot("chicago.city")
+        ...
+        agent.snapshot = "chicago.city"  # plans without API calls
+    """
+
+    def __init__(self, path, meta, arrays):
+        self.path = path
+        self.meta = meta
+        self.arrays = arrays
+
+    @classmethod
+    def write(cls, path, arrays, meta):
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+        meta = dict(meta, version=FORMAT_VERSION, arrays=sorted(arrays))
+        # meta.json last, a directory without it isn't a snapshot yet
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2, default=float)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path} is a version {meta.get('version')} snapshot, expected {FORMAT_VERSION}")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+                  for name in meta["arrays"]}
+        return cls(path, meta, arrays)
+
+    def places(self):
+        """PlaceTable over the mapped columns, only the per run columns (hours, clusters) are allocated"""
+        return PlaceTable.from_arrays({column: self.arrays[column] for column in PLACE_COLUMNS})
+
+    @property
+    def hours(self):
+        # (opening, closing) minutes, NaN where the operating hours aren't known
+        return self.arrays["opening_time"], self.arrays["closing_time"]
+
+    @property
+    def cluster_id(self):
+        return self.arrays["cluster_id"]
+
+    @property
+    def distance_matrix(self):
+        return self.arrays["distance_matrix"]
+
+    def clustering_matches(self, key):
+        return self.meta["clustering"] == list(key)
+
+    def __len__(self):
+        return len(self.arrays["place_id"])
+
+    def __repr__(self):
+        return f"CitySnapshot({self.meta.get('location')}, {len(self)} places, {self.path})"
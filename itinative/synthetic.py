@@ -0,0 +1,201 @@
+import json
+import time
+import random
+import threading
+from math import radians, cos, sin, sqrt
+
+from itinative.helper_functions import haversine
+
+PAGE_SIZE = 20  # Places API results per page
+MAX_PAGES = 3  # Places API stops after 60 results
+
+
+class SyntheticCity(object):
+    """
+    Seeded fake city: points of interest scattered around a few hotspots (so that clustering has
+    something to find) with ratings, popularity and operating hours, and hotels near the hotspots.
+    """
+
+    def __init__(self, n_places, n_hotels=20, seed=0, center=(41.8781, -87.6298), radius_km=15, hotspots=None):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.center = center
+        self.radius_km = radius_km
+        self.name = f"Synthetic City {n_places}/{seed}"
+
+        hotspots = hotspots or max(2, int(sqrt(n_places) / 2))
+        spots = [self.offset(center, rng.uniform(0, radius_km * 0.8), rng) for _ in range(hotspots)]
+
+        self.places = []
+        for i in range(n_places):
+            spot = rng.choice(spots)
+            lat, lng = self.offset(spot, abs(rng.gauss(0, radius_km / 8)), rng)
+            hours = rng.random()
+            if hours < 0.15:
+                periods = None  # Google doesn't know
+            elif hours < 0.25:
+                periods = [{"open": {"day": 0, "time": "0000"}}]  # open 24 hours
+            else:
+                opening = rng.choice(["0700", "0800", "0900", "0930", "1000", "1100"])
+                closing = rng.choice(["1500", "1700", "1800", "1900", "2100", "2300"])
+                periods = [{"open": {"day": 1, "time": opening}, "close": {"day": 1, "time": closing}}]
+            self.places.append({
+                "place_id": f"synthetic-poi-{seed}-{i}",
+                "name": f"Attraction {i}",
+                "rating": round(rng.uniform(3.0, 5.0), 1),
+                "user_ratings_total": int(rng.paretovariate(1.2) * 50),
+                "geometry": {"location": {"lat": lat, "lng": lng}},
+                "types": ["tourist_attraction"],
+                "periods": periods,
+            })
+
+        self.hotels = []
+        for i in range(n_hotels):
+            lat, lng = self.offset(rng.choice(spots), abs(rng.gauss(0, radius_km / 10)), rng)
+            self.hotels.append({
+                "place_id": f"synthetic-hotel-{seed}-{i}",
+                "name": f"Hotel {i}",
+                "rating": round(rng.uniform(2.5, 5.0), 1),
+                "user_ratings_total": int(rng.paretovariate(1.5) * 40),
+                "vicinity": f"{i + 1} Synthetic Street",
+                "geometry": {"location": {"lat": lat, "lng": lng}},
+                "types": ["lodging"],
+            })
+        self.by_id = {place["place_id"]: place for place in self.places + self.hotels}
+
+    @staticmethod
+    def offset(origin, distance_km, rng):
+        # Point roughly distance_km away from origin in a random direction
+        angle = rng.uniform(0, 360)
+        dlat = distance_km / 111.32 * cos(radians(angle))
+        dlng = distance_km / (111.32 * cos(radians(origin[0]))) * sin(radians(angle))
+        return origin[0] + dlat, origin[1] + dlng
+
+    def nearby(self, location, radius, type):
+        candidates = self.hotels if type == "lodging" else self.places
+        lat, lng = location
+        found = [place for place in candidates
+                 if haversine(lng, lat, place["geometry"]["location"]["lng"],
+                              place["geometry"]["location"]["lat"]) * 1000 <= radius]
+        found.sort(key=lambda place: place["rating"] * place["user_ratings_total"], reverse=True)
+        return found
+
+    def nearby_pages(self):
+        """All the places as pages of a places_nearby response, as data_conversion expects them"""
+        return {k: {"results": [self.search_result(place) for place in self.places[start:start + PAGE_SIZE]]}
+                for k, start in enumerate(range(0, len(self.places), PAGE_SIZE))}
+
+    @staticmethod
+    def search_result(place):
+        return {key: value for key, value in place.items() if key != "periods"}
+
+    def locate(self, query):
+        return self
+
+
+class SyntheticRegion(object):
+    """
+    Seeded fake region for multi-city trips: one SyntheticCity per name, `spacing_km` apart along a
+    winding line. StubClient / StubGeocoder serve it like a single city, searches are answered by the
+    city nearest to the search location and geocoding a name lands on that city's center.
+    """
+
+    def __init__(self, names, n_places, seed=0, center=(41.8781, -87.6298), spacing_km=150, radius_km=15):
+        rng = random.Random(seed)
+        self.name = f"Synthetic Region {len(names)}/{seed}"
+        self.cities = {}
+        lat, lng = center
+        for k, name in enumerate(names):
+            city = SyntheticCity(n_places, seed=seed * 1000 + k, center=(lat, lng), radius_km=radius_km)
+            city.name = name
+            self.cities[name] = city
+            lat, lng = SyntheticCity.offset((lat, lng), spacing_km, rng)
+        self.center = center
+        self.by_id = {}
+        for city in self.cities.values():
+            self.by_id.update(city.by_id)
+
+    def nearby(self, location, radius, type):
+        lat, lng = location
+        city = min(self.cities.values(), key=lambda c: haversine(lng, lat, c.center[1], c.center[0]))
+        return city.nearby(location, radius, type)
+
+    search_result = staticmethod(SyntheticCity.search_result)
+
+    def locate(self, query):
+        return self.cities[query]
+
+
+class StubClient(object):
+    """
+    Offline stand-in for googlemaps.Client answering from a SyntheticCity, with the same paging
+    behaviour as the Places API (20 results per page, 3 pages at most). Counts the calls it serves.
+    """
+
+    def __init__(self, city, latency=0.0):
+        self.city = city
+        self.latency = latency  # seconds slept per call, to mimic round trips
+        self.calls = {}
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def places_nearby(self, location=None, radius=None, type=None, rank_by=None, page_token=None, **kwargs):
+        self._count("places_nearby")
+        if page_token is not None:
+            results, page = self.pages[page_token]
+        else:
+            results, page = self.city.nearby(location, radius, type)[:PAGE_SIZE * MAX_PAGES], 0
+        response = {"status": "OK" if results else "ZERO_RESULTS",
+                    "results": [self.city.search_result(place)
+                                for place in results[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]]}
+        if (page + 1) * PAGE_SIZE < len(results):
+            token = json.dumps([location, radius, type, page + 1])
+            with self._lock:
+                self.pages[token] = (results, page + 1)
+            response["next_page_token"] = token
+        return response
+
+    def place(self, place_id, fields=None, **kwargs):
+        self._count("place")
+        place = self.city.by_id[place_id]
+        result = {"place_id": place_id, "name": place["name"]}
+        if place.get("periods") is not None:
+            result["opening_hours"] = {"periods": place["periods"]}
+        return {"status": "OK", "result": result}
+
+    def distance_matrix(self, origins, destinations, mode="driving", **kwargs):
+        # Driving at ~30 km/h along a road network 1.3x longer than the crow flies
+        self._count("distance_matrix")
+        rows = []
+        for origin in origins:
+            elements = []
+            for destination in destinations:
+                meters = haversine(origin[1], origin[0], destination[1], destination[0]) * 1300
+                elements.append({"status": "OK", "distance": {"value": int(meters)},
+                                 "duration": {"value": int(meters / 30000 * 3600)}})
+            rows.append({"elements": elements})
+        return {"status": "OK", "rows": rows}
+
+
+class StubLocation(object):
+    def __init__(self, latitude, longitude, address):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.address = address
+
+
+class StubGeocoder(object):
+    """Offline stand-in for the Nominatim geocoder, every query lands on the city center"""
+
+    def __init__(self, city):
+        self.city = city
+
+    def geocode(self, query):
+        city = self.city.locate(query)
+        return StubLocation(city.center[0], city.center[1], city.name)
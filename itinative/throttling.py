@@ -0,0 +1,57 @@
+import time
+import random
+import threading
+
+# Statuses returned by Google when we are over quota / the request can be retried
+QUOTA_ERROR_STATUSES = {"OVER_QUERY_LIMIT", "RESOURCE_EXHAUSTED", "UNKNOWN_ERROR"}
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket, refilled at `rate` tokens per second and holding at most `capacity`
+    tokens. Every request takes one token and blocks until one is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        assert rate > 0, "Rate must be a positive number of queries per second"
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_quota_error(error):
+    return getattr(error, "status", None) in QUOTA_ERROR_STATUSES or type(error).__name__ in ("Timeout",
+                                                                                            "_OverQueryLimit")
+
+
+def call_with_backoff(func, *args, limiter=None, max_retries=3, backoff=1.0, **kwargs):
+    """
+    Call func(*args, **kwargs) taking a token from the limiter before every attempt, retrying quota
+    errors with exponential backoff (and a bit of jitter)
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as error:
+            if attempt == max_retries or not is_quota_error(error):
+                raise
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random() / 2))
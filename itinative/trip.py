@@ -0,0 +1,285 @@
+import heapq
+from functools import partial
+from itertools import permutations
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from itinative.__main__ import Agent
+from itinative.budget import LatencyBudget
+from itinative.cache import ResponseCache
+from itinative.day_scheduler import _optimize, solve_in_order, solve_with_budget
+from itinative.helper_functions import haversine_matrix
+from itinative.throttling import TokenBucket
+
+# Agent attributes every city keeps for itself, the others follow TripPlanner.agent
+CITY_STATE = ("location", "days", "snapshot", "processor", "_solved")
+
+
+def shortest_path(distances, exhaustive=8):
+    """
+    Order of the nodes starting at 0 with the shortest open path through all of them: every order up
+    to `exhaustive` nodes, nearest neighbour improved by 2-opt beyond that
+    """
+    n = len(distances)
+    if n <= 2:
+        return list(range(n))
+
+    def length(order):
+        return sum(distances[a][b] for a, b in zip(order, order[1:]))
+
+    if n <= exhaustive:
+        return [0] + list(min(permutations(range(1, n)), key=lambda rest: length((0,) + rest)))
+
+    order, left = [0], set(range(1, n))
+    while left:
+        order.append(min(left, key=lambda j: distances[order[-1]][j]))
+        left.remove(order[-1])
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                if length(candidate) < length(order) - 1e-9:
+                    order, improved = candidate, True
+    return order
+
+
+class TripSegment(object):
+    """One city of a trip: the transfer that gets there, its days, its hotel and their itineraries"""
+
+    def __init__(self, location, agent):
+        self.location = location
+        self.agent = agent  # plans the city, its processor (memoized stages) is kept between runs
+        self.days = None
+        self.first_day = 0  # day of the trip (0 for the first) the segment starts on
+        self.transfer_km = 0.0  # from the previous city, by road
+        self.travel_days = 0  # whole days on the road before the first day here
+        self.arrival_delay = 0  # minutes of the first day spent getting here
+        self.itineraries = []
+
+    @property
+    def processor(self):
+        return self.agent.processor
+
+    def values(self, visits):
+        """Coarse worth of the city for 0, 1, 2 ... days: prominence of the best places they could visit"""
+        prominence = np.sort(self.processor.place_details.prominence)[::-1]
+        collected = np.concatenate([[0.0], np.cumsum(prominence)])
+        days = np.arange(len(prominence) + 1)
+        return collected[np.minimum(days * visits, len(prominence))]
+
+    @property
+    def hotel(self):
+        return self.processor.hotel
+
+    def to_dict(self):
+        recommendations = self.processor.hotel_recommendations
+        return {
+            "location": self.location,
+            "first_day": self.first_day + 1,
+            "days": self.days,
+            "travel_days": self.travel_days,
+            "transfer_km": self.transfer_km,
+            "arrival_delay": self.arrival_delay,
+            "hotel": {"lat": self.hotel.lat, "lng": self.hotel.lng,
+                      "recommendations": [] if recommendations is None else recommendations["name"].head(5).tolist()},
+            "itineraries": [day.to_dict() for day in self.itineraries],
+        }
+
+    def report(self):
+        print(f"\n=================== {self.location}: days {self.first_day + 1} to "
+              f"{self.first_day + self.days} ===================")
+        if self.transfer_km:
+            print(f"{self.transfer_km:.0f} km from the previous city: {self.travel_days} travel day(s), the first "
+                  f"day starts {self.arrival_delay:.0f} minutes late")
+        for day in self.itineraries:
+            day.report()
+
+    def __repr__(self):
+        return f"{self.location} ({self.days} days)"
+
+
+class TripPlanner(object):
+    """
+    Plans a long trip across several cities in two levels:
+
+    - coarse: the places of every city are fetched side by side, the cities are put in the order with
+      the least driving (the first one stays first) and the days go, one at a time, to the city where
+      a day adds the most prominence (at least min_days each). A transfer longer than a day's opening
+      hours takes whole travel days, the rest delays the first day in the next city.
+    - per city: clustering, hotel, distances and day routes as with an Agent, one hotel per city, the
+      cities retrieved side by side and their days solved in one process pool as they come in.
+
+    The cities share the API response cache, the client, the tracer and one queries per second limit.
+    agent.time_budget is the budget of the whole trip: the cities are retrieved side by side by the
+    retrieve stage deadline, then the solve stage is split across the days of all the cities.
+
+        trip = TripPlanner(14, ["Chicago", "Milwaukee", "Madison"], api_key)
+        trip.agent.solver = "CBC"  # settings every city is planned with
+        segments = trip.generate()
+    """
+
+    def __init__(self, days, locations, api_key):
+        self.days = days
+        self.locations = list(locations)
+        self.agent = Agent(days, None, api_key)  # settings of every city, see CITY_STATE
+        self.snapshots = {}  # location >> city snapshot path, planned without API calls
+        self.fixed_days = {}  # location >> days, kept out of the allocation
+        self.min_days = 1
+        self.keep_order = False  # visit the cities in the order given
+        self.transfer_speed = 70  # km/h between cities
+        self.road_factor = 1.3  # road km per straight line km
+        self.city_workers = 4  # cities retrieved at the same time
+        self.segments = {}  # location >> TripSegment, kept between runs
+
+    def segment(self, location):
+        segment = self.segments.get(location)
+        if segment is None:
+            segment = self.segments[location] = TripSegment(location, Agent(None, location, self.agent.api_key))
+        for name, value in vars(self.agent).items():
+            if name not in CITY_STATE:
+                setattr(segment.agent, name, value)
+        segment.agent.snapshot = self.snapshots.get(location)
+        return segment
+
+    def shared(self):
+        # Cache and QPS limit every city goes through, the agent's own when it has them
+        if self.agent.cache is None:
+            self.agent.cache = ResponseCache(":memory:")
+        if self.agent.rate_limiter is None:
+            self.agent.rate_limiter = TokenBucket(self.agent.queries_per_second)
+
+    @staticmethod
+    def fetch(segment, budget=None):
+        # Places and operating hours, all the allocation needs
+        segment.agent.configure(budget).pipeline.run("opening_hours")
+        return segment
+
+    def order(self, segments):
+        """Cities in visiting order with their transfers from the previous one"""
+        lat = [segment.processor.pin_lat for segment in segments]
+        lng = [segment.processor.pin_lng for segment in segments]
+        distances = haversine_matrix(lng, lat) * self.road_factor
+        order = list(range(len(segments))) if self.keep_order else shortest_path(distances)
+        day_length = self.agent.default_closing_time - self.agent.default_opening_time
+        for previous, k in zip([None] + order, order):
+            segment = segments[k]
+            segment.transfer_km = 0.0 if previous is None else float(distances[previous][k])
+            minutes = segment.transfer_km / self.transfer_speed * 60
+            segment.travel_days = int(minutes // day_length)
+            segment.arrival_delay = minutes - segment.travel_days * day_length
+        return [segments[k] for k in order]
+
+    def allocate(self, segments):
+        """
+        Days of every city: the days left after the travel days go one by one to the city whose next
+        day collects the most prominence (diminishing, a day visits at most maxVisits_in_a_day places)
+        """
+        days = self.days - sum(segment.travel_days for segment in segments)
+        visits = self.agent.maxVisits_in_a_day
+        free, heap, values = [], [], {}
+        for k, segment in enumerate(segments):
+            segment.days = self.fixed_days.get(segment.location, self.min_days)
+            days -= segment.days
+            if segment.location not in self.fixed_days:
+                values[k] = segment.values(visits)
+                free.append(k)
+        assert days >= 0, f"{self.days} days don't cover {len(segments)} cities and their travel days"
+
+        def push(k):
+            # A city takes a day while it has places left to cluster into it
+            if segments[k].days + 1 < len(values[k]):
+                gain = values[k][segments[k].days + 1] - values[k][segments[k].days]
+                heapq.heappush(heap, (-gain, k))
+
+        for k in free:
+            push(k)
+        for _ in range(days):
+            assert heap, "Not enough places in the cities for all the days"
+            _, k = heapq.heappop(heap)
+            segments[k].days += 1
+            push(k)
+
+        first_day = 0
+        for segment in segments:
+            first_day += segment.travel_days
+            segment.first_day = first_day
+            first_day += segment.days
+        return segments
+
+    @staticmethod
+    def day_routes(segment, budget=None):
+        """Clusters, hotel and distances of the city (its days allocated), then its day routes"""
+        agent = segment.agent
+        agent.days = segment.days
+        processor = agent.retrieve(budget)
+        routes = agent.day_routes(processor)
+        for route in routes:
+            route.day += segment.first_day
+        if routes and segment.arrival_delay:
+            # Driving in the morning, the first day leaves the new hotel once there
+            first = routes[0]
+            first.opening_times[0] = min(first.opening_times[0] + segment.arrival_delay,
+                                         first.closing_times[0] - first.waiting_time)
+        return segment, routes
+
+    def solve_days(self, retrieving, budget=None):
+        """
+        Day routes of the cities solved as each city's retrieval finishes, in one pool with solver_workers.
+        Under a budget the days of all the cities share the solve stage, they start once every city is in.
+        """
+        workers = self.agent.solver_workers
+        if budget is not None:
+            cities = [future.result() for future in as_completed(retrieving)]
+            routes = [route for _, city_routes in cities for route in city_routes]
+            solved = iter(list(solve_with_budget(routes, budget, workers)))
+            return {segment.location: [next(solved) for _ in city_routes] for segment, city_routes in cities}
+        if workers <= 1:
+            solved = {}
+            for future in as_completed(retrieving):
+                segment, routes = future.result()
+                solved[segment.location] = list(solve_in_order(routes))
+            return solved
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            solving = {}
+            for future in as_completed(retrieving):
+                segment, routes = future.result()
+                solving[segment.location] = [pool.submit(_optimize, route) for route in routes]
+            return {location: [day.result() for day in days] for location, days in solving.items()}
+
+    def plan(self):
+        """Plans the trip, returns its TripSegments in visiting order"""
+        self.shared()
+        budget = LatencyBudget(self.agent.time_budget) if self.agent.time_budget is not None else None
+        segments = [self.segment(location) for location in self.locations]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.city_workers, len(segments)))) as cities:
+            if self.agent.verbose:
+                print(f"Looking for places in {len(segments)} cities ...")
+            segments = self.order(list(cities.map(partial(self.fetch, budget=budget), segments)))
+            self.allocate(segments)
+            self.agent.tracer.event("trip_allocation", days=self.days,
+                                    cities={segment.location: segment.days for segment in segments},
+                                    travel_days=sum(segment.travel_days for segment in segments))
+            if self.agent.verbose:
+                print("Generating itineraries ... ")
+            solved = self.solve_days([cities.submit(self.day_routes, segment, budget) for segment in segments],
+                                     budget)
+        for segment in segments:
+            for route in solved[segment.location]:
+                self.agent.tracer.trace_route(route)
+            segment.itineraries = [route.itinerary() for route in solved[segment.location]]
+        if budget is not None:
+            self.agent.tracer.event("latency_budget", seconds=budget.seconds, elapsed=budget.elapsed(),
+                                    solved=sum(len(days) for days in solved.values()))
+        return segments
+
+    def generate(self):
+        segments = self.plan()
+        for segment in segments:
+            segment.report()
+        return segments
+
+    def __repr__(self):
+        return f"Trip planner for {self.days} days in {', '.join(self.locations)}"
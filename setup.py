@@ -1,5 +1,6 @@
 from setuptools import setup
 from itinative import __version__, __author__, __doc__
+from itinative.dependencies import EXTRAS
 
 setup(
     name='itinative',
@@ -10,5 +11,8 @@ setup(
     author=__author__,
     author_email='mohitmhjn147@gmail.com',
     description=__doc__,
-    install_requires=['googlemaps', 'pulp', 'numpy', 'geopy', 'pandas', 'scikit-learn']
+    # The stages import the rest when they first need it (itinative.dependencies.require)
+    install_requires=['numpy', 'pandas'],
+    extras_require=dict(EXTRAS, all=sorted({package for packages in EXTRAS.values() for package in packages}),
+                        test=['pytest']),
 )
@@ -0,0 +1,80 @@
+import copy
+
+import pytest
+
+from itinative.__main__ import Agent
+from itinative.synthetic import SyntheticCity, StubClient, StubGeocoder
+
+
+@pytest.fixture(scope="session")
+def city():
+    return SyntheticCity(60, seed=3)
+
+
+@pytest.fixture
+def make_agent(city):
+    """Agent planning the synthetic city through a stub client (no API calls, no network)"""
+
+    def make(days=3, **settings):
+        agent = Agent(days, "Chicago", None)
+        agent.client = StubClient(city)
+        agent.geocoder = StubGeocoder(city)
+        agent.solver = "HEURISTIC"
+        agent.verbose = False
+        agent.queries_per_second = 1000
+        for name, value in settings.items():
+            setattr(agent, name, value)
+        agent.configure().page_token_delay = 0  # the stub's page tokens are good at once
+        return agent
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def days(city):
+    """Unsolved day routes of the synthetic city over 8 days (3 to 17 places a day)"""
+    agent = Agent(8, "Chicago", None)
+    agent.client, agent.geocoder, agent.verbose = StubClient(city), StubGeocoder(city), False
+    agent.configure().page_token_delay = 0
+    return agent.day_routes(agent.retrieve())
+
+
+@pytest.fixture(scope="session")
+def small_days(days):
+    """Days both MILP engines prove optimal in well under a second"""
+    small = [route for route in days if 3 <= len(route.NODES) <= 6]
+    assert len(small) >= 2
+    return small
+
+
+def solved(route, solver, **settings):
+    route = copy.copy(route)
+    route.solv = solver
+    route.timeout = 30
+    for name, value in settings.items():
+        setattr(route, name, value)
+    route.optimize()
+    return route
+
+
+def assert_feasible(route):
+    # The visit times meet the time windows and follow the travel times along the path
+    nodes = route.path[1:-1]
+    assert len(nodes) <= route.max_number_of_visits
+    for a, b in zip(nodes, nodes[1:]):
+        assert route.visit_times[b] >= route.visit_times[a] + route.waiting_time + route.distances[a][b] - 1e-4
+    for node in nodes:
+        assert route.opening_times[node] - 1e-4 <= route.visit_times[node]
+        assert route.visit_times[node] + route.waiting_time <= route.closing_times[node] + 1e-4
+
+
+@pytest.fixture
+def solve():
+    """solve(route, solver, **settings): solved copy of a day route"""
+    return solved
+
+
+@pytest.fixture
+def feasible():
+    """feasible(route): asserts the solved route keeps the time windows and the travel times"""
+    return assert_feasible
@@ -0,0 +1,38 @@
+import copy
+
+import pytest
+
+pytest.importorskip("pulp")
+
+
+def tight(route):
+    # Every other place closes two hours after it opens, so that some arcs can't be used
+    route = copy.copy(route)
+    route.closing_times = dict(route.closing_times)
+    for node in route.NODES[::2]:
+        route.closing_times[node] = route.opening_times[node] + 120
+    return route
+
+
+def test_arc_pruning_keeps_the_optimum(small_days, solve, feasible):
+    for route in map(tight, small_days):
+        pruned, full = solve(route, "CBC", prune_arcs=True), solve(route, "CBC", prune_arcs=False)
+        assert pruned.status == full.status == "Optimal"
+        assert pruned.objective == pytest.approx(full.objective, rel=1e-6)
+        assert pruned.arc_stats["arcs_kept"] <= full.arc_stats["arcs_kept"]
+        feasible(pruned)
+
+
+def test_arc_pruning_drops_arcs_of_tight_windows(small_days):
+    route = tight(max(small_days, key=lambda day: len(day.NODES)))
+    stats = route.arc_model().stats
+    assert stats["infeasible_arcs"] > 0
+    assert stats["arcs_kept"] < stats["arcs"]
+
+
+def test_no_pruning_keeps_every_arc(small_days):
+    route = copy.copy(small_days[0])
+    route.prune_arcs = False
+    stats = route.arc_model().stats
+    n = len(route.NODES)
+    assert stats["arcs_kept"] == stats["arcs"] == (n + 1) ** 2 - n
@@ -0,0 +1,99 @@
+import copy
+from time import time, perf_counter
+
+import pytest
+
+from itinative.budget import LatencyBudget
+from itinative.day_scheduler import assign_budget, solve_with_budget
+
+
+def routes(days, solver="CBC"):
+    routes = [copy.copy(route) for route in days]
+    for route in routes:
+        route.solv = solver
+    return routes
+
+
+def test_stage_deadlines():
+    budget = LatencyBudget(10)
+    assert budget.deadline("retrieve") == pytest.approx(budget.started + 3.5)
+    assert budget.deadline("solve") == pytest.approx(budget.started + 9.5)
+    assert budget.deadline() == pytest.approx(budget.started + 10)
+    with pytest.raises(ValueError):
+        budget.deadline("output")
+
+
+def test_solver_time_is_proportional_to_the_model_size():
+    budget = LatencyBudget(100)
+    remaining = budget.remaining("solve")
+    assert budget.solver_time(1, 4) == pytest.approx(remaining / 4, rel=1e-3)
+    assert budget.solver_time(1, 4, workers=2) == pytest.approx(remaining / 2, rel=1e-3)
+    assert budget.solver_time(1, 0) == pytest.approx(remaining, rel=1e-3)
+
+
+def test_short_time_gets_the_heuristic(days):
+    budget = LatencyBudget(10)
+    milp, short = routes(days[:2])
+    budget.assign(milp, 2.0)
+    budget.assign(short, 0.1)
+    assert milp.solv == "CBC" and milp.warm_start
+    assert milp.deadline == pytest.approx(time() + 2.0, abs=0.1)
+    assert short.solv == "HEURISTIC"
+    assert short.heuristic_time_budget <= 100
+
+
+def test_assign_budget_ends_with_the_solve_stage(days):
+    budget = LatencyBudget(20)
+    end = time() + budget.remaining("solve")
+    assigned = assign_budget(routes(days), budget, workers=3)
+    assert max(route.deadline for route in assigned) == pytest.approx(end, abs=0.1)
+    # Bigger days get more time
+    given = {route.model_weight(): route for route in assigned}
+    biggest, smallest = given[max(given)], given[min(given)]
+    assert biggest.solv == "HEURISTIC" or biggest.deadline - time() >= smallest.deadline - time() - 1e-3
+
+
+def test_solve_with_budget_holds_the_solve_stage(days, feasible):
+    budget = LatencyBudget(4)
+    started = perf_counter()
+    solved = list(solve_with_budget(routes(days), budget))
+    assert [route.day for route in solved] == [route.day for route in days]
+    assert perf_counter() - started < 4 + 2  # a little slack for the warm start and the model builds
+    for route in solved:
+        assert route.status in ("Optimal", "Not Solved", "Heuristic")
+        feasible(route)
+
+
+@pytest.mark.parametrize("search_mode", ["pin", "tiled"])
+def test_what_the_deadline_left_out_is_fetched_next_run(make_agent, search_mode):
+    agent = make_agent(search_mode=search_mode)
+    processor = agent.configure()
+    processor.deadline = perf_counter() - 1  # already late: no Place Details at all
+    processor.pipeline.run("opening_hours")
+    assert "place" not in agent.client.calls
+    assert processor.truncated["places"] > 0
+
+    processor.deadline = None
+    assert processor.pipeline.run("places")
+    assert agent.client.calls["place"] == len(processor.place_details)
+    # A complete run is reused as usual
+    assert not processor.pipeline.run("places")
+
+
+def test_road_distances_left_out_are_fetched_next_run(make_agent):
+    agent = make_agent(distance_mode="road")
+    processor = agent.configure()
+    processor.days = agent.days
+    processor.pipeline.run("opening_hours")
+    processor.pipeline.run("hotels")
+    processor.deadline = perf_counter() - 1  # the places are in, the distances are late
+    processor.pipeline.run("distance_matrix")
+    assert "distance_matrix" not in agent.client.calls
+    assert processor.truncated["distance_matrix"] > 0
+    estimate = processor.distance_matrix.copy()
+
+    processor.deadline = None
+    assert processor.pipeline.run("distance_matrix")
+    assert agent.client.calls["distance_matrix"] > 0
+    assert not (processor.distance_matrix == estimate).all()
+    assert not processor.pipeline.run("distance_matrix")
@@ -0,0 +1,96 @@
+import json
+from time import perf_counter
+
+import pytest
+
+from itinative.cache import ResponseCache, CachedClient
+from itinative.synthetic import StubClient
+
+CHICAGO = (41.8781, -87.6298)
+
+
+def search(client):
+    """place_id of every page of a pin search, following next_page_token"""
+    pages, token = [], None
+    while True:
+        page = client.places_nearby(type="tourist_attraction", location=CHICAGO, radius=20000,
+                                    rank_by="prominence", page_token=token)
+        pages.append([result["place_id"] for result in page["results"]])
+        token = page.get("next_page_token")
+        if token is None:
+            return pages
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(":memory:")
+
+
+def test_put_get_and_stats(cache):
+    assert cache.get("place", {"place_id": "a"}) is None
+    cache.put("place", {"place_id": "a"}, {"name": "A"})
+    assert cache.get("place", {"place_id": "a"}) == {"name": "A"}
+    assert cache.stats()["place"] == {"hits": 1, "misses": 1}
+
+
+def test_coordinates_are_normalized(cache):
+    cache.put("geocode", {"location": (41.87810000001, -87.6298)}, [1])
+    assert cache.get("geocode", {"location": [41.8781, -87.6298]}) == [1]
+
+
+def test_expired_entries_miss(cache):
+    cache.ttls["place"] = -1
+    cache.put("place", {"place_id": "a"}, 1)
+    assert cache.get("place", {"place_id": "a"}) is None
+
+
+def test_least_recently_used_are_evicted():
+    cache = ResponseCache(":memory:", max_entries=100)
+    cache.put("place", {"i": 0}, 0)
+    for i in range(1, 500):
+        cache.put("place", {"i": i}, i)
+        cache.get("place", {"i": 0})  # kept in use
+    assert len(cache) <= 100
+    assert cache.get("place", {"i": 0}) == 0
+    assert cache.get("place", {"i": 499}) == 499
+    assert cache.get("place", {"i": 1}) is None
+
+
+def test_search_pages_are_cached_by_page_index(cache, city):
+    live = StubClient(city)
+    pages = search(CachedClient(live, cache, page_token_delay=0))
+    assert len(pages) > 1
+    assert live.calls["places_nearby"] == len(pages)
+
+    again = StubClient(city)
+    assert search(CachedClient(again, cache, page_token_delay=0)) == pages
+    assert again.calls == {}
+    # No short lived Google token is kept with a cached page
+    cached = [json.loads(value) for value, in
+              cache._db.execute("SELECT value FROM responses WHERE endpoint = 'places_nearby'")]
+    assert len(cached) == len(pages)
+    assert not any("next_page_token" in page for page in cached)
+
+
+def test_a_missing_page_walks_the_search_again(cache, city):
+    pages = search(CachedClient(StubClient(city), cache, page_token_delay=0))
+    cache._db.execute("DELETE FROM responses WHERE key LIKE '%\"page\":1%'")
+    live = StubClient(city)
+    assert search(CachedClient(live, cache, page_token_delay=0)) == pages
+    assert live.calls["places_nearby"] == 2  # the first page again for a fresh token, then the second
+
+
+def test_only_live_page_tokens_are_waited_for(cache, make_agent):
+    live = make_agent(cache=cache).configure()
+    live.page_token_delay = 0.5
+    started = perf_counter()
+    live.pipeline.run("places")
+    assert perf_counter() - started >= 0.5
+
+    again = make_agent(cache=cache)
+    processor = again.configure()
+    processor.page_token_delay = 0.5
+    started = perf_counter()
+    processor.pipeline.run("places")
+    assert perf_counter() - started < 0.5
+    assert "places_nearby" not in again.client.calls
@@ -0,0 +1,57 @@
+from time import perf_counter
+
+import numpy as np
+import pytest
+
+from itinative.clustering import cluster_places, lloyd_kmeans
+
+
+@pytest.fixture(scope="module")
+def xy():
+    rng = np.random.default_rng(0)
+    return rng.normal(scale=5, size=(600, 2))
+
+
+@pytest.mark.parametrize("engine", ["kmeans", "balanced"])
+def test_every_place_gets_a_day(xy, engine):
+    labels = cluster_places(xy, 5, engine=engine, time_budget=5)
+    assert len(labels) == len(xy)
+    assert set(labels) == set(range(5))
+
+
+def test_balanced_days_hold_their_capacity(xy):
+    weights = np.random.default_rng(1).random(len(xy))
+    labels = cluster_places(xy, 5, engine="balanced", weights=weights, capacity=40, time_budget=5)
+    assert np.bincount(labels[labels >= 0], minlength=5).max() <= 40
+    assert (labels >= 0).sum() == 200
+    # The places left out are the least prominent
+    assert weights[labels < 0].max() <= weights[labels >= 0].min()
+
+
+def test_balanced_days_are_even_without_a_capacity(xy):
+    counts = np.bincount(cluster_places(xy, 7, engine="balanced", time_budget=5), minlength=7)
+    assert counts.max() == int(np.ceil(len(xy) / 7))
+    assert counts.sum() == len(xy)
+
+
+@pytest.mark.parametrize("engine", ["kmeans", "balanced"])
+def test_engines_hold_the_time_budget(engine):
+    xy = np.random.default_rng(2).uniform(-30, 30, size=(20000, 2))
+    start = perf_counter()
+    labels = cluster_places(xy, 10, engine=engine, time_budget=0.2)
+    assert perf_counter() - start < 2
+    assert len(labels) == len(xy)
+
+
+def test_lloyd_kmeans_finds_separated_groups():
+    rng = np.random.default_rng(3)
+    groups = [(0, 0), (50, 0), (0, 50)]
+    xy = np.vstack([rng.normal(loc=center, size=(30, 2)) for center in groups])
+    labels, centers = lloyd_kmeans(xy, 3)
+    assert all(len(set(labels[30 * k:30 * (k + 1)])) == 1 for k in range(3))
+    assert len(set(labels)) == 3
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        cluster_places(np.zeros((3, 2)), 2, engine="dbscan")
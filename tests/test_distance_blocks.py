@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+import pytest
+
+from itinative.helper_functions import PlacesDataRetriever
+from itinative.synthetic import StubClient
+
+
+def retriever(symmetric, block=(10, 10)):
+    processor = PlacesDataRetriever.__new__(PlacesDataRetriever)
+    processor.distance_block = block
+    processor.symmetric_distances = symmetric
+    return processor
+
+
+def needed_cells(groups, symmetric):
+    return sorted({(i, j) for nodes in groups for i in nodes for j in nodes
+                   if i != j and (i < j or not symmetric)})
+
+
+def cell(i, j, symmetric):
+    return (min(i, j), max(i, j)) if symmetric else (i, j)
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+@pytest.mark.parametrize("sizes", [[1], [2], [5], [10], [11], [23], [7, 12, 3]])
+def test_blocks_cover_the_cells_once(symmetric, sizes):
+    rng = random.Random(sum(sizes))
+    nodes = rng.sample(range(200), sum(sizes))
+    groups, start = [], 0
+    for size in sizes:
+        groups.append(sorted(nodes[start:start + size]))
+        start += size
+    needed = needed_cells(groups, symmetric)
+    blocks = retriever(symmetric).distance_blocks(groups, needed)
+
+    assert all(len(origins) <= 10 and len(destinations) <= 10 for origins, destinations in blocks)
+    requested = [cell(i, j, symmetric) for origins, destinations in blocks for i in origins for j in destinations
+                 if i != j]
+    assert set(requested) == set(needed)
+    if symmetric:
+        # No pair paid for in both directions, nor twice in one direction
+        assert len(requested) == len(set(requested))
+
+
+def test_only_missing_cells_are_requested():
+    groups = [list(range(8))]
+    assert retriever(True).distance_blocks(groups, []) == []
+    assert retriever(True).distance_blocks(groups, [(2, 5)]) == [([2], [5])]
+
+
+def test_road_mode_uses_driving_minutes(make_agent, city):
+    agent = make_agent(days=2, distance_mode="road")
+    processor = agent.retrieve()
+    assert processor.minutes_per_unit == 1.0
+    rows = processor.route_groups()[0][:3]
+    lat = np.append(processor.place_details.lat, processor.hotel.lat)
+    lng = np.append(processor.place_details.lng, processor.hotel.lng)
+    origins = [(lat[k], lng[k]) for k in rows]
+    response = StubClient(city).distance_matrix(origins, origins)
+    for i, row in zip(rows, response["rows"]):
+        for j, element in zip(rows, row["elements"]):
+            if i != j:
+                assert processor.distance_matrix[i, j] == pytest.approx(element["duration"]["value"] / 60)
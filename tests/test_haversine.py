@@ -0,0 +1,30 @@
+import random
+
+import numpy as np
+import pytest
+
+from itinative.helper_functions import haversine, haversine_matrix
+
+
+def test_matrix_matches_the_scalar_formula():
+    rng = random.Random(1)
+    lat = [rng.uniform(-80, 80) for _ in range(25)]
+    lng = [rng.uniform(-180, 180) for _ in range(25)]
+    matrix = haversine_matrix(lng, lat)
+    assert matrix.shape == (25, 25)
+    for i in range(25):
+        for j in range(25):
+            assert matrix[i, j] == pytest.approx(haversine(lng[i], lat[i], lng[j], lat[j]), abs=1e-9)
+
+
+def test_matrix_is_symmetric_with_a_zero_diagonal():
+    matrix = haversine_matrix([-87.6298, -87.62, -87.7], [41.8781, 41.89, 41.9])
+    np.testing.assert_allclose(matrix, matrix.T)
+    np.testing.assert_array_equal(np.diag(matrix), 0)
+
+
+def test_antipodes_and_a_known_distance():
+    # Clipping keeps the arcsin defined at the antipode
+    assert haversine_matrix([0, 180], [0, 0])[0, 1] == pytest.approx(np.pi * 6371)
+    # Chicago to New York, about 1,145 km
+    assert haversine_matrix([-87.6298, -74.0060], [41.8781, 40.7128])[0, 1] == pytest.approx(1145, rel=0.01)
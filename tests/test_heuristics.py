@@ -0,0 +1,43 @@
+from itinative.heuristics import OrienteeringHeuristic, optimality_gap
+
+
+def heuristic(route, time_budget=200):
+    return OrienteeringHeuristic(route.prize, route.distances, route.opening_times, route.closing_times,
+                                 route.waiting_time, route.max_number_of_visits, time_budget=time_budget)
+
+
+def test_heuristic_routes_are_feasible(days, solve, feasible):
+    for route in days:
+        day = solve(route, "HEURISTIC")
+        assert day.status == "Heuristic"
+        assert day.objective == sum(day.prize[node] for node in day.path[1:-1])
+        feasible(day)
+
+
+def test_heuristic_holds_a_tiny_time_budget(days):
+    route = max(days, key=lambda day: len(day.NODES))
+    search = heuristic(route, time_budget=1)
+    path = search.solve()
+    assert search.is_feasible(path)
+    assert len(path) <= route.max_number_of_visits
+
+
+def test_heuristic_repairs_an_infeasible_start(days):
+    route = max(days, key=lambda day: len(day.NODES))
+    search = heuristic(route, time_budget=20)
+    # Every place in one day can't fit, repair drops the least valuable visits
+    path = search.solve(initial_route=list(route.NODES))
+    assert search.is_feasible(path)
+
+
+def test_heuristic_reaches_the_optimum_on_small_days(small_days, solve):
+    for route in small_days:
+        optimum = solve(route, "CBC")
+        assert optimality_gap(solve(route, "HEURISTIC").objective, optimum.objective) < 1e-9
+
+
+def test_optimality_gap():
+    assert optimality_gap(90, 100) == 0.1
+    assert optimality_gap(100, 100) == 0.0
+    assert optimality_gap(5, 0) == 0.0
+    assert optimality_gap(110, 100) == 0.0
@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("pulp")
+pytest.importorskip("scipy.optimize")
+
+
+def test_pulp_and_matrix_model_agree(small_days, solve, feasible):
+    for route in small_days:
+        pulp, matrix = solve(route, "CBC"), solve(route, "HIGHS")
+        assert pulp.status == matrix.status == "Optimal"
+        assert matrix.objective == pytest.approx(pulp.objective, rel=1e-6)
+        feasible(pulp)
+        feasible(matrix)
+
+
+def test_matrix_model_reports_its_size(small_days, solve):
+    day = solve(small_days[0], "HIGHS")
+    assert day.model_size["variables"] > 0
+    assert day.model_size["constraints"] > 0
@@ -0,0 +1,52 @@
+from itinative.helper_functions import military_to_minutes, parse_opening_hours
+
+
+def periods(open_time, close_time):
+    return {"opening_hours": {"periods": [{"open": {"day": 1, "time": open_time},
+                                           "close": {"day": 1, "time": close_time}}]}}
+
+
+def test_military_to_minutes():
+    assert military_to_minutes("0000") == 0
+    assert military_to_minutes("0930") == 570
+    assert military_to_minutes("2359") == 1439
+
+
+def test_known_hours():
+    assert parse_opening_hours(periods("0900", "2100"), 480, 1140) == (540, 1260)
+
+
+def test_unknown_hours_fall_back_to_the_defaults():
+    assert parse_opening_hours({}, 480, 1140) == (480, 1140)
+    assert parse_opening_hours({"opening_hours": {"open_now": True}}, 480, 1140) == (480, 1140)
+    assert parse_opening_hours({"opening_hours": {"periods": None}}, 480, 1140) == (480, 1140)
+
+
+def test_open_all_day_has_no_close():
+    # Google reports 24 hour places as a single period opening Sunday 0000 without a close
+    result = {"opening_hours": {"periods": [{"open": {"day": 0, "time": "0000"}}]}}
+    assert parse_opening_hours(result, 480, 1140) == (480, 1140)
+
+
+def test_early_closing_is_extended_to_the_default_close():
+    assert parse_opening_hours(periods("1000", "1500"), 480, 1140) == (600, 1140)
+
+
+def test_closing_after_midnight_is_not_before_opening():
+    # "0200" closes on the next day, it must never end up before the opening
+    opening, closing = parse_opening_hours(periods("1800", "0200"), 480, 600)
+    assert opening == 1080
+    assert closing >= opening
+
+
+def test_hours_of_every_place_are_looked_up_concurrently(make_agent, city):
+    agent = make_agent(days=2, concurrent_requests=8)
+    processor = agent.configure()
+    processor.pipeline.run("opening_hours")
+    table = processor.place_details
+    assert agent.client.calls["place"] == len(table)
+    for place in table:
+        opening_hours = {"periods": city.by_id[place.place_id]["periods"]}
+        assert (place.opening_time, place.closing_time) == \
+            parse_opening_hours({"opening_hours": opening_hours}, agent.default_opening_time,
+                                agent.default_closing_time)
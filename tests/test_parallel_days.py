@@ -0,0 +1,29 @@
+import copy
+
+import pytest
+
+from itinative.day_scheduler import solve_in_order, solve_in_parallel
+
+pytest.importorskip("scipy.optimize")
+
+
+def unsolved(routes):
+    routes = [copy.copy(route) for route in routes]
+    for route in routes:
+        route.solv = "HIGHS"
+    return routes
+
+
+def test_parallel_days_match_the_serial_solve(small_days):
+    serial = list(solve_in_order(unsolved(small_days)))
+    parallel = list(solve_in_parallel(unsolved(small_days), 2))
+    assert [route.day for route in parallel] == [route.day for route in small_days]  # day order
+    assert [route.objective for route in parallel] == pytest.approx([route.objective for route in serial])
+    assert [route.path for route in parallel] == [route.path for route in serial]
+
+
+def test_agent_with_workers_plans_every_day(make_agent):
+    agent = make_agent(days=3, solver_workers=2)
+    itineraries = list(agent.iter_days())
+    assert [day.day for day in itineraries] == [1, 2, 3]
+    assert all(len(day) > 0 for day in itineraries)
@@ -0,0 +1,68 @@
+from itinative.pipeline import Pipeline
+
+
+class Stages(object):
+    def __init__(self):
+        self.params = {"a": 1, "b": 1}
+        self.runs = []
+        self.pipeline = Pipeline()
+        self.pipeline.add("a", lambda: self.runs.append("a"), key=lambda: self.params["a"])
+        self.pipeline.add("b", lambda: self.runs.append("b"), key=lambda: self.params["b"], upstream=["a"])
+        self.pipeline.add("c", lambda: self.runs.append("c"), upstream=["b"])
+
+
+def test_stages_run_once_until_their_inputs_change():
+    stages = Stages()
+    assert stages.pipeline.run("c")
+    assert stages.runs == ["a", "b", "c"]
+    assert not stages.pipeline.run("c")
+    assert stages.runs == ["a", "b", "c"]
+
+
+def test_a_change_reruns_what_is_downstream():
+    stages = Stages()
+    stages.pipeline.run("c")
+    stages.params["b"] = 2
+    stages.pipeline.run("c")
+    assert stages.runs == ["a", "b", "c", "b", "c"]
+    stages.params["a"] = 2
+    stages.pipeline.run("c")
+    assert stages.runs[5:] == ["a", "b", "c"]
+    assert stages.pipeline.version("b") == 3
+
+
+def test_invalidate():
+    stages = Stages()
+    stages.pipeline.run("a")
+    stages.pipeline.invalidate("a")
+    stages.pipeline.run("a")
+    assert stages.runs == ["a", "a"]
+
+
+def test_agent_reuses_unchanged_days(make_agent):
+    agent = make_agent(days=3)
+    first = list(agent.iter_days())
+    calls = dict(agent.client.calls)
+    solved = dict(agent._solved)
+
+    again = list(agent.iter_days())
+    assert agent.client.calls == calls  # nothing fetched again
+    assert [day.to_dict() for day in again] == [day.to_dict() for day in first]  # solve times included
+    assert all(agent._solved[key] is solved[key] for key in solved)  # nor solved again
+
+
+def test_agent_resolves_days_when_a_solve_setting_changes(make_agent):
+    agent = make_agent(days=3)
+    list(agent.iter_days())
+    calls = dict(agent.client.calls)
+    solved = dict(agent._solved)
+
+    agent.waiting_time = 60
+    list(agent.iter_days())
+    assert agent.client.calls == calls
+    assert not set(agent._solved) & set(solved)
+
+    agent.heuristic_time_budget = 50
+    keys = set(agent._solved)
+    list(agent.iter_days())
+    assert not set(agent._solved) & keys
@@ -0,0 +1,39 @@
+import numpy as np
+
+from itinative.place_table import PlaceTable
+
+
+def record(i, **fields):
+    return dict({"place_id": f"p{i}", "name": f"Place {i}", "rating": 4.0, "user_ratings_total": 10.0 * i,
+                 "lat": 41.0, "lng": -87.0}, **fields)
+
+
+def test_append_row_by_row():
+    table = PlaceTable()
+    for i in range(1000):
+        table.append(record(i))
+    assert len(table) == 1000
+    assert table.place_id[999] == "p999"
+    np.testing.assert_allclose(table.prominence, 40.0 * np.arange(1000))
+    assert np.isnan(table.opening_time).all()
+    assert (table.cluster_id == 0).all()
+
+
+def test_rows_write_through():
+    table = PlaceTable.from_records([record(1), record(2)])
+    table[1].rating = 5.0
+    table[0].cluster_id = 3
+    table.append(record(3))
+    assert table.prominence[1] == 100.0
+    assert table.cluster_rows(3).tolist() == [0]
+    assert [place.name for place in table] == ["Place 1", "Place 2", "Place 3"]
+
+
+def test_extend_replaced_columns():
+    table = PlaceTable.from_arrays({"place_id": np.array(["a", "b"]), "name": np.array(["A", "B"]),
+                                    "rating": np.ones(2), "user_ratings_total": np.ones(2)})
+    table.extend([record(12345)])
+    assert table.place_id.tolist() == ["a", "b", "p12345"]
+    assert table.name[2] == "Place 12345"  # not cut to the width of the original strings
+    table.set_clusters([1, 1, 2])
+    assert table.cluster_rows(1).tolist() == [0, 1]
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy.sparse.csgraph")
+
+from itinative.road_network import RoadNetwork, chord_to_km, parse_speed, unit_vectors  # noqa: E402
+
+# Four junctions ~1 km apart going north: a two way residential street 1-2-3, a one way primary
+# 3 >> 4 at 60 km/h, a footway 1-4 and a way to a node outside the extract
+EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="41.880" lon="-87.630"/>
+  <node id="2" lat="41.889" lon="-87.630"/>
+  <node id="3" lat="41.898" lon="-87.630"/>
+  <node id="4" lat="41.907" lon="-87.630"/>
+  <node id="5" lat="41.880" lon="-87.600"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="residential"/></way>
+  <way id="11"><nd ref="3"/><nd ref="4"/><tag k="highway" v="primary"/><tag k="maxspeed" v="60"/>
+    <tag k="oneway" v="yes"/></way>
+  <way id="12"><nd ref="1"/><nd ref="4"/><tag k="highway" v="footway"/></way>
+  <way id="13"><nd ref="5"/><nd ref="99"/><tag k="highway" v="residential"/></way>
+  <relation id="20"><member type="way" ref="10" role=""/></relation>
+</osm>
+"""
+
+
+@pytest.fixture
+def extract(tmp_path):
+    path = tmp_path / "tiny.osm"
+    path.write_text(EXTRACT)
+    return str(path)
+
+
+def km(a, b):
+    return chord_to_km(np.linalg.norm(unit_vectors(*a) - unit_vectors(*b)))
+
+
+def times(network, points):
+    lat, lng = zip(*points)
+    return network.travel_times(np.array(lat), np.array(lng), access_minutes_per_km=0)
+
+
+POINTS = [(41.880, -87.630), (41.889, -87.630), (41.898, -87.630), (41.907, -87.630)]
+
+
+def test_parse_speed():
+    assert parse_speed("50") == 50
+    assert parse_speed("30 mph") == pytest.approx(48.27)
+    assert parse_speed("RU:urban") is None
+    assert parse_speed(None) is None
+
+
+def test_driving_network_of_an_extract(extract):
+    network = RoadNetwork.from_osm(extract)
+    # The footway and the way leaving the extract aren't roads to drive on
+    assert len(network) == 4
+    matrix = times(network, POINTS)
+    residential = (km(POINTS[0], POINTS[1]) + km(POINTS[1], POINTS[2])) / 25 * 60
+    assert matrix[0, 2] == pytest.approx(residential)
+    assert matrix[2, 0] == pytest.approx(residential)
+    assert matrix[2, 3] == pytest.approx(km(POINTS[2], POINTS[3]) / 60 * 60)
+    # One way: no driving back from 4
+    assert np.isinf(matrix[3, 2])
+
+
+def test_walking_network_takes_the_footway_both_ways(extract):
+    network = RoadNetwork.from_osm(extract, profile="walking")
+    matrix = times(network, POINTS)
+    footway = km(POINTS[0], POINTS[3]) / 5 * 60
+    assert matrix[0, 3] == pytest.approx(footway)
+    assert matrix[3, 0] == pytest.approx(footway)
+    assert matrix[3, 2] == pytest.approx(km(POINTS[3], POINTS[2]) / 5 * 60)
+
+
+def test_open_preprocesses_the_extract_once_per_profile(extract):
+    network = RoadNetwork.open(extract, profile="walking")
+    snapshot = f"{extract}.walking.npz"
+    assert os.path.exists(snapshot)
+    assert not os.path.exists(f"{extract}.driving.npz")
+    loaded = RoadNetwork.open(snapshot)
+    assert loaded.profile == "walking"
+    np.testing.assert_allclose(times(loaded, POINTS), times(network, POINTS))
+
+
+def test_osm_mode_reads_the_profile_of_the_travel_mode(make_agent, extract):
+    agent = make_agent(distance_mode="osm", road_network=extract)
+    processor = agent.configure()
+    processor.travel_mode = "walking"
+    processor.run(agent.days)
+    assert os.path.exists(f"{extract}.walking.npz")
+    assert not os.path.exists(f"{extract}.driving.npz")
+    assert processor._network[1].profile == "walking"
+
+
+@pytest.mark.parametrize("travel_mode", ["bicycling", "walking"])
+def test_osm_mode_rejects_a_travel_mode_without_its_network(make_agent, extract, travel_mode):
+    agent = make_agent(distance_mode="osm", road_network=RoadNetwork.from_osm(extract))
+    processor = agent.configure()
+    processor.travel_mode = travel_mode
+    with pytest.raises(ValueError):
+        processor.run(agent.days)
+    with pytest.raises(ValueError):
+        RoadNetwork.from_osm(extract, profile="bicycling")
@@ -0,0 +1,103 @@
+import json
+import asyncio
+
+import pytest
+
+from itinative.service import PlanningService, parse_request
+from itinative.synthetic import StubClient, StubGeocoder
+
+
+def body(**request):
+    return json.dumps(request).encode()
+
+
+def test_parse_request():
+    assert parse_request(body(location=" Chicago ", days=2, waiting_time=60, time_budget=5.5)) == \
+        {"location": "Chicago", "days": 2, "waiting_time": 60, "time_budget": 5.5}
+
+
+@pytest.mark.parametrize("request_body", [
+    b"not json", b"[1, 2]", body(days=2), body(location=" ", days=2), body(location="Chicago", days=0),
+    body(location="Chicago", days=True), body(location="Chicago", days=2.0),
+    body(location="Chicago", days=2, max_visits=False), body(location="Chicago", days=2, waiting_time=-1),
+    body(location="Chicago", days=2, time_budget=0), body(location="Chicago", days=2, time_budget=True),
+])
+def test_parse_request_rejects(request_body):
+    with pytest.raises(ValueError):
+        parse_request(request_body)
+
+
+@pytest.fixture
+def service(city):
+    service = PlanningService(client=StubClient(city, latency=0.01), geocoder=StubGeocoder(city), io_workers=4,
+                              solve_workers=1, queries_per_second=1000, solver="HEURISTIC")
+    yield service
+    service.close()
+
+
+def plan_together(service, *requests):
+    async def run():
+        return await asyncio.gather(*(service.route("POST", "/plan", body(**request)) for request in requests))
+
+    return asyncio.run(run())
+
+
+def test_identical_requests_in_flight_are_planned_once(service):
+    request = {"location": "Chicago", "days": 2}
+    first, second = plan_together(service, request, request)
+    assert first[0] == second[0] == 200
+    assert first[1] == second[1]
+    assert len(first[1]["days"]) == 2
+    assert service.counters == {"requests": 2, "deduplicated": 1, "errors": 0}
+    # One search of the pin, the second request didn't reach the client
+    assert service.client.calls["places_nearby"] <= 3
+
+
+def test_different_requests_are_planned_apart(service):
+    responses = plan_together(service, {"location": "Chicago", "days": 2}, {"location": "Chicago", "days": 3})
+    assert [len(payload["days"]) for _, payload in responses] == [2, 3]
+    assert service.counters["deduplicated"] == 0
+
+
+def test_metrics(service):
+    plan_together(service, {"location": "Chicago", "days": 1})
+    status, metrics = asyncio.run(service.route("GET", "/metrics", b""))
+    assert status == 200
+    assert metrics["requests"] == 1
+    assert metrics["errors"] == 0
+    assert metrics["in_flight"] == 0
+    assert metrics["queue_depth"] == {"retrieve": 0, "solve": 0}
+    for stage in ("request", "retrieve", "solve"):
+        assert metrics["latency"][stage]["count"] >= 1
+        assert metrics["latency"][stage]["p50"] <= metrics["latency"][stage]["max"]
+
+
+def test_bad_requests(service):
+    assert asyncio.run(service.route("POST", "/plan", body(location="Chicago", days=True)))[0] == 400
+    assert asyncio.run(service.route("GET", "/plan", b""))[0] == 405
+    assert asyncio.run(service.route("GET", "/nowhere", b""))[0] == 404
+    assert service.counters["requests"] == 0
+
+
+async def exchange(service, request):
+    server = await service.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    status_line, _, payload = response.partition(b"\r\n")
+    return int(status_line.split()[1]), json.loads(payload.split(b"\r\n\r\n", 1)[1])
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1.5"])
+def test_malformed_content_length(service, length):
+    request = f"POST /plan HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode()
+    assert asyncio.run(exchange(service, request)) == (400, {"error": "Malformed request"})
+
+
+def test_requests_over_http(service):
+    assert asyncio.run(exchange(service, b"GET /health HTTP/1.1\r\n\r\n")) == (200, {"status": "ok"})
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from itinative.snapshot import CitySnapshot
+
+
+def plans(agent):
+    # Itineraries without the solve times, which vary from run to run
+    return [{key: value for key, value in day.to_dict().items() if key != "solve_time"} for day in agent.iter_days()]
+
+
+@pytest.fixture
+def exported(make_agent, tmp_path):
+    agent = make_agent(days=3)
+    days = plans(agent)
+    path = str(tmp_path / "chicago.city")
+    agent.processor.export_snapshot(path)
+    return agent, days, path
+
+
+def test_round_trip(exported, make_agent):
+    agent, days, path = exported
+    source = agent.processor
+    snapshot = CitySnapshot.open(path)
+    assert len(snapshot) == len(source.place_details)
+    assert isinstance(snapshot.distance_matrix, np.memmap)
+    assert not snapshot.distance_matrix.flags.writeable
+
+    planned = make_agent(days=3, snapshot=path)
+    planned.client = None  # a snapshot run makes no API call
+    processor = planned.retrieve()
+    assert list(processor.place_details.place_id) == list(source.place_details.place_id)
+    np.testing.assert_array_equal(processor.place_details.cluster_id, source.place_details.cluster_id)
+    np.testing.assert_allclose(processor.distance_matrix, source.distance_matrix, rtol=1e-6)
+    assert (processor.hotel.lat, processor.hotel.lng) == (source.hotel.lat, source.hotel.lng)
+    assert plans(planned) == days
+
+
+def test_other_days_recluster_the_snapshot(exported, make_agent):
+    _, _, path = exported
+    planned = make_agent(days=2, snapshot=path)
+    assert len(list(planned.iter_days())) == 2
+
+
+def test_another_distance_mode_is_rejected(exported, make_agent):
+    _, _, path = exported
+    planned = make_agent(days=3, snapshot=path, distance_mode="road")
+    with pytest.raises(ValueError):
+        planned.retrieve()
@@ -0,0 +1,38 @@
+import copy
+
+import pytest
+
+pytest.importorskip("scipy.optimize")
+
+SCENARIOS = [{"waiting_time": 90}, {"waiting_time": 60}, {"max_number_of_visits": 2}, {"waiting_time": 120}]
+
+
+def test_sweep_matches_fresh_builds(small_days, feasible):
+    route = copy.copy(max(small_days, key=lambda day: len(day.NODES)))
+    route.solv = "HIGHS"
+    swept = route.sweep(SCENARIOS)
+    assert len(swept) == len(SCENARIOS)
+    for parameters, day in zip(SCENARIOS, swept):
+        fresh = route.scenario(parameters)
+        fresh.optimize()
+        assert day.status == fresh.status == "Optimal"
+        assert day.objective == pytest.approx(fresh.objective, rel=1e-6)
+        assert "shared_model_build" in day.timings
+        feasible(day)
+
+
+def test_sweep_with_another_solver_solves_every_scenario(small_days):
+    route = copy.copy(small_days[0])
+    route.solv = "HEURISTIC"
+    swept = route.sweep(SCENARIOS)
+    assert [day.waiting_time for day in swept] == [parameters.get("waiting_time", route.waiting_time)
+                                                   for parameters in SCENARIOS]
+    assert all(day.status == "Heuristic" for day in swept)
+
+
+def test_scenario_is_an_unsolved_copy(small_days):
+    route = small_days[0]
+    scenario = route.scenario({"waiting_time": 15})
+    assert scenario.waiting_time == 15
+    assert scenario.path == [] and scenario.objective is None
+    assert route.waiting_time != 15
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from itinative import throttling
+from itinative.throttling import TokenBucket, call_with_backoff, is_quota_error
+
+
+class QuotaError(Exception):
+    status = "OVER_QUERY_LIMIT"
+
+
+class Flaky(object):
+    """Fails with `error` the first `failures` calls, then answers"""
+
+    def __init__(self, failures, error=QuotaError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error()
+        return args, kwargs
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waited = []
+    monkeypatch.setattr(throttling.time, "sleep", waited.append)
+    return waited
+
+
+def test_token_bucket_holds_the_rate():
+    bucket = TokenBucket(20, capacity=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # The first token is there, the next five come at 20 per second
+    assert time.monotonic() - started >= 5 / 20 * 0.9
+
+
+def test_token_bucket_burst_up_to_capacity():
+    bucket = TokenBucket(1, capacity=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.5
+
+
+def test_token_bucket_rejects_a_non_positive_rate():
+    with pytest.raises(AssertionError):
+        TokenBucket(0)
+
+
+def test_quota_errors():
+    assert is_quota_error(QuotaError())
+    assert not is_quota_error(ValueError())
+
+
+def test_retries_quota_errors_with_exponential_backoff(sleeps):
+    func = Flaky(3)
+    assert call_with_backoff(func, 1, key="value", max_retries=3, backoff=1.0) == ((1,), {"key": "value"})
+    assert func.calls == 4
+    assert len(sleeps) == 3
+    for attempt, seconds in enumerate(sleeps):
+        # backoff * 2 ** attempt with up to 50% jitter
+        assert 2 ** attempt <= seconds <= 1.5 * 2 ** attempt
+
+
+def test_gives_up_after_max_retries(sleeps):
+    func = Flaky(10)
+    with pytest.raises(QuotaError):
+        call_with_backoff(func, max_retries=2)
+    assert func.calls == 3
+
+
+def test_other_errors_are_not_retried(sleeps):
+    func = Flaky(1, error=ValueError)
+    with pytest.raises(ValueError):
+        call_with_backoff(func, max_retries=3)
+    assert func.calls == 1
+    assert sleeps == []
+
+
+def test_every_attempt_takes_a_token(sleeps):
+    class Counting(object):
+        taken = 0
+
+        def acquire(self):
+            self.taken += 1
+
+    limiter = Counting()
+    call_with_backoff(Flaky(2), limiter=limiter, max_retries=3)
+    assert limiter.taken == 3
@@ -0,0 +1,55 @@
+from time import perf_counter
+
+import pytest
+
+from itinative.helper_functions import hex_tiles, haversine
+from itinative.synthetic import SyntheticCity, StubClient, StubGeocoder
+
+
+@pytest.fixture(scope="module")
+def big_city():
+    # More places than the 60 a single Places API search can answer
+    return SyntheticCity(200, seed=5)
+
+
+def places(make_agent, big_city, **settings):
+    agent = make_agent(client=StubClient(big_city), geocoder=StubGeocoder(big_city), **settings)
+    processor = agent.configure()
+    processor.pipeline.run("places")
+    return agent, list(processor.place_details.place_id)
+
+
+def test_tiles_cover_the_coverage_circle():
+    lat, lng, coverage, tile_radius = 41.88, -87.63, 10000, 3000
+    tiles = hex_tiles(lat, lng, coverage, tile_radius)
+    assert tiles[0] == pytest.approx((lat, lng))
+    # Points on the coverage circle are within reach of some tile
+    ring = [(lat + dlat, lng + dlng) for dlat, dlng in
+            [(0.09, 0), (-0.09, 0), (0, 0.12), (0, -0.12), (0.064, 0.085), (-0.064, -0.085)]]
+    for point in ring:
+        assert min(haversine(point[1], point[0], tile[1], tile[0]) for tile in tiles) * 1000 <= tile_radius
+
+
+def test_tiled_search_finds_more_places_without_duplicates(make_agent, big_city):
+    _, pin = places(make_agent, big_city)
+    _, tiled = places(make_agent, big_city, search_mode="tiled")
+    assert len(pin) <= 60
+    assert len(tiled) > len(pin)
+    assert len(tiled) == len(set(tiled))
+
+
+def test_tiled_search_stops_at_target_candidates(make_agent, big_city):
+    full, everything = places(make_agent, big_city, search_mode="tiled", concurrent_requests=1)
+    early, some = places(make_agent, big_city, search_mode="tiled", concurrent_requests=1, target_candidates=40)
+    assert 40 <= len(some) < len(everything)
+    assert early.client.calls["places_nearby"] < full.client.calls["places_nearby"]
+
+
+def test_pin_search_waits_only_between_its_pages(make_agent, big_city):
+    agent = make_agent(client=StubClient(big_city), geocoder=StubGeocoder(big_city))
+    processor = agent.configure()
+    processor.page_token_delay = 0.4
+    started = perf_counter()
+    processor.pipeline.run("places")
+    assert agent.client.calls["places_nearby"] == 2
+    assert 0.4 <= perf_counter() - started < 0.8
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from itinative.synthetic import SyntheticRegion, StubClient, StubGeocoder
+from itinative.trip import TripPlanner, shortest_path
+
+
+class Segment(object):
+    """Stands in for a TripSegment: prominence of the city's places, sorted best first"""
+
+    def __init__(self, location, prominence, travel_days=0):
+        self.location = location
+        self.prominence = sorted(prominence, reverse=True)
+        self.travel_days = travel_days
+        self.days = None
+        self.first_day = None
+
+    def values(self, visits):
+        collected = np.concatenate([[0.0], np.cumsum(self.prominence)])
+        days = np.arange(len(self.prominence) + 1)
+        return collected[np.minimum(days * visits, len(self.prominence))]
+
+
+def planner(days, **settings):
+    trip = TripPlanner(days, [], api_key=None)
+    trip.agent.maxVisits_in_a_day = 2
+    for name, value in settings.items():
+        setattr(trip, name, value)
+    return trip
+
+
+def test_days_go_where_they_collect_the_most():
+    big = Segment("Big", [100] * 10)
+    small = Segment("Small", [10] * 10)
+    planner(5).allocate([big, small])
+    assert (big.days, small.days) == (4, 1)  # at least min_days each
+
+
+def test_days_follow_diminishing_returns():
+    deep = Segment("Deep", [100, 100, 1, 1, 1, 1])
+    wide = Segment("Wide", [60, 60, 60, 60, 60, 60])
+    planner(4).allocate([deep, wide])
+    assert (deep.days, wide.days) == (1, 3)
+
+
+def test_first_days_count_the_travel_days():
+    segments = [Segment("A", [50] * 6), Segment("B", [50] * 6, travel_days=1), Segment("C", [50] * 6)]
+    planner(7).allocate(segments)
+    assert sum(segment.days for segment in segments) == 6
+    assert [segment.first_day for segment in segments] == [0, segments[0].days + 1,
+                                                           segments[0].days + 1 + segments[1].days]
+
+
+def test_fixed_days_are_kept():
+    segments = [Segment("A", [100] * 10), Segment("B", [1] * 10)]
+    planner(6, fixed_days={"B": 3}).allocate(segments)
+    assert (segments[0].days, segments[1].days) == (3, 3)
+
+
+def test_a_city_takes_no_more_days_than_it_has_places_for():
+    segments = [Segment("A", [100] * 3), Segment("B", [1] * 10)]
+    planner(5).allocate(segments)
+    assert segments[0].days == 2  # 3 places at 2 visits a day
+
+
+def test_too_few_days():
+    segments = [Segment("A", [1] * 4, travel_days=2), Segment("B", [1] * 4)]
+    with pytest.raises(AssertionError):
+        planner(3).allocate(segments)
+
+
+def test_shortest_path_keeps_the_first_stop():
+    points = np.array([[0, 0], [10, 0], [1, 0], [5, 0], [2, 0]], dtype=float)
+    distances = np.linalg.norm(points[:, None] - points[None], axis=2)
+    assert shortest_path(distances) == [0, 2, 4, 3, 1]
+    # 2-opt beyond the exhaustive search
+    assert shortest_path(distances, exhaustive=2) == [0, 2, 4, 3, 1]
+
+
+def test_quiet_trip_plan(capsys):
+    region = SyntheticRegion(["Chicago", "Milwaukee"], 40, seed=1)
+    trip = TripPlanner(4, ["Chicago", "Milwaukee"], None)
+    trip.agent.client, trip.agent.geocoder = StubClient(region), StubGeocoder(region)
+    trip.agent.solver, trip.agent.verbose, trip.agent.queries_per_second = "HEURISTIC", False, 1000
+    for location in trip.locations:
+        trip.segment(location).agent.configure().page_token_delay = 0
+    segments = trip.plan()
+    assert sum(segment.days for segment in segments) + sum(segment.travel_days for segment in segments) == 4
+    assert sum(len(segment.itineraries) for segment in segments) == sum(segment.days for segment in segments)
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("pulp")
+
+
+def test_warm_start_keeps_the_optimum(small_days, solve, feasible):
+    for route in small_days:
+        cold, warm = solve(route, "CBC"), solve(route, "CBC", warm_start=True)
+        assert warm.status == cold.status == "Optimal"
+        assert warm.objective == pytest.approx(cold.objective, rel=1e-6)
+        assert "warm_start" in warm.timings
+        # The start is a feasible route, never better than the optimum
+        assert 0 < warm.start_objective <= warm.objective + 1e-6
+        feasible(warm)
+
+
+def test_warm_start_from_the_previous_solution(small_days, solve):
+    route = max(small_days, key=lambda day: len(day.NODES))
+    previous = solve(route, "CBC")
+    again = solve(route, "CBC", warm_start=True, initial_route=previous.solution_ids())
+    assert again.start_objective == pytest.approx(previous.objective, rel=1e-6)
+    assert again.objective == pytest.approx(previous.objective, rel=1e-6)
+
+
+def test_cold_start_has_no_start_objective(small_days, solve):
+    assert solve(small_days[0], "CBC").start_objective is None